@@ -0,0 +1,35 @@
+"""add image_sha256 to predictions
+
+Revision ID: b7e2f4a9c1d3
+Revises: dc30d78c382d
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e2f4a9c1d3'
+down_revision: Union[str, None] = 'dc30d78c382d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # predictions may be created by Base.metadata.create_all rather than a migration
+    op.execute("ALTER TABLE IF EXISTS predictions ADD COLUMN IF NOT EXISTS image_sha256 VARCHAR(64)")
+    op.execute("""
+        DO $$ BEGIN
+            IF EXISTS (SELECT 1 FROM information_schema.tables WHERE table_name = 'predictions') THEN
+                CREATE INDEX IF NOT EXISTS ix_predictions_image_sha256 ON predictions (image_sha256);
+            END IF;
+        END $$
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_predictions_image_sha256")
+    op.execute("ALTER TABLE IF EXISTS predictions DROP COLUMN IF EXISTS image_sha256")
@@ -0,0 +1,27 @@
+"""add is_shadow to predictions
+
+Revision ID: e3a9c5d17b42
+Revises: b7e2f4a9c1d3
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3a9c5d17b42'
+down_revision: Union[str, None] = 'b7e2f4a9c1d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # predictions may be created by Base.metadata.create_all rather than a migration
+    op.execute("ALTER TABLE IF EXISTS predictions ADD COLUMN IF NOT EXISTS is_shadow BOOLEAN NOT NULL DEFAULT false")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE IF EXISTS predictions DROP COLUMN IF EXISTS is_shadow")
@@ -0,0 +1,32 @@
+"""add sha256 and phash to images
+
+Revision ID: f5b1d8e2a6c9
+Revises: e3a9c5d17b42
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f5b1d8e2a6c9'
+down_revision: Union[str, None] = 'e3a9c5d17b42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('images', sa.Column('sha256', sa.String(length=64), nullable=True))
+    op.add_column('images', sa.Column('phash', sa.BigInteger(), nullable=True))
+    op.create_index(op.f('ix_images_sha256'), 'images', ['sha256'], unique=False)
+    op.create_index(op.f('ix_images_phash'), 'images', ['phash'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_images_phash'), table_name='images')
+    op.drop_index(op.f('ix_images_sha256'), table_name='images')
+    op.drop_column('images', 'phash')
+    op.drop_column('images', 'sha256')
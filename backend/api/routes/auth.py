@@ -5,6 +5,7 @@ from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks,
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from sqlalchemy import func, case
+from starlette.concurrency import run_in_threadpool
 from datetime import timedelta, datetime, timezone
 import secrets
 import hashlib
@@ -815,17 +816,37 @@ def import_images_url(
     db: Session = Depends(get_db),
     _: User = Depends(get_current_admin)
 ):
+    from ml.dedup import find_duplicates, phash_index, stored_image_hashes
+
     imported_count = 0
+    duplicates_skipped = []
+    seen_digests = set()
     for image_data in payload.images:
         existing = db.query(Image).filter(Image.filename == image_data.filename).first()
         if existing:
             continue
 
-        db.add(Image(filename=image_data.filename, image_url=image_data.image_url))
+        #URLs that cannot be downloaded are imported without hashes (filled in by `ml.dedup backfill`)
+        digest, phash = stored_image_hashes(image_data.image_url)
+        if digest is not None:
+            duplicate = find_duplicates(db, [(digest, phash)])[0]
+            if duplicate or digest in seen_digests:
+                duplicates_skipped.append({
+                    "filename": image_data.filename,
+                    "duplicate_of": duplicate["image"].id if duplicate else None,
+                    "match": duplicate["match"] if duplicate else "sha256",
+                })
+                continue
+            seen_digests.add(digest)
+
+        image = Image(filename=image_data.filename, image_url=image_data.image_url, sha256=digest, phash=phash)
+        db.add(image)
+        db.flush()
+        phash_index.add(image.id, phash)
         imported_count += 1
 
     db.commit()
-    return {"message": "Images imported successfully", "images_imported": imported_count}
+    return {"message": "Images imported successfully", "images_imported": imported_count, "duplicates_skipped": duplicates_skipped}
 
 
 @router.post("/admin/import-images-file", status_code=201)
@@ -841,7 +862,12 @@ async def import_images_file(
     Images predicted as does_not_need_expert_review are stored in S3 only.
     If no trained model is available, all images are saved to the DB.
     """
+    from ml.dedup import find_duplicates, image_hashes, phash_index
+    from ml.persistence import PredictionWriter, latest_predictions
+
     try:
+        from ml.embeddings import embedding_index
+        from ml.executor import InferenceQueueFull, inference_executor
         from ml.predict import PredictionService
         _ml_available = True
     except Exception:
@@ -854,87 +880,18 @@ async def import_images_file(
 
     if _ml_available:
         prediction_service = PredictionService.get_instance()
-        if prediction_service.model is None:
-            prediction_service.load_model()
-        model_available = prediction_service.model is not None
+        model_available = await run_in_threadpool(prediction_service.ensure_loaded)
     else:
         prediction_service = None
         model_available = False
 
     results = []
     failed = []
-
-    def upload_image(filename: str, file_data: bytes, content_type: str):
-        if len(file_data) > MAX_FILE_SIZE:
-            return None, {"filename": filename, "error": f"File too large ({len(file_data)} bytes). Max: {MAX_FILE_SIZE}"}
-
-        # Check DB first — skip S3 upload entirely if already saved
-        existing = db.query(Image).filter(Image.filename == filename).first()
-        if existing:
-            existing_prediction = db.query(Prediction).filter(Prediction.image_id == existing.id).order_by(Prediction.id.desc()).first()
-            return {"filename": filename, "image_url": existing.image_url, "label": existing_prediction.predicted_label if existing_prediction else None, "confidence": existing_prediction.confidence if existing_prediction else None, "saved_to_db": True, "already_existed": True}, None
-
-
-        s3_url = s3_service.upload_file(
-            file_data=file_data,
-            filename=filename,
-            content_type=content_type,
-            folder=folder_name
-        )
-        if not s3_url:
-            return None, {"filename": filename, "error": "Failed to upload to S3"}
-
-        if not model_available:
-            return None, {"filename": filename, "error": "No trained model available. Cannot classify image."}
-
-        label = "needs_expert_review"
-        confidence = None
-        try:
-            pred = prediction_service.predict(file_data)
-            label = pred["label"]
-            confidence = pred["confidence"]
-        except Exception as e:
-            return None, {"filename": filename, "error": f"Prediction failed: {str(e)}"}
-
-        saved_to_db = False
-        if label == "needs_expert_review":
-            db.add(Image(filename=filename, image_url=s3_url))
-            db.commit()
-            saved_to_db = True
-            # Save prediction to DB
-            image_prediction = db.query(Image).filter(Image.filename == filename).first()
-            if image_prediction and confidence is not None:
-                db.add(Prediction(
-                    image_id=image_prediction.id,
-                    model_name=prediction_service.arch,
-                    predicted_label=label,
-                    confidence=confidence,
-                    model_version="latest",
-                ))
-                db.commit()
-
-        return {"filename": filename, "image_url": s3_url, "label": label, "confidence": confidence, "saved_to_db": saved_to_db, "already_existed": False}, None
+    #(filename, file_data, content_type) for every image found in the request, zips expanded
+    candidates = []
 
     for file in files:
         try:
-            if file.content_type not in ALLOWED_TYPES:
-                failed.append({"filename": file.filename, "error": f"Invalid file type: {file.content_type}. Allowed: JPEG, PNG, WEBP"})
-                continue
-
-            file_data = await file.read()
-
-            if len(file_data) > MAX_FILE_SIZE:
-                failed.append({"filename": file.filename, "error": f"File too large: {len(file_data)} bytes. Max: {MAX_FILE_SIZE} bytes"})
-                continue
-
-            result, error = upload_image(file.filename, file_data, file.content_type)
-            if error:
-                failed.append(error)
-            else:
-                results.append(result)
-
-        except Exception as e:
-            failed.append({"filename": file.filename, "error": str(e)})
             file_data = await file.read()
 
             if file.filename.lower().endswith(".zip") or file.content_type in ("application/zip", "application/x-zip-compressed"):
@@ -949,13 +906,8 @@ async def import_images_file(
                             ext = "." + inner_name.rsplit(".", 1)[-1].lower() if "." in inner_name else ""
                             if ext not in ALLOWED_EXTENSIONS:
                                 continue
-                            inner_data = zf.read(entry)
                             content_type = "image/jpeg" if ext in (".jpg", ".jpeg") else f"image/{ext[1:]}"
-                            result, error = upload_image(inner_name, inner_data, content_type)
-                            if error:
-                                failed.append(error)
-                            else:
-                                results.append(result)
+                            candidates.append((inner_name, zf.read(entry), content_type))
                 except zipfile.BadZipFile:
                     failed.append({"filename": file.filename, "error": "Invalid or corrupted ZIP file"})
                 continue
@@ -964,15 +916,154 @@ async def import_images_file(
                 failed.append({"filename": file.filename, "error": f"Invalid file type: {file.content_type}. Allowed: JPEG, PNG, WEBP, ZIP"})
                 continue
 
-            result, error = upload_image(file.filename, file_data, file.content_type)
-            if error:
-                failed.append(error)
-            else:
-                results.append(result)
+            candidates.append((file.filename, file_data, file.content_type))
 
         except Exception as e:
             failed.append({"filename": file.filename, "error": str(e)})
 
+    #content hashes: renamed copies (same bytes) and near copies (pHash) of stored images
+    #are answered from the stored image before any S3 upload or inference
+    hashes = await run_in_threadpool(
+        lambda: [image_hashes(file_data) if len(file_data) <= MAX_FILE_SIZE else (None, None) for _, file_data, _ in candidates]
+    )
+    duplicates = await run_in_threadpool(find_duplicates, db, hashes)
+    first_in_request = {}
+    filenames_in_request = set()
+
+    # Check DB first — skip S3 upload entirely if already saved (one query for all names, one for their predictions)
+    existing_by_name = {
+        image.filename: image
+        for image in db.query(Image).filter(Image.filename.in_({filename for filename, _, _ in candidates}))
+    }
+    stored_predictions = latest_predictions(
+        db,
+        [image.id for image in existing_by_name.values()] + [d["image"].id for d in duplicates if d],
+    )
+
+    #upload new images to S3; anything already in the DB is answered from its stored prediction
+    pending = []
+    for (filename, file_data, content_type), (digest, phash), duplicate in zip(candidates, hashes, duplicates):
+        try:
+            if len(file_data) > MAX_FILE_SIZE:
+                failed.append({"filename": filename, "error": f"File too large: {len(file_data)} bytes. Max: {MAX_FILE_SIZE} bytes"})
+                continue
+
+            existing = existing_by_name.get(filename)
+            if existing:
+                existing_prediction = stored_predictions.get(existing.id)
+                results.append({"filename": filename, "image_url": existing.image_url, "label": existing_prediction.predicted_label if existing_prediction else None, "confidence": existing_prediction.confidence if existing_prediction else None, "saved_to_db": True, "already_existed": True})
+                continue
+
+            if duplicate:
+                existing = duplicate["image"]
+                existing_prediction = stored_predictions.get(existing.id)
+                results.append({
+                    "filename": filename, "image_url": existing.image_url,
+                    "label": existing_prediction.predicted_label if existing_prediction else None,
+                    "confidence": existing_prediction.confidence if existing_prediction else None,
+                    "saved_to_db": True, "already_existed": True,
+                    "duplicate_of": {"image_id": existing.id, "filename": existing.filename, "match": duplicate["match"], "distance": duplicate["distance"]},
+                })
+                continue
+
+            if digest in first_in_request:
+                failed.append({"filename": filename, "error": f"Duplicate of {first_in_request[digest]} in this upload"})
+                continue
+            if filename in filenames_in_request:
+                failed.append({"filename": filename, "error": "Duplicate filename in this upload"})
+                continue
+            first_in_request[digest] = filename
+            filenames_in_request.add(filename)
+
+            s3_url = s3_service.upload_file(
+                file_data=file_data,
+                filename=filename,
+                content_type=content_type,
+                folder=folder_name
+            )
+            if not s3_url:
+                failed.append({"filename": filename, "error": "Failed to upload to S3"})
+                continue
+
+            if not model_available:
+                failed.append({"filename": filename, "error": "No trained model available. Cannot classify image."})
+                continue
+
+            pending.append((filename, s3_url, file_data, digest, phash))
+
+        except Exception as e:
+            failed.append({"filename": filename, "error": str(e)})
+
+    digests = [digest for _, _, _, digest, _ in pending]
+    if not pending:
+        predictions = []
+    else:
+        #new images need embeddings (similarity index + near-duplicate check), so only in-memory cache entries
+        #that kept theirs can answer them (e.g. bytes just scored via /ml/predict/upload); stored rows for these
+        #digests were already matched by the dedup check above, so there is no DB warm-up here
+
+        #score on the shared inference executor so the event loop stays free
+        try:
+            predictions = await inference_executor.run(
+                prediction_service.predict_batch,
+                [file_data for _, _, file_data, _, _ in pending],
+                digests=digests,
+                embed=True,
+            )
+        except InferenceQueueFull:
+            predictions = [{"error": "Inference queue is full, retry shortly"}] * len(pending)
+        except Exception as e:
+            predictions = [{"error": str(e)}] * len(pending)
+
+    #near-duplicates of already stored images, from the embeddings computed in the same forward pass
+    near_duplicates = await run_in_threadpool(embedding_index.check_results, predictions) if predictions else []
+
+    #every new Image + Prediction row of the import goes out in one transaction, ids from RETURNING
+    writer = PredictionWriter(db, prediction_service.arch if prediction_service else None)
+    image_slots = {}
+    saved_results = {}
+    for n, ((filename, s3_url, _, digest, phash), pred) in enumerate(zip(pending, predictions)):
+        if "error" in pred:
+            failed.append({"filename": filename, "error": f"Prediction failed: {pred['error']}"})
+            continue
+
+        label = pred["label"]
+        confidence = pred["confidence"]
+
+        saved_to_db = False
+        if label == "needs_expert_review":
+            scored = pred if confidence is not None else None
+            image_slots[n] = writer.add_image(filename, s3_url, scored, sha256=digest, phash=phash)
+            saved_to_db = True
+
+        results.append({
+            "filename": filename, "image_url": s3_url, "label": label, "confidence": confidence,
+            "saved_to_db": saved_to_db, "already_existed": False,
+            "near_duplicates": [{"image_id": image_id, "similarity": score} for image_id, score in near_duplicates[n]],
+        })
+        saved_results[n] = results[-1]
+
+    #a rejected batch (e.g. a concurrent import saved the same filename) is retried row by row,
+    #so one conflict fails only its own file instead of the whole, already uploaded, import
+    try:
+        image_ids, save_errors = await run_in_threadpool(writer.flush_or_split)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to save imported images: {e}")
+    saved_image_ids = [None] * len(predictions)
+    for n, slot in image_slots.items():
+        if slot in save_errors:
+            results = [r for r in results if r is not saved_results[n]]
+            failed.append({
+                "filename": pending[n][0], "image_url": pending[n][1],
+                "error": f"Uploaded to S3 but not saved to the database: {save_errors[slot]}",
+            })
+            continue
+        saved_image_ids[n] = image_ids[slot]
+        phash_index.add(image_ids[slot], pending[n][4])
+
+    if predictions:
+        await run_in_threadpool(embedding_index.add_results, saved_image_ids, predictions)
+
     saved_to_db_count = sum(1 for r in results if r.get("saved_to_db"))
     already_existed_count = sum(1 for r in results if r.get("already_existed"))
 
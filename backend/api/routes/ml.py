@@ -1,13 +1,24 @@
 """ML API routes — prediction and training endpoints"""
+import json
 import os
+import shutil
 import tempfile
-import torch
+import zipfile
+from pathlib import Path
 
 from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 from api.routes.auth import get_current_admin, get_current_user
-from ml.config import MODEL_ARCH, ML_MODELS_DIR
+from ml.cache import image_digest, prediction_cache
+from ml.config import CASCADE_TRAIN, INFERENCE_CHUNK_SIZE, MODEL_ARCH, ML_MODELS_DIR
+from ml.embeddings import embedding_index
+from ml.executor import InferenceQueueFull, inference_executor
+from ml.export import load_metadata
+from ml.metrics import metrics
+from ml.persistence import PredictionWriter
 from models.user import Image, Prediction, User
 from services.database import get_db
 from services.s3_service import s3_service
@@ -15,8 +26,22 @@ from services.s3_service import s3_service
 router = APIRouter(prefix="/ml", tags=["Machine Learning"])
 
 ALLOWED_IMAGE_TYPES = {"image/jpeg", "image/png", "image/webp"}
+ALLOWED_IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+ZIP_CONTENT_TYPES = {"application/zip", "application/x-zip-compressed"}
+MAX_IMAGE_BYTES = 10 * 1024 * 1024  # 10MB per image
+#stream uploads held in memory up to this size, then on disk
+SPOOL_MAX_MEMORY = 16 * 1024 * 1024
 
-# NOTE: /predict/upload must come BEFORE /predict/{image_id} so FastAPI matches it first
+
+def inference_busy() -> HTTPException:
+    #fast load-shedding response when the inference queue is full
+    return HTTPException(
+        status_code=503,
+        detail="Inference queue is full, retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
+# NOTE: /predict/upload and /predict/stream must come BEFORE /predict/{image_id} so FastAPI matches them first
 @router.post("/predict/upload")
 async def predict_uploaded_image(
     file: UploadFile = File(...),
@@ -31,11 +56,144 @@ async def predict_uploaded_image(
     image_bytes = await file.read()
 
     service = PredictionService.get_instance()
-    if service.model is None:
-        if not service.load_model():
-            raise HTTPException(status_code=503, detail="No trained model available")
+    if not await run_in_threadpool(service.ensure_loaded):
+        raise HTTPException(status_code=503, detail="No trained model available")
+
+    #inference runs on the bounded executor; concurrent uploads share a batched forward pass
+    try:
+        #uploads are not stored, so there is nowhere to record a shadow result
+        return await inference_executor.run(service.predict, image_bytes, shadow=False)
+    except InferenceQueueFull:
+        raise inference_busy()
+
+
+def _is_zip(filename: str, content_type: str) -> bool:
+    return filename.lower().endswith(".zip") or content_type in ZIP_CONTENT_TYPES
 
-    return service.predict(image_bytes)
+
+def _spool_uploads(files: list) -> list:
+    #FastAPI closes the request's UploadFiles before a StreamingResponse body is iterated,
+    #so every upload is copied into a file the stream owns (and closes) while the handler still runs
+    uploads = []
+    for file in files:
+        name = file.filename or "upload"
+        zipped = _is_zip(name, file.content_type)
+        if not zipped and file.content_type not in ALLOWED_IMAGE_TYPES:
+            uploads.append((name, file.content_type, None))
+            continue
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+        file.file.seek(0)
+        if zipped:
+            shutil.copyfileobj(file.file, spool)
+        else:
+            #one byte past the limit is enough to reject an oversized image
+            spool.write(file.file.read(MAX_IMAGE_BYTES + 1))
+        spool.seek(0)
+        uploads.append((name, file.content_type, spool))
+    return uploads
+
+
+def _iter_upload_images(uploads: list):
+    #yields (filename, image bytes or None, error or None) one image at a time;
+    #uploads are (filename, content type, spooled copy) from _spool_uploads and zip entries are read on demand
+    for name, content_type, spool in uploads:
+        if _is_zip(name, content_type):
+            try:
+                with zipfile.ZipFile(spool) as zf:
+                    for entry in zf.infolist():
+                        inner_name = entry.filename.split("/")[-1]
+                        if entry.is_dir() or inner_name.startswith("."):
+                            continue
+                        if Path(inner_name).suffix.lower() not in ALLOWED_IMAGE_EXTENSIONS:
+                            continue
+                        if entry.file_size > MAX_IMAGE_BYTES:
+                            yield inner_name, None, f"File too large: {entry.file_size} bytes"
+                            continue
+                        try:
+                            image_bytes = zf.read(entry)
+                        except (zipfile.BadZipFile, NotImplementedError, OSError) as e:
+                            #one damaged or unsupported entry should not end the whole stream
+                            yield inner_name, None, f"Could not read ZIP entry: {e}"
+                            continue
+                        yield inner_name, image_bytes, None
+            except zipfile.BadZipFile:
+                yield name, None, "Invalid or corrupted ZIP file"
+            continue
+
+        if spool is None:
+            yield name, None, f"Invalid file type: {content_type}. Use JPEG, PNG, WEBP or ZIP."
+            continue
+        image_bytes = spool.read()
+        if len(image_bytes) > MAX_IMAGE_BYTES:
+            yield name, None, "File too large"
+            continue
+        yield name, image_bytes, None
+
+
+def _stream_predictions(service, uploads: list, chunk_size: int):
+    #owns the spooled uploads: closed once the stream ends, fails or is abandoned
+    try:
+        yield from _predict_uploads(service, uploads, chunk_size)
+    finally:
+        for _, _, spool in uploads:
+            if spool is not None:
+                spool.close()
+
+
+def _predict_uploads(service, uploads: list, chunk_size: int):
+    #NDJSON: one line per image as each batch finishes, then a summary line
+    total = failed = 0
+    chunk = []
+
+    def flush():
+        nonlocal failed
+        try:
+            results = inference_executor.submit(
+                service.predict_batch, [image_bytes for _, _, image_bytes in chunk], chunk_size, shadow=False
+            ).result()
+        except InferenceQueueFull:
+            results = [{"error": "Inference queue is full, retry shortly"}] * len(chunk)
+        except Exception as e:
+            results = [{"error": str(e)}] * len(chunk)
+        for (index, filename, _), result in zip(chunk, results):
+            failed += "error" in result
+            yield json.dumps({"index": index, "filename": filename, **result}) + "\n"
+        chunk.clear()
+
+    for filename, image_bytes, error in _iter_upload_images(uploads):
+        index = total
+        total += 1
+        if error is not None:
+            failed += 1
+            yield json.dumps({"index": index, "filename": filename, "error": error}) + "\n"
+            continue
+        chunk.append((index, filename, image_bytes))
+        if len(chunk) >= chunk_size:
+            yield from flush()
+
+    if chunk:
+        yield from flush()
+    yield json.dumps({"done": True, "total": total, "failed": failed}) + "\n"
+
+
+@router.post("/predict/stream")
+def predict_stream(
+    files: list[UploadFile] = File(...),
+    _: User = Depends(get_current_user),
+):
+    #score many images (or ZIPs of images) in one request; results stream back as NDJSON per batch
+    from ml.predict import PredictionService
+
+    service = PredictionService.get_instance()
+    if not service.ensure_loaded():
+        raise HTTPException(status_code=503, detail="No trained model available")
+
+    uploads = _spool_uploads(files)
+    #a sync generator: Starlette iterates it in the threadpool, so blocking reads and inference stay off the event loop
+    return StreamingResponse(
+        _stream_predictions(service, uploads, INFERENCE_CHUNK_SIZE),
+        media_type="application/x-ndjson",
+    )
 
 
 @router.post("/predict/{image_id}")
@@ -51,11 +209,38 @@ def predict_image(
     if not image:
         raise HTTPException(status_code=404, detail="Image not found")
 
+    service = PredictionService.get_instance()
+    if not service.ensure_loaded():
+        raise HTTPException(status_code=503, detail="No trained model available")
+
+    #already scored by this model version: answer from the stored row, no download and no new row
+    existing = (
+        db.query(Prediction)
+        .filter(
+            Prediction.image_id == image.id,
+            Prediction.model_version == service.model_version,
+            #a promoted candidate's earlier shadow rows carry this version too
+            Prediction.is_shadow.is_(False),
+        )
+        .order_by(Prediction.id.desc())
+        .first()
+    )
+    if existing:
+        return {
+            "prediction_id": existing.id,
+            "image_id": image.id,
+            "label": existing.predicted_label,
+            "confidence": existing.confidence,
+            "model": existing.model_name,
+            "cached": True,
+        }
+
     with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as tmp:
         tmp_path = tmp.name
 
     try:
-        success = s3_service.download_file(image.image_url, tmp_path)
+        with metrics.stage("download"):
+            success = s3_service.download_file(image.image_url, tmp_path)
         if not success:
             raise HTTPException(status_code=500, detail="Failed to download image from S3")
 
@@ -65,30 +250,31 @@ def predict_image(
         if os.path.exists(tmp_path):
             os.unlink(tmp_path)
 
-    service = PredictionService.get_instance()
-    if service.model is None:
-        if not service.load_model():
-            raise HTTPException(status_code=503, detail="No trained model available")
-
-    result = service.predict(image_bytes)
-
-    prediction = Prediction(
-        image_id=image.id,
-        model_name=service.arch,
-        predicted_label=result["label"],
-        confidence=result["confidence"],
-        model_version="latest",
-    )
-    db.add(prediction)
-    db.commit()
-    db.refresh(prediction)
+    digest = image_digest(image_bytes)
+    #only ask for an embedding the similarity index lacks: a required embedding bypasses DB-promoted cache
+    #entries, which never carry one
+    embed = not embedding_index.has(service.model_version, image.id)
+    if not embed:
+        prediction_cache.warm_from_db(db, [digest], service.model_version)
+
+    try:
+        result = inference_executor.submit(service.predict, image_bytes, digest, embed=embed).result()
+    except InferenceQueueFull:
+        raise inference_busy()
+
+    #production + shadow rows in one INSERT .. RETURNING, no refresh round trip
+    writer = PredictionWriter(db, service.arch)
+    writer.add_prediction(image.id, result, digest)
+    _, (prediction_id,) = writer.flush()
+    embedding_index.add_results([image.id], [result])
 
     return {
-        "prediction_id": prediction.id,
+        "prediction_id": prediction_id,
         "image_id": image.id,
         "label": result["label"],
         "confidence": result["confidence"],
         "model": service.arch,
+        "cached": False,
     }
 
 
@@ -97,36 +283,200 @@ def trigger_training(
     background_tasks: BackgroundTasks,
     arch: str = MODEL_ARCH,
     epochs: int = 20,
+    cascade: bool = CASCADE_TRAIN,
     _: User = Depends(get_current_admin),
 ):
     #trigger model training in the background (admin only)
-    from ml.train import train_model
+    from ml.train import train_and_reload
 
     if arch != "efficientnet_b0":
         raise HTTPException(status_code=400, detail="Invalid architecture")
 
-    background_tasks.add_task(train_model, arch=arch, epochs=epochs)
+    background_tasks.add_task(train_and_reload, arch=arch, epochs=epochs, cascade=cascade)
 
     return {
         "message": "Training started in background",
         "architecture": arch,
         "epochs": epochs,
+        "cascade": cascade,
     }
 
 
 @router.get("/model/status")
 def model_status(_: User = Depends(get_current_user)):
     #check if a trained model is available and its metadata
-    latest = ML_MODELS_DIR / "latest.pth"
-
-    if not latest.exists():
-        return {"available": False}
+    from ml.predict import PredictionService, model_version_of
 
-    checkpoint = torch.load(latest, map_location="cpu", weights_only=False)
+    #the model in service already holds its metadata; otherwise read the JSON sidecar, never the weights
+    current = PredictionService.get_instance().current
+    if current is not None:
+        metadata = current.summary
+    else:
+        latest = ML_MODELS_DIR / "latest.pth"
+        metadata = load_metadata(latest)
+        if metadata is None:
+            return {"available": False}
+        metadata = {**metadata, "model_version": model_version_of(metadata, latest)}
 
     return {
         "available": True,
-        "architecture": checkpoint.get("arch"),
-        "best_val_acc": checkpoint.get("best_val_acc"),
-        "trained_at": checkpoint.get("trained_at"),
+        "architecture": metadata.get("arch"),
+        "best_val_acc": metadata.get("best_val_acc"),
+        "cv_mean_acc": metadata.get("cv_mean_acc"),
+        "cv_mean_auc": metadata.get("cv_mean_auc"),
+        "trained_at": metadata.get("trained_at"),
+        "model_version": metadata.get("model_version"),
+        "cascade": metadata.get("cascade"),
+        "loaded": current is not None,
+    }
+
+
+@router.get("/model/rollout")
+def model_rollout(_: User = Depends(get_current_admin)):
+    #version in service and the state/timings of the latest hot reloads
+    from ml.predict import PredictionService
+
+    return PredictionService.get_instance().rollout_status()
+
+
+@router.get("/models")
+def list_models(_: User = Depends(get_current_admin)):
+    #registered model versions with metrics, plus the current and shadow candidate versions
+    from ml.predict import PredictionService
+    from ml.registry import model_registry
+
+    index = model_registry.index()
+    return {
+        "current": index.get("current"),
+        "candidate": index.get("candidate"),
+        "versions": sorted(index["versions"].values(), key=lambda entry: entry["registered_at"], reverse=True),
+        "shadow": PredictionService.get_instance().shadow_stats(),
     }
+
+
+@router.post("/models/{version}/promote")
+def promote_model(version: str, _: User = Depends(get_current_admin)):
+    #make a registered version current; the serving process hot-reloads it
+    from ml.predict import PredictionService
+    from ml.registry import model_registry
+
+    if model_registry.get(version) is None:
+        raise HTTPException(status_code=404, detail="Unknown model version")
+    model_registry.promote(version)
+    service = PredictionService.get_instance()
+    service.reload_if_changed()
+    service.sync_candidate()
+    return {"message": "Model promoted", "version": version}
+
+
+@router.put("/models/{version}/candidate")
+def set_candidate_model(version: str, _: User = Depends(get_current_admin)):
+    #shadow-score a registered version next to the current one
+    from ml.predict import PredictionService
+    from ml.registry import model_registry
+
+    if model_registry.get(version) is None:
+        raise HTTPException(status_code=404, detail="Unknown model version")
+    model_registry.set_candidate(version)
+    PredictionService.get_instance().sync_candidate()
+    return {"message": "Shadow candidate set", "version": version}
+
+
+@router.delete("/models/candidate")
+def clear_candidate_model(_: User = Depends(get_current_admin)):
+    from ml.predict import PredictionService
+    from ml.registry import model_registry
+
+    model_registry.set_candidate(None)
+    PredictionService.get_instance().sync_candidate()
+    return {"message": "Shadow candidate cleared"}
+
+
+@router.get("/images/{image_id}/similar")
+def similar_images(
+    image_id: int,
+    k: int = 10,
+    db: Session = Depends(get_db),
+    _: User = Depends(get_current_admin),
+):
+    #nearest stored images by embedding cosine similarity (current model version)
+    from ml.predict import PredictionService
+
+    service = PredictionService.get_instance()
+    if not service.ensure_loaded():
+        raise HTTPException(status_code=503, detail="No trained model available")
+
+    matches = embedding_index.similar(service.model_version, image_id, k=max(1, min(k, 100)))
+    if matches is None:
+        raise HTTPException(
+            status_code=404,
+            detail="No embedding for this image and model version (score it or run `python -m ml.embeddings backfill`)",
+        )
+
+    images = {image.id: image for image in db.query(Image).filter(Image.id.in_([i for i, _ in matches]))}
+    return {
+        "image_id": image_id,
+        "model_version": service.model_version,
+        "similar": [
+            {
+                "image_id": match_id,
+                "filename": images[match_id].filename,
+                "image_url": images[match_id].image_url,
+                "similarity": score,
+            }
+            for match_id, score in matches
+            if match_id in images
+        ],
+    }
+
+
+@router.get("/embeddings/stats")
+def embedding_stats(_: User = Depends(get_current_admin)):
+    #size of the similarity index and whether it is IVF-partitioned
+    return embedding_index.stats()
+
+
+@router.get("/dedup/stats")
+def dedup_stats(_: User = Depends(get_current_admin)):
+    #pHash index used to catch near-duplicate imports
+    from ml.dedup import phash_index
+
+    return phash_index.stats()
+
+
+@router.get("/batching/stats")
+def batching_stats(_: User = Depends(get_current_admin)):
+    #batch-size distribution and queue wait of the inference micro-batcher (for tuning)
+    from ml.predict import PredictionService
+
+    return PredictionService.get_instance().batching_stats()
+
+
+@router.get("/tta/stats")
+def tta_stats(_: User = Depends(get_current_admin)):
+    #how often test-time augmentation fired and its cost relative to a single forward pass
+    from ml.predict import PredictionService
+
+    return PredictionService.get_instance().tta_stats()
+
+
+@router.get("/cascade/stats")
+def cascade_stats(_: User = Depends(get_current_admin)):
+    #gate escalation rate and per-image cost of the cascade against the full model alone
+    from ml.predict import PredictionService
+
+    return PredictionService.get_instance().cascade_stats()
+
+
+@router.get("/cache/stats")
+def cache_stats(_: User = Depends(get_current_admin)):
+    #hit rate and size of the content-hash prediction cache
+    from ml.predict import PredictionService
+
+    return PredictionService.get_instance().cache_stats()
+
+
+@router.get("/executor/stats")
+def executor_stats(_: User = Depends(get_current_admin)):
+    #queue depth of the bounded inference executor
+    return inference_executor.stats()
@@ -2,12 +2,17 @@ from pathlib import Path
 from dotenv import load_dotenv
 load_dotenv(dotenv_path=Path(__file__).parent / ".env")
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import text
 from api.routes import auth, ml, leaderboard
 from services.database import engine, Base
 from models.user import User
+import logging
 import os
+import time
+
+logger = logging.getLogger(__name__)
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
@@ -42,16 +47,31 @@ app.include_router(auth.router)
 app.include_router(ml.router)
 app.include_router(leaderboard.router)
 
+@app.middleware("http")
+async def time_ml_routes(request: Request, call_next):
+    #end-to-end latency of /ml/* requests, labeled by route template (not raw path) to keep cardinality bounded
+    if not request.url.path.startswith("/ml"):
+        return await call_next(request)
+    from ml.metrics import metrics
+
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        metrics.observe_request(request.method, getattr(route, "path", "unmatched"), status, time.perf_counter() - started)
+
 @app.on_event("startup")
 async def load_ml_model():
+    #load + warm in the background so startup never blocks; /ready reports when it is done
     try:
         from ml.predict import PredictionService
-        service = PredictionService.get_instance()
-        if service.load_model():
-            import logging
-            logging.getLogger(__name__).info("ML model loaded at startup")
+        PredictionService.get_instance().start_background()
     except Exception:
-        pass  # model may not exist yet (before first training run)
+        logger.exception("ML model startup could not be scheduled")
 
 
 @app.get("/")
@@ -60,4 +80,58 @@ async def root():
 
 @app.get("/health")
 async def health_check():
+    #liveness only: the process is up (see /ready for traffic readiness)
     return {"status": "healthy"}
+
+
+def _check_database() -> dict:
+    started = time.perf_counter()
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except Exception as e:
+        return {"ready": False, "error": str(e)}
+    return {"ready": True, "latency_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+
+def _check_s3() -> dict:
+    #client construction only; no per-probe network call to S3
+    try:
+        from services.s3_service import s3_service
+    except Exception as e:
+        return {"ready": False, "error": str(e)}
+    ready = s3_service.s3_client is not None and bool(s3_service.bucket_name)
+    return {"ready": ready, "bucket": s3_service.bucket_name}
+
+
+def _check_model() -> dict:
+    try:
+        from ml.predict import PredictionService
+    except Exception as e:
+        return {"ready": False, "state": "unavailable", "error": str(e)}
+    status = PredictionService.get_instance().readiness()
+    #no checkpoint trained yet: nothing to warm, so it does not hold the worker out of rotation
+    if status["state"] == "no_model":
+        status["ready"] = True
+    return status
+
+
+@app.get("/ready")
+def readiness(response: Response):
+    #readiness for load balancers: DB reachable, S3 client configured, model loaded and warmed
+    checks = {
+        "database": _check_database(),
+        "s3": _check_s3(),
+        "model": _check_model(),
+    }
+    ready = all(check["ready"] for check in checks.values())
+    response.status_code = 200 if ready else 503
+    return {"status": "ready" if ready else "not_ready", "checks": checks}
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    #Prometheus text exposition of the inference histograms (this process only)
+    from ml.metrics import metrics
+
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
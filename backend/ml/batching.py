@@ -0,0 +1,121 @@
+"""Dynamic micro-batching: groups concurrent predict calls into one forward pass"""
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from queue import Empty, Queue
+from typing import Any, Callable
+
+from ml.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Collects items submitted from many threads and hands them to `run_batch`
+    in groups. A batch is flushed when it reaches `max_batch_size` or when the
+    oldest queued item has waited `max_wait_ms`, whichever comes first.
+
+    `run_batch` receives a list of items and must return a list of results in
+    the same order. Each caller gets a Future resolved with its own result.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[list], list],
+        max_batch_size: int = 16,
+        max_wait_ms: float = 5.0,
+        name: str = "micro-batcher",
+    ):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.name = name
+
+        self._queue: Queue = Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+        #tuning stats — guarded by _stats_lock
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._batches = 0
+        self._items = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def submit(self, item: Any) -> Future:
+        self._ensure_started()
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _collect(self) -> list:
+        #block for the first item, then keep pulling until the window closes or the batch fills
+        batch = [self._queue.get()]
+        deadline = batch[0][2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    #window already closed (the queue backed up behind a slow batch): take what is queued, wait for nothing
+                    batch.append(self._queue.get_nowait())
+            except Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            items = [entry[0] for entry in batch]
+            futures = [entry[1] for entry in batch]
+            waits = [started - entry[2] for entry in batch]
+
+            try:
+                results = self.run_batch(items)
+            except Exception as e:
+                logger.exception(f"{self.name}: batch of {len(items)} failed")
+                for future in futures:
+                    future.set_exception(e)
+            else:
+                for future, result in zip(futures, results):
+                    future.set_result(result)
+
+            self._record(len(batch), waits)
+
+    def _record(self, size: int, waits: list):
+        for wait in waits:
+            metrics.observe_stage("queue_wait", wait)
+        with self._stats_lock:
+            self._batch_sizes[size] += 1
+            self._batches += 1
+            self._items += size
+            self._wait_total += sum(waits)
+            self._wait_max = max(self._wait_max, max(waits))
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "batches": self._batches,
+                "items": self._items,
+                "mean_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+                "batch_size_distribution": dict(sorted(self._batch_sizes.items())),
+                "queue_wait_mean_ms": round(self._wait_total / self._items * 1000, 3) if self._items else 0.0,
+                "queue_wait_max_ms": round(self._wait_max * 1000, 3),
+                "queue_depth": self._queue.qsize(),
+            }
@@ -0,0 +1,123 @@
+"""Content-hash prediction cache keyed by image SHA-256 + model version"""
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from ml.config import PREDICTION_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+def image_digest(image_bytes: bytes) -> str:
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+class PredictionCache:
+    """
+    Two tiers:
+      - memory: bounded LRU of {(digest, model_version): result}, checked by PredictionService
+      - persistent: the `predictions` table (image_sha256 + model_version), promoted
+        into memory by `warm_from_db` before a batch is scored
+
+    Loading a different model version clears the memory tier. Persistent rows
+    are never deleted; they simply stop matching once the version changes.
+
+    Memory entries keep the float16 embedding when the scoring pass produced one
+    (~2.5 KB each), so callers that need embeddings can still be answered from
+    the cache; entries promoted from the database never have one.
+    """
+
+    def __init__(self, max_entries: int = PREDICTION_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.model_version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._db_hits = 0
+
+    def get(self, digest: str, model_version: str, need_embedding: bool = False) -> Optional[dict]:
+        #need_embedding: an entry without an embedding counts as a miss
+        if self.max_entries <= 0:
+            return None
+        key = (digest, model_version)
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None or (need_embedding and "embedding" not in result):
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return dict(result)
+
+    def put(self, digest: str, model_version: str, result: dict):
+        if self.max_entries <= 0 or "error" in result:
+            return
+        key = (digest, model_version)
+        entry = {
+            "label": result["label"],
+            "confidence": result["confidence"],
+            "model_version": model_version,
+        }
+        if "embedding" in result:
+            entry["embedding"] = result["embedding"]
+        with self._lock:
+            previous = self._entries.get(key)
+            #a DB-promoted entry must not replace one that already carries the embedding
+            if previous is not None and "embedding" in previous and "embedding" not in entry:
+                entry["embedding"] = previous["embedding"]
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, model_version: str):
+        #called on every model load; a new version makes every cached entry stale
+        with self._lock:
+            if model_version != self.model_version:
+                self._entries.clear()
+                logger.info(f"Prediction cache cleared for model version {model_version}")
+            self.model_version = model_version
+
+    def warm_from_db(self, db, digests: list, model_version: str) -> int:
+        #persistent tier: promote stored predictions for these digests into memory (one query)
+        from models.user import Prediction
+
+        wanted = list({d for d in digests if d})
+        if not wanted or not model_version:
+            return 0
+
+        rows = (
+            db.query(Prediction.image_sha256, Prediction.predicted_label, Prediction.confidence)
+            .filter(
+                Prediction.image_sha256.in_(wanted),
+                Prediction.model_version == model_version,
+                Prediction.is_shadow.is_(False),
+            )
+            .all()
+        )
+        for digest, label, confidence in rows:
+            self.put(digest, model_version, {"label": label, "confidence": confidence})
+
+        with self._lock:
+            self._db_hits += len(rows)
+        return len(rows)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "model_version": self.model_version,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "db_promotions": self._db_hits,
+            }
+
+
+# Global prediction cache instance
+prediction_cache = PredictionCache()
@@ -0,0 +1,148 @@
+"""
+Two-stage cascade: a small low-resolution gate in front of the full model.
+
+The gate (MobileNetV3-Small on a CASCADE_IMAGE_SIZE downsample of the same
+normalized batch) scores every image. Only rows whose gate confidence is below
+the calibrated threshold are escalated to the full model, as one sub-batch, so
+confidently classified images never pay for the 224px EfficientNet pass.
+
+The threshold is chosen at training time on held-out images: the lowest one
+whose cascade accuracy stays within CASCADE_MAX_ACC_DROP of the full model's
+accuracy on the same images. Gate weights, threshold and the calibration /
+throughput report travel inside the main checkpoint.
+
+Train with `python -m ml.train --cascade`, serve with ML_CASCADE=1.
+"""
+import threading
+import time
+from typing import Callable, Optional
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from ml.config import CASCADE_MAX_ACC_DROP, CASCADE_THRESHOLD
+
+
+def calibrate_threshold(
+    gate_probs: np.ndarray,
+    full_preds: np.ndarray,
+    labels: np.ndarray,
+    max_drop: float = CASCADE_MAX_ACC_DROP,
+) -> dict:
+    """
+    gate_probs: (N, C) gate softmax; full_preds / labels: (N,) on the same held-out images.
+    Images with gate confidence >= threshold keep the gate's label, the rest take the
+    full model's. Returns the threshold plus cascade vs baseline accuracy at it.
+    """
+    labels = np.asarray(labels)
+    full_correct = np.asarray(full_preds) == labels
+    confidences = gate_probs.max(axis=1)
+    gate_correct = gate_probs.argmax(axis=1) == labels
+
+    #gating the k most confident images: accuracy = gate hits among them + full-model hits among the rest
+    order = np.argsort(-confidences, kind="stable")
+    confidences = confidences[order]
+    gate_hits = np.concatenate([[0], np.cumsum(gate_correct[order])])
+    full_misses_gated = np.concatenate([[0], np.cumsum(~full_correct[order])])
+    n = len(labels)
+    accuracy = (gate_hits + full_correct.sum() - (np.arange(n + 1) - full_misses_gated)) / n
+
+    #a threshold gates every image at or above it, so only the last index of each tie group is reachable
+    reachable = np.concatenate([[True], np.append(confidences[1:] != confidences[:-1], True)])
+    baseline = full_correct.mean()
+    ok = np.flatnonzero(reachable & (accuracy >= baseline - max_drop))
+    k = int(ok.max())  # k = 0 (escalate everything) always qualifies
+    #k = 0: above any softmax confidence, so every image is escalated
+    threshold = float(confidences[k - 1]) if k > 0 else 1.01
+
+    return {
+        "threshold": threshold,
+        "max_acc_drop": max_drop,
+        "samples": n,
+        "baseline_acc": round(float(baseline) * 100, 2),
+        "cascade_acc": round(float(accuracy[k]) * 100, 2),
+        "gate_acc": round(float(gate_correct.mean()) * 100, 2),
+        "escalation_rate": round(1 - k / n, 4),
+    }
+
+
+def seconds_per_image(run: Callable[[torch.Tensor], torch.Tensor], batch: torch.Tensor, repeats: int = 3) -> float:
+    #best-of-`repeats` wall time of one batched pass, per image (first call warms up)
+    with torch.no_grad():
+        run(batch)
+        timings = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            run(batch)
+            if batch.is_cuda:
+                torch.cuda.synchronize()
+            timings.append(time.perf_counter() - started)
+    return min(timings) / batch.shape[0]
+
+
+def throughput_report(gate_seconds: float, full_seconds: float, escalation_rate: float) -> dict:
+    #cascade cost per image = every image through the gate + escalated ones through the full model
+    cascade_seconds = gate_seconds + escalation_rate * full_seconds
+    return {
+        "gate_ms_per_image": round(gate_seconds * 1000, 3),
+        "full_ms_per_image": round(full_seconds * 1000, 3),
+        "cascade_ms_per_image": round(cascade_seconds * 1000, 3),
+        "speedup": round(full_seconds / cascade_seconds, 2) if cascade_seconds else None,
+    }
+
+
+class Cascade:
+    def __init__(self, gate, metadata: dict, threshold: Optional[float] = CASCADE_THRESHOLD):
+        self.gate = gate
+        self.metadata = metadata
+        self.threshold = metadata["threshold"] if threshold is None else threshold
+        #measured on this host at warm-up (see measure); None until then
+        self.gate_seconds = None
+        self.full_seconds = None
+
+        self._lock = threading.Lock()
+        self._images = 0
+        self._escalated = 0
+
+    def run(self, batch: torch.Tensor) -> tuple:
+        """
+        Gate pass over a normalized batch. Returns (gate probabilities, indices
+        of the rows to escalate to the full model).
+        """
+        with torch.no_grad():
+            probabilities = F.softmax(self.gate(batch), dim=1)
+        escalate = (probabilities.max(dim=1).values < self.threshold).nonzero(as_tuple=True)[0]
+
+        with self._lock:
+            self._images += batch.shape[0]
+            self._escalated += escalate.numel()
+        return probabilities, escalate
+
+    def measure(self, full: Callable[[torch.Tensor], torch.Tensor], batch: torch.Tensor):
+        self.gate_seconds = seconds_per_image(self.gate, batch)
+        self.full_seconds = seconds_per_image(full, batch)
+        #warm-up batches are not traffic
+        with self._lock:
+            self._images = 0
+            self._escalated = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            images, escalated = self._images, self._escalated
+        rate = escalated / images if images else None
+        stats = {
+            "arch": self.metadata.get("arch"),
+            "image_size": self.metadata.get("image_size"),
+            "threshold": self.threshold,
+            "images": images,
+            "escalated": escalated,
+            "escalation_rate": round(rate, 4) if rate is not None else None,
+            #held-out accuracy / escalation rate from training, against the full model alone
+            "calibration": self.metadata.get("calibration"),
+            "trained_throughput": self.metadata.get("throughput"),
+        }
+        if self.gate_seconds is not None and self.full_seconds is not None:
+            observed = rate if rate is not None else self.metadata["calibration"]["escalation_rate"]
+            stats["throughput"] = throughput_report(self.gate_seconds, self.full_seconds, observed)
+        return stats
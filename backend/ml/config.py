@@ -1,4 +1,5 @@
 """ML Configuration: label mappings and hyperparameters"""
+import os
 from pathlib import Path
 
 BACKEND_DIR = Path(__file__).resolve().parent.parent
@@ -15,6 +16,12 @@ MODEL_LABELS = {
 MODEL_ARCH = "efficientnet_b0"
 NUM_CLASSES = 2
 IMAGE_SIZE = 224
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+#single-channel variant: dental X-rays are grayscale, so the stem conv takes 1xHxW
+GRAYSCALE = os.getenv("ML_GRAYSCALE", "0") == "1"
+GRAYSCALE_MEAN = [0.449]
+GRAYSCALE_STD = [0.226]
 BATCH_SIZE = 32
 NUM_EPOCHS = 100
 LEARNING_RATE = 0.0001
@@ -27,3 +34,106 @@ N_FOLDS = 3
 #early stopping
 EARLY_STOP_PATIENCE = 7
 SCHEDULER_PATIENCE = 3
+
+#serving: dynamic micro-batching (concurrent predict calls share one forward pass)
+INFERENCE_BATCHING = os.getenv("ML_INFERENCE_BATCHING", "1") == "1"
+INFERENCE_MAX_BATCH_SIZE = int(os.getenv("ML_INFERENCE_MAX_BATCH_SIZE", "16"))
+INFERENCE_MAX_WAIT_MS = float(os.getenv("ML_INFERENCE_MAX_WAIT_MS", "5"))
+#serving: predict_batch forward chunk size (bulk import / batch scripts)
+INFERENCE_CHUNK_SIZE = int(os.getenv("ML_INFERENCE_CHUNK_SIZE", "32"))
+
+#serving: bounded executor that runs inference off the event loop
+#workers >= max batch size so the micro-batcher can actually fill a batch
+INFERENCE_EXECUTOR_WORKERS = int(os.getenv("ML_INFERENCE_EXECUTOR_WORKERS", str(INFERENCE_MAX_BATCH_SIZE)))
+INFERENCE_QUEUE_SIZE = int(os.getenv("ML_INFERENCE_QUEUE_SIZE", "64"))
+
+#serving: optional shared-weight worker pool (python -m ml.workers); API workers dispatch to it when set
+INFERENCE_POOL_SOCKET = os.getenv("ML_INFERENCE_POOL_SOCKET")
+INFERENCE_POOL_WORKERS = int(os.getenv("ML_INFERENCE_POOL_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+#required whenever the pool is used: the socket speaks pickle, so the key is what keeps other local users out
+INFERENCE_POOL_AUTHKEY = os.getenv("ML_INFERENCE_POOL_AUTHKEY", "").encode() or None
+#seconds a pool worker waits on a silent client (handshake, request, or a stalled read/write) before dropping it
+INFERENCE_POOL_IO_TIMEOUT = float(os.getenv("ML_INFERENCE_POOL_IO_TIMEOUT", "30"))
+
+#serving: in-memory LRU tier of the content-hash prediction cache (0 disables caching)
+PREDICTION_CACHE_SIZE = int(os.getenv("ML_PREDICTION_CACHE_SIZE", "10000"))
+
+#serving backend: "eager", "torchscript" or "onnx" (falls back to eager if the artifact is missing/unusable)
+INFERENCE_BACKEND = os.getenv("ML_INFERENCE_BACKEND", "eager")
+#exported inference artifacts written next to each checkpoint by train_model
+#add onnx (ML_EXPORT_FORMATS=torchscript,onnx) only where onnx + onnxruntime are installed; they are not in requirements.txt
+EXPORT_FORMATS = tuple(f for f in os.getenv("ML_EXPORT_FORMATS", "torchscript").split(",") if f)
+
+#serving: CPU optimizations applied to the eager model, comma-separated (see ml/optimize.py)
+#  fuse, channels_last, dynamic_int8, static_int8 — e.g. "fuse,channels_last"; "" for none
+INFERENCE_OPTIMIZATIONS = os.getenv("ML_INFERENCE_OPTIMIZATIONS", "")
+QUANT_CALIBRATION_DIR = Path(os.getenv("ML_QUANT_CALIBRATION_DIR", str(ML_MODELS_DIR / "calibration")))
+QUANT_CALIBRATION_SAMPLES = int(os.getenv("ML_QUANT_CALIBRATION_SAMPLES", "64"))
+
+#decode: reduced-resolution decode (JPEG DCT scaling) shared by training and serving (see ml/decode.py)
+#off by default so existing checkpoints keep the preprocessing they were trained with; enable for both sides together
+DECODE_FAST = os.getenv("ML_DECODE_FAST", "0") == "1"
+DECODE_DRAFT_SIZE = int(os.getenv("ML_DECODE_DRAFT_SIZE", str(IMAGE_SIZE * 2)))
+DECODE_MAX_PIXELS = int(os.getenv("ML_DECODE_MAX_PIXELS", str(64 * 1024 * 1024)))
+
+#serving: poll latest.pth every N seconds and hot-reload when it changes (0 disables)
+MODEL_WATCH_INTERVAL = float(os.getenv("ML_MODEL_WATCH_INTERVAL", "30"))
+
+#serving: shadow scoring — the registry candidate (python -m ml.registry candidate <version>) scores this
+#fraction of production traffic in the same forward loop; both results are stored in `predictions`
+SHADOW_FRACTION = float(os.getenv("ML_SHADOW_FRACTION", "0.1"))
+
+#serving: test-time augmentation for borderline images (see ml/tta.py) — only first-pass confidences
+#inside [TTA_MIN_CONFIDENCE, TTA_MAX_CONFIDENCE] get augmented views, all in one extra forward pass
+TTA_ENABLED = os.getenv("ML_TTA", "0") == "1"
+TTA_VIEWS = os.getenv("ML_TTA_VIEWS", "hflip,shift")
+TTA_MIN_CONFIDENCE = float(os.getenv("ML_TTA_MIN_CONFIDENCE", "0.0"))
+TTA_MAX_CONFIDENCE = float(os.getenv("ML_TTA_MAX_CONFIDENCE", "0.7"))
+TTA_SHIFT_PX = int(os.getenv("ML_TTA_SHIFT_PX", "8"))
+
+#embeddings: float16 pooled features stored per image for near-duplicate / similar-image search (see ml/embeddings.py)
+EMBEDDINGS_DIR = Path(os.getenv("ML_EMBEDDINGS_DIR", str(ML_MODELS_DIR / "embeddings")))
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("ML_NEAR_DUPLICATE_THRESHOLD", "0.97"))
+SIMILARITY_IVF_MIN_SIZE = int(os.getenv("ML_SIMILARITY_IVF_MIN_SIZE", "20000"))
+SIMILARITY_IVF_PROBES = int(os.getenv("ML_SIMILARITY_IVF_PROBES", "8"))
+
+#import dedup: renamed / re-encoded copies within this many pHash bits count as duplicates (see ml/dedup.py)
+PHASH_MAX_DISTANCE = int(os.getenv("ML_PHASH_MAX_DISTANCE", "6"))
+
+#cascade (see ml/cascade.py): a low-resolution gate trained next to the main model (python -m ml.train --cascade);
+#with ML_CASCADE=1 only images the gate is unsure about are escalated to the full model
+CASCADE_ENABLED = os.getenv("ML_CASCADE", "0") == "1"
+CASCADE_TRAIN = os.getenv("ML_CASCADE_TRAIN", "0") == "1"
+CASCADE_ARCH = "mobilenet_v3_small"
+CASCADE_IMAGE_SIZE = int(os.getenv("ML_CASCADE_IMAGE_SIZE", "96"))
+CASCADE_EPOCHS = int(os.getenv("ML_CASCADE_EPOCHS", "30"))
+CASCADE_LEARNING_RATE = 0.001
+#calibration: lowest gate threshold whose held-out accuracy stays within this of the full model's (fraction, not %)
+CASCADE_MAX_ACC_DROP = float(os.getenv("ML_CASCADE_MAX_ACC_DROP", "0.005"))
+#optional override of the calibrated threshold stored in the checkpoint
+CASCADE_THRESHOLD = float(os.environ["ML_CASCADE_THRESHOLD"]) if os.getenv("ML_CASCADE_THRESHOLD") else None
+
+#observability: per-stage latency / batch-size histograms exported at /metrics (see ml/metrics.py)
+METRICS_ENABLED = os.getenv("ML_METRICS", "1") == "1"
+
+#training: images decoded + resized once and kept across runs in a uint8 memmap keyed by S3 ETag (see ml/image_cache.py)
+TRAINING_CACHE = os.getenv("ML_TRAINING_CACHE", "1") == "1"
+TRAINING_CACHE_DIR = Path(os.getenv("ML_TRAINING_CACHE_DIR", str(BACKEND_DIR / "ml" / "training_cache")))
+#stored side: a little above IMAGE_SIZE, so the per-epoch Resize still downsamples as it does from a full decode
+TRAINING_CACHE_SIDE = int(os.getenv("ML_TRAINING_CACHE_SIDE", str(IMAGE_SIZE + 32)))
+
+#data prep: concurrent S3 downloads for the training sync (see services/s3_downloader.py)
+S3_DOWNLOAD_WORKERS = int(os.getenv("ML_S3_DOWNLOAD_WORKERS", "16"))
+S3_DOWNLOAD_ATTEMPTS = int(os.getenv("ML_S3_DOWNLOAD_ATTEMPTS", "5"))
+
+#training DataLoaders (see ml/loader.py): decode + augmentation in worker processes, kept alive across epochs and folds
+LOADER_WORKERS = int(os.getenv("ML_LOADER_WORKERS", str(min(8, (os.cpu_count() or 2) // 2))))
+#batches each worker prepares ahead of the training loop
+LOADER_PREFETCH = int(os.getenv("ML_LOADER_PREFETCH", "2"))
+LOADER_PERSISTENT = os.getenv("ML_LOADER_PERSISTENT", "1") == "1"
+#"auto": pinned host memory only when training on CUDA
+LOADER_PIN_MEMORY = {"1": True, "0": False}.get(os.getenv("ML_LOADER_PIN_MEMORY", "auto"))
+
+#cross-validation: >1 trains that many folds at once in separate processes, each with an equal share of the CPU
+#threads and loader workers (CPU training only; fold results are identical in shape and order to a sequential run)
+CV_FOLD_PROCESSES = int(os.getenv("ML_CV_FOLD_PROCESSES", "1"))
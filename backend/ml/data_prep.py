@@ -1,104 +1,229 @@
-"""Downloads labeled images from S3 into ImageFolder structure for PyTorch training"""
+"""
+Syncs labeled images from S3 into ImageFolder structure for PyTorch training.
+
+The local copy (TRAINING_DATA_DIR/all/<label>/) persists between runs. A manifest
+records key, size and ETag of every synced object; each run lists the bucket,
+downloads only new or changed objects and deletes local files whose objects are gone.
+
+Usage (from backend/ directory):
+    python3 -m ml.data_prep sync
+    python3 -m ml.data_prep clean
+"""
+import argparse
+import json
 import logging
 import os
 import random
 import shutil
 from pathlib import Path
 
-from ml.config import MODEL_LABELS, TRAINING_DATA_DIR, TRAIN_SPLIT, VAL_SPLIT, TEST_SPLIT, RANDOM_SEED
+from botocore.exceptions import BotoCoreError, ClientError
+
+from ml.config import (
+    MODEL_LABELS,
+    RANDOM_SEED,
+    S3_DOWNLOAD_ATTEMPTS,
+    S3_DOWNLOAD_WORKERS,
+    TEST_SPLIT,
+    TRAIN_SPLIT,
+    TRAINING_DATA_DIR,
+    VAL_SPLIT,
+)
 from services.s3_service import s3_service
 
 logger = logging.getLogger(__name__)
 
-#helper func used by both "prepare" funcs to avoid repetition of mkdir + download loop
-def _download_to(urls: list, dest_dir: Path) -> int:
-    dest_dir.mkdir(parents=True, exist_ok=True)
-    count = 0
-    for url in urls:
-        local_path = str(dest_dir / os.path.basename(url))
-        if s3_service.download_file(url, local_path):
-            count += 1
-    return count
+ALL_DIR = TRAINING_DATA_DIR / "all"
+MANIFEST_PATH = TRAINING_DATA_DIR / "manifest.json"
 
-def prepare_training_data() -> tuple[Path, Path, Path]:
-    cleanup_training_data()
 
-    train_dir = TRAINING_DATA_DIR / "train"
-    val_dir = TRAINING_DATA_DIR / "val"
-    test_dir = TRAINING_DATA_DIR / "test"
+def load_manifest() -> dict:
+    #{s3 key: {"etag", "size", "path" (relative to TRAINING_DATA_DIR)}}; {} before the first sync
+    try:
+        return json.loads(MANIFEST_PATH.read_text())["objects"]
+    except (OSError, ValueError, KeyError):
+        return {}
 
-    random.seed(RANDOM_SEED)
 
-    downloaded_count = 0
+def _write_manifest(objects: dict):
+    MANIFEST_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = MANIFEST_PATH.with_name(MANIFEST_PATH.name + ".tmp")
+    tmp.write_text(json.dumps({"version": 1, "objects": objects}))
+    tmp.replace(MANIFEST_PATH)
 
-    for label, prefix in MODEL_LABELS.items():
-        print(f"Listing images for label '{label}' (prefix: {prefix})...")
-        urls = s3_service.list_objects(prefix)
 
-        if not urls:
-            print(f"  WARNING: No images found under prefix '{prefix}'")
-            continue
-
-        #shuffle and split into train/val/test (80/10/10)
-        random.shuffle(urls)
-        train_end = int(len(urls) * TRAIN_SPLIT)
-        val_end = train_end + int(len(urls) * VAL_SPLIT)
-        test_end = val_end + int(len(urls) * TEST_SPLIT)
-        train_urls = urls[:train_end]
-        val_urls = urls[train_end:val_end]
-        test_urls = urls[val_end:test_end]
+def load_etags() -> dict:
+    #{path relative to TRAINING_DATA_DIR: etag}, so the decoded-image cache can key on content without hashing files
+    return {entry["path"]: entry["etag"] for entry in load_manifest().values() if entry.get("etag")}
 
-        print(f"  Found {len(urls)} images — {len(train_urls)} train, {len(val_urls)} val, {len(test_urls)} test")
-        
-        downloaded_count += _download_to(train_urls, train_dir / label)
-        downloaded_count += _download_to(val_urls, val_dir / label)
-        downloaded_count += _download_to(test_urls, test_dir / label)
 
+def sync_label(label: str, prefix: str, manifest: dict, workers: int = S3_DOWNLOAD_WORKERS) -> dict:
+    """
+    Bring ALL_DIR/<label> in line with the objects under `prefix`, updating
+    `manifest` in place. Returns counts of downloaded / unchanged / deleted / failed
+    objects plus the download report (throughput, per-object failures).
+    """
+    dest_dir = ALL_DIR / label
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    #raises on a failed listing: read as an empty prefix it would delete this label's whole local copy
+    entries = s3_service.list_object_entries(prefix)
+    listed = {entry["key"] for entry in entries}
+    counts = {"listed": len(entries), "downloaded": 0, "unchanged": 0, "deleted": 0, "failed": 0}
+
+    #objects removed from (or relabeled out of) this prefix
+    for key in [k for k, entry in manifest.items() if entry.get("label") == label and k not in listed]:
+        (TRAINING_DATA_DIR / manifest.pop(key)["path"]).unlink(missing_ok=True)
+        counts["deleted"] += 1
+
+    changed = {}
+    for entry in entries:
+        known = manifest.get(entry["key"])
+        if (
+            known is not None
+            and known["etag"] == entry["etag"]
+            and known["size"] == entry["size"]
+            and (TRAINING_DATA_DIR / known["path"]).exists()
+        ):
+            counts["unchanged"] += 1
+            continue
+        changed[entry["key"]] = entry
+
+    def record(key: str, local_path: Path, ok: bool):
+        if not ok:
+            counts["failed"] += 1
+            return
+        entry = changed[key]
+        manifest[key] = {
+            "label": label,
+            "etag": entry["etag"],
+            "size": entry["size"],
+            "path": str(local_path.relative_to(TRAINING_DATA_DIR)),
+        }
+        counts["downloaded"] += 1
+
+    #concurrent + retried; each file lands via a .part name, so a crash never leaves a truncated image
+    jobs = [(key, dest_dir / os.path.basename(key)) for key in changed]
+    report = s3_service.downloader(workers=workers, max_attempts=S3_DOWNLOAD_ATTEMPTS).download(jobs, on_done=record)
+    counts["download"] = report.as_dict()
+
+    #files nobody tracks (e.g. left by the pre-manifest layout) would otherwise be trained on
+    tracked = {manifest[key]["path"] for key in listed if key in manifest}
+    for path in dest_dir.iterdir():
+        if path.is_file() and str(path.relative_to(TRAINING_DATA_DIR)) not in tracked:
+            path.unlink()
+
+    return counts
+
+
+def sync_all(workers: int = S3_DOWNLOAD_WORKERS) -> int:
+    #incremental sync of every MODEL_LABELS prefix; returns the number of local images
+    manifest = load_manifest()
+    total = 0
 
-    print(f"Downloaded {downloaded_count} images total")
-
-    if downloaded_count == 0:
+    for label, prefix in MODEL_LABELS.items():
+        print(f"Syncing images for label '{label}' (prefix: {prefix})...")
+        try:
+            counts = sync_label(label, prefix, manifest, workers)
+        except (ClientError, BotoCoreError) as e:
+            raise RuntimeError(f"Listing S3 prefix '{prefix}' failed; the local copy was left as it is: {e}") from e
+        #saved per label, so an interrupted run keeps what it already downloaded
+        _write_manifest(manifest)
+
+        if not counts["listed"]:
+            print(f"  WARNING: No images found under prefix '{prefix}'")
+            continue
+        print(
+            f"  Found {counts['listed']} images — {counts['downloaded']} downloaded, "
+            f"{counts['unchanged']} unchanged, {counts['deleted']} deleted, {counts['failed']} failed"
+        )
+        download = counts["download"]
+        if download["objects"]:
+            print(
+                f"  Downloaded {download['bytes'] / (1024 * 1024):.1f} MB in {download['seconds']}s — "
+                f"{download['objects_per_s']} objects/s, {download['mb_per_s']} MB/s ({download['retries']} retries)"
+            )
+        for failure in download["failures"]:
+            print(f"  FAILED {failure['key']} after {failure['attempts']} attempt(s): {failure['error']}")
+        total += counts["listed"] - counts["failed"]
+
+    if total == 0:
         raise RuntimeError(
             "No images were downloaded from S3. "
             "Check that your S3 bucket has images under the prefixes: "
             f"{list(MODEL_LABELS.values())}"
         )
+    print(f"{total} images available locally")
+    return total
 
-    return train_dir, val_dir, test_dir
 
+def _link(src: Path, dest: Path):
+    #split dirs are views of the synced copy: hard links, or copies across filesystems
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
 
-#func skips train/val/test splitting — cross-validation in train.py handles the splits instead
-def prepare_all_data() -> Path:
-    cleanup_training_data()
 
-    all_dir = TRAINING_DATA_DIR / "all"
-    downloaded_count = 0
+def prepare_training_data() -> tuple[Path, Path, Path]:
+    sync_all()
 
-    for label, prefix in MODEL_LABELS.items():
-        print(f"Listing images for label '{label}' (prefix: {prefix})...")
-        urls = s3_service.list_objects(prefix)
+    train_dir = TRAINING_DATA_DIR / "train"
+    val_dir = TRAINING_DATA_DIR / "val"
+    test_dir = TRAINING_DATA_DIR / "test"
+    for split_dir in (train_dir, val_dir, test_dir):
+        if split_dir.exists():
+            shutil.rmtree(split_dir)
 
-        if not urls:
-            print(f"  WARNING: No images found under prefix '{prefix}'")
+    random.seed(RANDOM_SEED)
+
+    for label in MODEL_LABELS:
+        paths = sorted((ALL_DIR / label).iterdir()) if (ALL_DIR / label).exists() else []
+        if not paths:
             continue
 
-        print(f"  Found {len(urls)} images")
-        downloaded_count += _download_to(urls, all_dir / label)
+        #shuffle and split into train/val/test (80/10/10)
+        random.shuffle(paths)
+        train_end = int(len(paths) * TRAIN_SPLIT)
+        val_end = train_end + int(len(paths) * VAL_SPLIT)
+        test_end = val_end + int(len(paths) * TEST_SPLIT)
+        splits = {
+            train_dir: paths[:train_end],
+            val_dir: paths[train_end:val_end],
+            test_dir: paths[val_end:test_end],
+        }
+
+        print(f"  {label}: {len(splits[train_dir])} train, {len(splits[val_dir])} val, {len(splits[test_dir])} test")
+        for split_dir, split_paths in splits.items():
+            (split_dir / label).mkdir(parents=True, exist_ok=True)
+            for path in split_paths:
+                _link(path, split_dir / label / path.name)
 
+    return train_dir, val_dir, test_dir
 
-    print(f"Downloaded {downloaded_count} images total")
 
-    if downloaded_count == 0:
-        raise RuntimeError(
-            "No images were downloaded from S3. "
-            "Check that your S3 bucket has images under the prefixes: "
-            f"{list(MODEL_LABELS.values())}"
-        )
-
-    return all_dir
+#func skips train/val/test splitting — cross-validation in train.py handles the splits instead
+def prepare_all_data() -> Path:
+    sync_all()
+    return ALL_DIR
 
 
 def cleanup_training_data():
+    #drops the synced copy and its manifest; the next sync downloads everything again
     if TRAINING_DATA_DIR.exists():
         shutil.rmtree(TRAINING_DATA_DIR)
         logger.info(f"Cleaned up training data at {TRAINING_DATA_DIR}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Local copy of the labeled S3 training images")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sync_parser = sub.add_parser("sync", help="Download new / changed objects and drop deleted ones")
+    sync_parser.add_argument("--workers", type=int, default=S3_DOWNLOAD_WORKERS, help="Concurrent downloads")
+    sub.add_parser("clean", help="Delete the local copy and its manifest")
+    args = parser.parse_args()
+
+    if args.command == "sync":
+        sync_all(workers=args.workers)
+    elif args.command == "clean":
+        cleanup_training_data()
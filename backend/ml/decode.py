@@ -0,0 +1,64 @@
+"""Image decoding shared by training and serving: reduced-resolution decode for large X-rays"""
+from typing import BinaryIO, Union
+
+from PIL import Image as PILImage
+
+from ml.config import (
+    DECODE_DRAFT_SIZE,
+    DECODE_FAST,
+    DECODE_MAX_PIXELS,
+    GRAYSCALE_MEAN,
+    GRAYSCALE_STD,
+    IMAGENET_MEAN,
+    IMAGENET_STD,
+)
+
+
+class ImageTooLarge(ValueError):
+    """Raised before decoding when an image exceeds DECODE_MAX_PIXELS"""
+
+
+def normalization_stats(in_channels: int) -> tuple:
+    #(mean, std) matching the model's input channels: ImageNet RGB or its single-channel average
+    if in_channels == 1:
+        return GRAYSCALE_MEAN, GRAYSCALE_STD
+    return IMAGENET_MEAN, IMAGENET_STD
+
+
+def open_image(
+    source: Union[str, BinaryIO],
+    fast: bool = DECODE_FAST,
+    mode: str = "RGB",
+    draft_size: int = DECODE_DRAFT_SIZE,
+    max_pixels: int = DECODE_MAX_PIXELS,
+) -> PILImage.Image:
+    """
+    Decode to an RGB (or "L") PIL image, landing near `draft_size` instead of full resolution.
+
+    JPEGs use libjpeg DCT scaling (draft), which skips most of the decode work;
+    the result is never smaller than `draft_size` on either side, so the final
+    Resize still downsamples. Other formats are converted to `mode` and then
+    box-reduced (reduce() rejects palette, 1-bit and 16-bit images).
+    The pixel cap is checked from the header, before any pixel data is read.
+    For mode "L" libjpeg decodes only the luma plane of color JPEGs.
+    """
+    image = PILImage.open(source)
+    width, height = image.size
+    if max_pixels and width * height > max_pixels:
+        raise ImageTooLarge(f"Image is {width}x{height} ({width * height} px); max is {max_pixels} px")
+
+    if fast:
+        if image.format == "JPEG":
+            image.draft(mode, (draft_size, draft_size))
+        else:
+            factor = min(width, height) // draft_size
+            if factor >= 2:
+                image = image.convert(mode).reduce(factor)
+
+    return image.convert(mode)
+
+
+def load_image(path: str, fast: bool = DECODE_FAST, mode: str = "RGB") -> PILImage.Image:
+    #drop-in `loader` for torchvision ImageFolder
+    with open(path, "rb") as f:
+        return open_image(f, fast=fast, mode=mode)
@@ -0,0 +1,236 @@
+"""
+Duplicate detection for image import: exact content hash + perceptual hash (pHash).
+
+- exact: SHA-256 of the file bytes (images.sha256, indexed), one IN query per import
+- near:  64-bit DCT pHash (images.phash, indexed for exact pHash hits); renamed,
+         re-encoded or resized copies land within a few bits. Hamming search runs
+         over an in-process array of every stored pHash, synced from the DB by id.
+
+Usage (from backend/ directory) — compute both hashes for rows that predate the columns:
+    python3 -m ml.dedup backfill
+"""
+import argparse
+import logging
+import tempfile
+import threading
+import time
+from io import BytesIO
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from PIL import Image as PILImage
+
+from ml.cache import image_digest
+from ml.config import PHASH_MAX_DISTANCE
+from ml.decode import open_image
+
+logger = logging.getLogger(__name__)
+
+HASH_SIZE = 8
+DCT_SIZE = 32
+FULL_SYNC_SECONDS = 600
+
+#DCT-II basis; the scale factors do not matter for a median threshold
+_DCT = np.cos(np.pi * (2 * np.arange(DCT_SIZE)[None, :] + 1) * np.arange(DCT_SIZE)[:, None] / (2 * DCT_SIZE))
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def perceptual_hash(image_bytes: bytes) -> int:
+    """
+    64-bit pHash as a signed int (fits a BIGINT column): low-frequency 8x8 DCT
+    block of a 32x32 grayscale thumbnail, each bit = coefficient above the median.
+    """
+    image = open_image(BytesIO(image_bytes), fast=True, mode="L", draft_size=DCT_SIZE * 2)
+    pixels = np.asarray(image.resize((DCT_SIZE, DCT_SIZE), PILImage.LANCZOS), dtype=np.float64)
+    coefficients = (_DCT @ pixels @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].flatten()
+    #DC term left out of the median: it only encodes overall brightness
+    bits = coefficients > np.median(coefficients[1:])
+    value = int("".join("1" if bit else "0" for bit in bits), 2)
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def hamming(hashes: np.ndarray, query: int) -> np.ndarray:
+    #bit distance between every stored hash and `query` (numpy 1.x has no bitwise_count)
+    xor = np.bitwise_xor(hashes, np.int64(query))
+    return _POPCOUNT[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def image_hashes(image_bytes: bytes) -> tuple:
+    #(sha256 hex, pHash or None when the bytes do not decode)
+    try:
+        phash = perceptual_hash(image_bytes)
+    except Exception as e:
+        logger.warning(f"pHash failed: {e}")
+        phash = None
+    return image_digest(image_bytes), phash
+
+
+def stored_image_hashes(image_url: str) -> tuple:
+    #hashes of an image already in S3; (None, None) when it cannot be downloaded
+    from services.s3_service import s3_service
+
+    with tempfile.NamedTemporaryFile() as tmp:
+        if not s3_service.download_file(image_url, tmp.name):
+            return None, None
+        return image_hashes(Path(tmp.name).read_bytes())
+
+
+class PerceptualHashIndex:
+    """
+    All stored pHashes as one int64 array. Each lookup first pulls rows with an
+    id above the last one seen, so images saved by other API workers are found too;
+    a full reload every FULL_SYNC_SECONDS catches rows hashed by the backfill.
+    """
+
+    def __init__(self, max_distance: int = PHASH_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self.ids = np.empty(0, dtype=np.int64)
+        self.hashes = np.empty(0, dtype=np.int64)
+        self.last_id = 0
+        #ids this worker added itself, skipped when the next sync returns them
+        self._own = set()
+        self._full_sync_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def sync(self, db):
+        from models.user import Image
+
+        with self._lock:
+            #periodic full reload picks up older rows that gained a pHash (backfill)
+            if time.monotonic() - self._full_sync_at > FULL_SYNC_SECONDS:
+                self.ids = np.empty(0, dtype=np.int64)
+                self.hashes = np.empty(0, dtype=np.int64)
+                self.last_id = 0
+                self._own.clear()
+                self._full_sync_at = time.monotonic()
+
+            rows = (
+                db.query(Image.id, Image.phash)
+                .filter(Image.id > self.last_id, Image.phash.isnot(None))
+                .order_by(Image.id)
+                .all()
+            )
+            if not rows:
+                return
+            self.last_id = rows[-1][0]
+            fresh = [(image_id, phash) for image_id, phash in rows if image_id not in self._own]
+            self._own.difference_update(image_id for image_id, _ in rows)
+            if fresh:
+                self._append([r[0] for r in fresh], [r[1] for r in fresh])
+
+    def _append(self, ids: list, hashes: list):
+        self.ids = np.concatenate([self.ids, np.asarray(ids, dtype=np.int64)])
+        self.hashes = np.concatenate([self.hashes, np.asarray(hashes, dtype=np.int64)])
+
+    def add(self, image_id: int, phash: Optional[int]):
+        #a row this worker just saved: searchable now, without waiting for the next sync
+        if phash is None:
+            return
+        with self._lock:
+            if image_id > self.last_id:
+                self._own.add(image_id)
+                self._append([image_id], [phash])
+
+    def nearest(self, phash: int) -> Optional[tuple]:
+        #(image_id, distance) of the closest stored image within max_distance, else None
+        with self._lock:
+            ids, hashes = self.ids, self.hashes
+        if phash is None or len(ids) == 0:
+            return None
+        distances = hamming(hashes, phash)
+        best = int(np.argmin(distances))
+        if distances[best] > self.max_distance:
+            return None
+        return int(ids[best]), int(distances[best])
+
+    def stats(self) -> dict:
+        return {"hashes": len(self.ids), "last_id": self.last_id, "max_distance": self.max_distance}
+
+
+# Global pHash index instance
+phash_index = PerceptualHashIndex()
+
+
+def find_duplicates(db, hashes: list) -> list:
+    """
+    hashes: [(sha256, phash)] for the images of one import. Returns per image
+    None or {"image": Image, "match": "sha256" | "phash", "distance": int}.
+    Repeats inside the same import are matched against their first occurrence
+    by the caller, since that one is not stored yet.
+    """
+    from models.user import Image
+
+    digests = list({digest for digest, _ in hashes})
+    exact = {}
+    if digests:
+        exact = {image.sha256: image for image in db.query(Image).filter(Image.sha256.in_(digests))}
+
+    phash_index.sync(db)
+    matches = []
+    near_ids = {}
+    for digest, phash in hashes:
+        if digest in exact:
+            matches.append({"image": exact[digest], "match": "sha256", "distance": 0})
+            continue
+        near = phash_index.nearest(phash)
+        if near is None:
+            matches.append(None)
+            continue
+        near_ids[len(matches)] = near
+        matches.append(None)
+
+    if near_ids:
+        images = {
+            image.id: image
+            for image in db.query(Image).filter(Image.id.in_([image_id for image_id, _ in near_ids.values()]))
+        }
+        for i, (image_id, distance) in near_ids.items():
+            if image_id in images:
+                matches[i] = {"image": images[image_id], "match": "phash", "distance": distance}
+    return matches
+
+
+def backfill(batch_size: int = 100) -> int:
+    #compute sha256 + pHash for stored images missing either, committing per batch
+    from models.user import Image
+    from services.database import SessionLocal
+
+    db = SessionLocal()
+    updated = 0
+    try:
+        todo = [
+            (image_id, url)
+            for image_id, url in db.query(Image.id, Image.image_url)
+            .filter((Image.sha256.is_(None)) | (Image.phash.is_(None)))
+            .order_by(Image.id)
+        ]
+        print(f"{len(todo)} images need hashes")
+
+        for start in range(0, len(todo), batch_size):
+            mappings = []
+            for image_id, url in todo[start:start + batch_size]:
+                digest, phash = stored_image_hashes(url)
+                if digest is None:
+                    continue
+                mappings.append({"id": image_id, "sha256": digest, "phash": phash})
+
+            db.bulk_update_mappings(Image, mappings)
+            db.commit()
+            updated += len(mappings)
+            print(f"  {min(start + batch_size, len(todo))}/{len(todo)} processed, {updated} updated")
+    finally:
+        db.close()
+    return updated
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Image dedup hashes")
+    sub = parser.add_subparsers(dest="command", required=True)
+    backfill_parser = sub.add_parser("backfill", help="Compute sha256 + pHash for images missing them")
+    backfill_parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+
+    if args.command == "backfill":
+        print(f"Updated {backfill(args.batch_size)} images")
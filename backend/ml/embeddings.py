@@ -0,0 +1,436 @@
+"""
+Image embedding store + in-process similarity index (near-duplicates, "similar images").
+
+Embeddings are the pooled penultimate EfficientNet features PredictionService
+already computes on every eager forward pass (predict(..., embed=True)).
+They are L2-normalized, stored as float16 and only comparable within one
+model version, so each version gets its own append-only store:
+
+    ml_models/embeddings/<model_version>/ids.i64       image ids, int64
+    ml_models/embeddings/<model_version>/vectors.f16   N x dim float16, row-aligned with ids
+
+Several API processes append to the same store: every append holds an
+flock on the store directory, so both files always grow in the same order,
+and each process pulls rows written by the others by file size before it
+answers (the same catch-up PerceptualHashIndex.sync does with image ids).
+
+Search is cosine similarity by batched dot products over the flat matrix;
+past ML_SIMILARITY_IVF_MIN_SIZE vectors it switches to IVF partitioning
+(spherical k-means lists, probing the closest ML_SIMILARITY_IVF_PROBES).
+
+Usage (from backend/ directory) — embed every stored image for the current model:
+    python3 -m ml.embeddings backfill
+"""
+import argparse
+import fcntl
+import json
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from ml.config import EMBEDDINGS_DIR, NEAR_DUPLICATE_THRESHOLD, SIMILARITY_IVF_MIN_SIZE, SIMILARITY_IVF_PROBES
+
+logger = logging.getLogger(__name__)
+
+SEARCH_BLOCK_ROWS = 16384
+#model versions whose index stays in memory (serving model + candidate / previous version)
+MAX_LOADED_VERSIONS = 2
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    #indices of the k largest scores, best first
+    if scores.size <= k:
+        return np.argsort(-scores)
+    top = np.argpartition(-scores, k)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+class EmbeddingStore:
+    """Append-only float16 vectors + int64 ids for one model version"""
+
+    def __init__(self, root: Path, model_version: str):
+        self.dir = root / model_version
+        self.ids_path = self.dir / "ids.i64"
+        self.vectors_path = self.dir / "vectors.f16"
+        self.meta_path = self.dir / "meta.json"
+        self.lock_path = self.dir / "append.lock"
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _exclusive(self):
+        #serializes appends across threads and API processes
+        with self._lock:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            with open(self.lock_path, "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def rows_on_disk(self) -> int:
+        #ids written so far (a cheap stat; load() decides how many rows are complete)
+        try:
+            return self.ids_path.stat().st_size // 8
+        except FileNotFoundError:
+            return 0
+
+    def load(self, start: int = 0) -> tuple:
+        #(ids, vectors) of the rows from `start` on; a torn final row from an append in progress is left out
+        empty = np.empty(0, dtype=np.int64), None
+        if not self.meta_path.exists() or self.rows_on_disk() <= start:
+            return empty
+        dim = json.loads(self.meta_path.read_text())["dim"]
+        ids = np.fromfile(self.ids_path, dtype=np.int64, offset=start * 8)
+        vectors = np.fromfile(self.vectors_path, dtype=np.float16, offset=start * dim * 2)
+        count = min(len(ids), len(vectors) // dim)
+        if count == 0:
+            return empty
+        return ids[:count], vectors[:count * dim].reshape(count, dim)
+
+    def append(self, ids: np.ndarray, vectors: np.ndarray):
+        with self._exclusive():
+            if not self.meta_path.exists():
+                self.meta_path.write_text(json.dumps({"dim": int(vectors.shape[1])}))
+            #vectors first: load() trusts ids only as far as there are complete vector rows
+            with open(self.vectors_path, "ab") as f:
+                f.write(np.ascontiguousarray(vectors, dtype=np.float16).tobytes())
+            with open(self.ids_path, "ab") as f:
+                f.write(np.ascontiguousarray(ids, dtype=np.int64).tobytes())
+
+
+class SimilarityIndex:
+    """
+    Cosine-similarity search over L2-normalized float16 rows. Below
+    `ivf_min_size` rows every query is a blocked dot product over the whole
+    matrix; above it rows are grouped into ~sqrt(N) k-means lists and a query
+    scans only the `probes` closest lists plus rows added since the last build.
+    """
+
+    def __init__(self, ivf_min_size: int = SIMILARITY_IVF_MIN_SIZE, probes: int = SIMILARITY_IVF_PROBES):
+        self.ivf_min_size = ivf_min_size
+        self.probes = probes
+        self.ids = np.empty(0, dtype=np.int64)
+        self.vectors: Optional[np.ndarray] = None
+        self.centroids: Optional[np.ndarray] = None
+        self.offsets: Optional[np.ndarray] = None
+        #rows added after the last build, scanned exhaustively
+        self.tail_ids = np.empty(0, dtype=np.int64)
+        self.tail_vectors: Optional[np.ndarray] = None
+        self.row_of = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.row_of)
+
+    def build(self, ids: np.ndarray, vectors: Optional[np.ndarray]):
+        with self._lock:
+            self._build(ids, vectors)
+
+    def _build(self, ids: np.ndarray, vectors: Optional[np.ndarray]):
+        self.centroids = self.offsets = None
+        self.tail_ids, self.tail_vectors = np.empty(0, dtype=np.int64), None
+        if vectors is None or len(ids) == 0:
+            self.ids, self.vectors, self.row_of = np.empty(0, dtype=np.int64), None, {}
+            return
+
+        #later rows win for repeated ids
+        _, last = np.unique(ids[::-1], return_index=True)
+        keep = np.sort(len(ids) - 1 - last)
+        ids, vectors = ids[keep], vectors[keep]
+
+        if len(ids) >= self.ivf_min_size:
+            self.centroids, assignments = self._train_ivf(vectors)
+            order = np.argsort(assignments, kind="stable")
+            ids, vectors = ids[order], vectors[order]
+            counts = np.bincount(assignments, minlength=len(self.centroids))
+            self.offsets = np.concatenate([[0], np.cumsum(counts)])
+
+        self.ids, self.vectors = ids, np.ascontiguousarray(vectors, dtype=np.float16)
+        self.row_of = {int(image_id): ("main", row) for row, image_id in enumerate(ids)}
+
+    def _train_ivf(self, vectors: np.ndarray, iterations: int = 10) -> tuple:
+        #spherical k-means on a sample, then assign every row to its closest centroid
+        rng = np.random.default_rng(0)
+        num_lists = max(1, int(np.sqrt(len(vectors))))
+        sample_size = min(len(vectors), num_lists * 64)
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)].astype(np.float32)
+        centroids = sample[rng.choice(sample_size, num_lists, replace=False)]
+
+        for _ in range(iterations):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(num_lists):
+                members = sample[assignments == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids = normalize(centroids)
+
+        assignments = np.concatenate([
+            np.argmax(vectors[start:start + SEARCH_BLOCK_ROWS].astype(np.float32) @ centroids.T, axis=1)
+            for start in range(0, len(vectors), SEARCH_BLOCK_ROWS)
+        ])
+        logger.info(f"Similarity index: {num_lists} IVF lists over {len(vectors)} embeddings")
+        return centroids, assignments
+
+    def add(self, ids: np.ndarray, vectors: np.ndarray):
+        with self._lock:
+            fresh = [i for i, image_id in enumerate(ids) if int(image_id) not in self.row_of]
+            if not fresh:
+                return
+            ids, vectors = ids[fresh], np.asarray(vectors[fresh], dtype=np.float16)
+
+            #new rows go to a small tail instead of copying the main matrix on every add
+            start = len(self.tail_ids)
+            self.tail_ids = np.concatenate([self.tail_ids, ids])
+            self.tail_vectors = vectors if self.tail_vectors is None else np.concatenate([self.tail_vectors, vectors])
+            for row, image_id in enumerate(ids, start):
+                self.row_of[int(image_id)] = ("tail", row)
+
+            #re-partition once unindexed rows grow past 10%, or when the flat matrix crosses the IVF threshold
+            total = len(self.ids) + len(self.tail_ids)
+            if (
+                self.vectors is None
+                or len(self.tail_ids) > max(1000, len(self.ids) // 10)
+                or (self.centroids is None and total >= self.ivf_min_size)
+            ):
+                all_ids = np.concatenate([self.ids, self.tail_ids])
+                all_vectors = self.tail_vectors if self.vectors is None else np.concatenate([self.vectors, self.tail_vectors])
+                self._build(all_ids, all_vectors)
+
+    def vector(self, image_id: int) -> Optional[np.ndarray]:
+        with self._lock:
+            where = self.row_of.get(int(image_id))
+            if where is None:
+                return None
+            part, row = where
+            return (self.vectors if part == "main" else self.tail_vectors)[row].astype(np.float32)
+
+    def search(self, queries: np.ndarray, k: int = 10, exclude: Optional[list] = None) -> list:
+        """
+        queries: (Q, dim) embeddings (normalized here). Returns per query a list
+        of (image_id, cosine similarity), best first. `exclude` holds one image
+        id (or None) per query to leave out, e.g. the query image itself.
+        """
+        queries = normalize(np.atleast_2d(queries))
+        with self._lock:
+            ids, vectors, centroids, offsets = self.ids, self.vectors, self.centroids, self.offsets
+            tail_ids, tail_vectors = self.tail_ids, self.tail_vectors
+
+        results = []
+        for q, query in enumerate(queries):
+            candidate_ids, scores = [], []
+            if vectors is not None:
+                if centroids is None:
+                    blocks = [(start, min(start + SEARCH_BLOCK_ROWS, len(ids))) for start in range(0, len(ids), SEARCH_BLOCK_ROWS)]
+                else:
+                    lists = _top_k(centroids @ query, self.probes)
+                    blocks = [(offsets[c], offsets[c + 1]) for c in lists if offsets[c + 1] > offsets[c]]
+                for start, end in blocks:
+                    candidate_ids.append(ids[start:end])
+                    scores.append(vectors[start:end].astype(np.float32) @ query)
+            if tail_vectors is not None:
+                candidate_ids.append(tail_ids)
+                scores.append(tail_vectors.astype(np.float32) @ query)
+
+            if not scores:
+                results.append([])
+                continue
+            candidate_ids = np.concatenate(candidate_ids)
+            scores = np.concatenate(scores)
+            if exclude is not None and exclude[q] is not None:
+                scores[candidate_ids == exclude[q]] = -np.inf
+            top = _top_k(scores, k)
+            results.append([
+                (int(candidate_ids[i]), round(float(scores[i]), 4)) for i in top if np.isfinite(scores[i])
+            ])
+        return results
+
+
+class _LoadedVersion:
+    """One model version's store, its in-memory index and how many store rows the index holds"""
+
+    def __init__(self, root: Path, model_version: str):
+        self.store = EmbeddingStore(root, model_version)
+        self.index = SimilarityIndex()
+        ids, vectors = self.store.load()
+        self.index.build(ids, vectors)
+        #store rows already pulled into the index (this process's own appends are re-read and skipped)
+        self.rows_loaded = len(ids)
+        self._lock = threading.Lock()
+
+    def sync(self):
+        #rows other API processes appended since the last look
+        if self.store.rows_on_disk() <= self.rows_loaded:
+            return
+        with self._lock:
+            ids, vectors = self.store.load(self.rows_loaded)
+            if len(ids):
+                self.rows_loaded += len(ids)
+                self.index.add(ids, vectors)
+
+
+class EmbeddingIndex:
+    """
+    Store + index per model version, the most recently used `max_versions`
+    kept loaded, so a hot reload or a shadow candidate alternating with the
+    serving model does not rebuild an index on every switch.
+    """
+
+    def __init__(self, root: Path = EMBEDDINGS_DIR, max_versions: int = MAX_LOADED_VERSIONS):
+        self.root = root
+        self.max_versions = max(1, max_versions)
+        #most recently used version, reported by stats()
+        self.model_version = None
+        self._versions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def use(self, model_version: str) -> tuple:
+        """
+        (store, index) for `model_version`, loaded on first use and caught up
+        with rows other processes appended. Callers work on the returned pair,
+        never on whatever version another thread switched to in the meantime.
+        """
+        with self._lock:
+            loaded = self._versions.get(model_version)
+            if loaded is None:
+                loaded = self._versions[model_version] = _LoadedVersion(self.root, model_version)
+                logger.info(f"Similarity index for {model_version}: {len(loaded.index)} embeddings")
+                while len(self._versions) > self.max_versions:
+                    self._versions.popitem(last=False)
+            self._versions.move_to_end(model_version)
+            self.model_version = model_version
+        loaded.sync()
+        return loaded.store, loaded.index
+
+    def add(self, model_version: str, image_ids: list, embeddings: list):
+        if not image_ids:
+            return
+        store, index = self.use(model_version)
+        ids = np.asarray(image_ids, dtype=np.int64)
+        vectors = normalize(np.stack(embeddings)).astype(np.float16)
+        store.append(ids, vectors)
+        index.add(ids, vectors)
+
+    def near_duplicates(self, model_version: str, embeddings: list, threshold: float, k: int = 5) -> list:
+        #per embedding: [(image_id, similarity)] at or above `threshold`
+        if not embeddings:
+            return []
+        _, index = self.use(model_version)
+        matches = index.search(np.stack(embeddings), k)
+        return [[(image_id, score) for image_id, score in found if score >= threshold] for found in matches]
+
+    def check_results(self, results: list, threshold: float = NEAR_DUPLICATE_THRESHOLD) -> list:
+        #near-duplicates for predict results carrying an "embedding"; [] for results without one
+        matches = [[] for _ in results]
+        by_version = {}
+        for i, result in enumerate(results):
+            if "embedding" in result:
+                by_version.setdefault(result["model_version"], []).append(i)
+        for version, indices in by_version.items():
+            found = self.near_duplicates(version, [results[i]["embedding"] for i in indices], threshold)
+            for i, duplicates in zip(indices, found):
+                matches[i] = duplicates
+        return matches
+
+    def add_results(self, image_ids: list, results: list):
+        #store the embeddings of predict results for the images they were saved as
+        by_version = {}
+        for image_id, result in zip(image_ids, results):
+            if image_id is not None and "embedding" in result:
+                ids, embeddings = by_version.setdefault(result["model_version"], ([], []))
+                ids.append(image_id)
+                embeddings.append(result["embedding"])
+        for version, (ids, embeddings) in by_version.items():
+            self.add(version, ids, embeddings)
+
+    def has(self, model_version: str, image_id: int) -> bool:
+        _, index = self.use(model_version)
+        return index.vector(image_id) is not None
+
+    def similar(self, model_version: str, image_id: int, k: int = 10) -> Optional[list]:
+        #None if this image has no embedding for the model version
+        _, index = self.use(model_version)
+        vector = index.vector(image_id)
+        if vector is None:
+            return None
+        return index.search(vector[None, :], k, exclude=[image_id])[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            version = self.model_version
+            loaded = self._versions.get(version)
+        index = loaded.index if loaded is not None else SimilarityIndex()
+        return {
+            "model_version": version,
+            "loaded_versions": len(self._versions),
+            "embeddings": len(index),
+            "ivf_lists": 0 if index.centroids is None else len(index.centroids),
+            "unindexed": len(index.tail_ids),
+        }
+
+
+# Global embedding index instance
+embedding_index = EmbeddingIndex()
+
+
+def backfill(batch_size: int = 32) -> int:
+    #embed every stored image that has no embedding for the current model version
+    import tempfile
+
+    from ml.predict import PredictionService
+    from models.user import Image
+    from services.database import SessionLocal
+    from services.s3_service import s3_service
+
+    service = PredictionService(pool_address=None, batching=False, caching=False)
+    if not service.load_model(backend="eager"):
+        raise SystemExit("No trained model found")
+    version = service.model_version
+    _, index = embedding_index.use(version)
+
+    db = SessionLocal()
+    added = 0
+    try:
+        images = [(image.id, image.image_url) for image in db.query(Image).order_by(Image.id)]
+        todo = [(image_id, url) for image_id, url in images if index.vector(image_id) is None]
+        print(f"{len(todo)} of {len(images)} images need embeddings for {version}")
+
+        for start in range(0, len(todo), batch_size):
+            chunk_ids, chunk_bytes = [], []
+            for image_id, url in todo[start:start + batch_size]:
+                with tempfile.NamedTemporaryFile() as tmp:
+                    if s3_service.download_file(url, tmp.name):
+                        chunk_ids.append(image_id)
+                        chunk_bytes.append(Path(tmp.name).read_bytes())
+
+            results = service.predict_batch(chunk_bytes, chunk_size=batch_size, shadow=False, embed=True)
+            embedded = [(image_id, r["embedding"]) for image_id, r in zip(chunk_ids, results) if "embedding" in r]
+            embedding_index.add(version, [i for i, _ in embedded], [e for _, e in embedded])
+            added += len(embedded)
+            print(f"  {start + len(chunk_ids)}/{len(todo)} downloaded, {added} embedded")
+    finally:
+        db.close()
+    return added
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Image embedding store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    backfill_parser = sub.add_parser("backfill", help="Embed stored images missing an embedding for the current model")
+    backfill_parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    if args.command == "backfill":
+        print(f"Embedded {backfill(args.batch_size)} images")
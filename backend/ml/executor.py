@@ -0,0 +1,85 @@
+"""Bounded inference executor: keeps CPU-bound prediction off the asyncio event loop"""
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+from ml.config import INFERENCE_EXECUTOR_WORKERS, INFERENCE_QUEUE_SIZE
+from ml.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceQueueFull(Exception):
+    """Raised when the executor already holds `max_pending` jobs"""
+
+
+def _timed(fn: Callable, submitted: float, args: tuple, kwargs: dict) -> Any:
+    #time a job spent queued behind busy workers
+    metrics.observe_stage("executor_wait", time.perf_counter() - submitted)
+    return fn(*args, **kwargs)
+
+
+class InferenceExecutor:
+    """
+    Thread pool with a hard cap on queued + running jobs. When the cap is
+    reached `submit` fails immediately instead of queueing, so routes can
+    shed load with a fast 503 rather than letting latency grow unbounded.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_workers = max_workers
+        self.max_pending = max(max_pending, max_workers)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise InferenceQueueFull(f"Inference queue full ({self.max_pending} pending)")
+
+        with self._lock:
+            self._pending += 1
+        try:
+            future = self._pool.submit(_timed, fn, time.perf_counter(), args, kwargs)
+        except Exception:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        #await a job from async code without blocking the event loop
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def _release(self, _future):
+        with self._lock:
+            self._pending -= 1
+            self._completed += 1
+        self._slots.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                "running": min(self._pending, self.max_workers),
+                "queued": max(0, self._pending - self.max_workers),
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
+
+
+# Global inference executor instance
+inference_executor = InferenceExecutor(
+    max_workers=INFERENCE_EXECUTOR_WORKERS,
+    max_pending=INFERENCE_QUEUE_SIZE,
+)
@@ -0,0 +1,249 @@
+"""
+Exported inference artifacts (TorchScript / ONNX) written next to each checkpoint.
+
+Exported artifacts embed the checkpoint metadata (arch, classes, trained_at)
+so PredictionService can serve them without rebuilding the torchvision
+model or unpickling the full training checkpoint. The same metadata is also
+written as a small JSON sidecar (latest.meta.json) for status checks.
+
+Usage (from backend/ directory) — re-export an existing checkpoint and check parity:
+    python3 -m ml.export
+    python3 -m ml.export --model ml_models/efficientnet_b0_20260101_120000.pth --formats onnx
+"""
+import argparse
+import copy
+import json
+import logging
+from pathlib import Path
+from typing import Optional
+
+import torch
+import torch.nn as nn
+
+from ml.config import EXPORT_FORMATS, IMAGE_SIZE, ML_MODELS_DIR
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("eager", "torchscript", "onnx")
+METADATA_KEYS = (
+    "arch",
+    "num_classes",
+    "class_to_idx",
+    "trained_at",
+    "fast_decode",
+    "in_channels",
+    "cv_mean_acc",
+    "cv_mean_auc",
+    "cv_mean_sensitivity",
+    "cv_mean_specificity",
+    "cascade",
+)
+SIDECAR_SUFFIX = ".meta.json"
+SUFFIXES = {
+    "torchscript": ".torchscript.pt",
+    "onnx": ".onnx",
+}
+
+
+def exported_path(checkpoint_path: Path, backend: str) -> Path:
+    #latest.pth -> latest.torchscript.pt / latest.onnx
+    return checkpoint_path.with_name(checkpoint_path.stem + SUFFIXES[backend])
+
+
+def checkpoint_metadata(checkpoint: dict) -> dict:
+    return {key: checkpoint.get(key) for key in METADATA_KEYS}
+
+
+def model_version_of(metadata: dict, path: Path) -> str:
+    #matches the {arch}_{timestamp} name train_model gives each checkpoint
+    if metadata.get("trained_at"):
+        return f"{metadata['arch']}_{metadata['trained_at']}"
+    return path.stem
+
+
+def sidecar_path(checkpoint_path: Path) -> Path:
+    #latest.pth -> latest.meta.json
+    return checkpoint_path.with_name(checkpoint_path.stem + SIDECAR_SUFFIX)
+
+
+def write_sidecar(checkpoint_path: Path, metadata: dict) -> Path:
+    path = sidecar_path(checkpoint_path)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(metadata, indent=2))
+    tmp.replace(path)
+    return path
+
+
+def read_sidecar(checkpoint_path: Path) -> Optional[dict]:
+    #checkpoint metadata without unpickling the weights; None if missing or unreadable
+    try:
+        return json.loads(sidecar_path(checkpoint_path).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def load_metadata(checkpoint_path: Path) -> Optional[dict]:
+    #sidecar first; checkpoints from before sidecars are unpickled once and backfilled
+    metadata = read_sidecar(checkpoint_path)
+    if metadata is not None or not checkpoint_path.exists():
+        return metadata
+    checkpoint = torch.load(checkpoint_path, map_location="cpu", weights_only=False)
+    metadata = checkpoint_metadata(checkpoint)
+    try:
+        write_sidecar(checkpoint_path, metadata)
+    except OSError as e:
+        logger.warning(f"Could not write metadata sidecar for {checkpoint_path}: {e}")
+    return metadata
+
+
+def _example_input(metadata: dict) -> torch.Tensor:
+    return torch.randn(1, metadata.get("in_channels") or 3, IMAGE_SIZE, IMAGE_SIZE)
+
+
+def export_torchscript(model: nn.Module, path: Path, metadata: dict) -> Path:
+    example = _example_input(metadata)
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+        traced = torch.jit.freeze(traced)
+    torch.jit.save(traced, str(path), _extra_files={"metadata.json": json.dumps(metadata)})
+    return path
+
+
+def export_onnx(model: nn.Module, path: Path, metadata: dict) -> Path:
+    import onnx
+
+    example = _example_input(metadata)
+    torch.onnx.export(
+        model,
+        example,
+        str(path),
+        input_names=["input"],
+        output_names=["logits"],
+        dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+        opset_version=17,
+    )
+    #embed metadata so the ONNX file is self-describing at serve time
+    onnx_model = onnx.load(str(path))
+    entry = onnx_model.metadata_props.add()
+    entry.key = "metadata.json"
+    entry.value = json.dumps(metadata)
+    onnx.save(onnx_model, str(path))
+    return path
+
+
+class OnnxModule:
+    """Makes an onnxruntime session callable like an eval-mode nn.Module (tensor in, tensor out)"""
+
+    def __init__(self, path: Path):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.metadata = json.loads(self.session.get_modelmeta().custom_metadata_map["metadata.json"])
+
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        logits = self.session.run(None, {self.input_name: batch.detach().cpu().numpy()})[0]
+        return torch.from_numpy(logits)
+
+    def eval(self):
+        return self
+
+
+def load_exported(checkpoint_path: Path, backend: str, device: torch.device):
+    """Returns (callable model, metadata dict). Raises if the artifact is missing or unusable."""
+    path = exported_path(checkpoint_path, backend)
+    if not path.exists():
+        raise FileNotFoundError(f"No {backend} artifact at {path}")
+
+    if backend == "torchscript":
+        extra = {"metadata.json": ""}
+        model = torch.jit.load(str(path), map_location=device, _extra_files=extra)
+        model.eval()
+        return model, json.loads(extra["metadata.json"])
+
+    if backend == "onnx":
+        module = OnnxModule(path)
+        return module, module.metadata
+
+    raise ValueError(f"Unknown backend: {backend}")
+
+
+def parity_check(reference: nn.Module, candidate, images: torch.Tensor) -> dict:
+    #compare softmax outputs of the eager model and an exported one on the same normalized batch
+    with torch.no_grad():
+        ref_probs = torch.softmax(reference(images), dim=1)
+        cand_probs = torch.softmax(candidate(images).to(ref_probs.device), dim=1)
+    return {
+        "samples": images.shape[0],
+        "max_abs_diff": float((ref_probs - cand_probs).abs().max()),
+        "label_agreement": float((ref_probs.argmax(1) == cand_probs.argmax(1)).float().mean()),
+    }
+
+
+def export_artifacts(
+    model: nn.Module,
+    checkpoint_path: Path,
+    metadata: dict,
+    sample_images: Optional[torch.Tensor] = None,
+    formats: tuple = EXPORT_FORMATS,
+) -> dict:
+    """
+    Export `model` in each format next to `checkpoint_path` and, when sample
+    images are given, check parity against the eager model. A failed export
+    is reported and skipped; serving falls back to eager for that backend.
+    """
+    #always export from a CPU copy in eval mode so training state is untouched
+    eager = copy.deepcopy(model).cpu().eval()
+    report = {}
+
+    for backend in formats:
+        path = exported_path(checkpoint_path, backend)
+        try:
+            if backend == "torchscript":
+                export_torchscript(eager, path, metadata)
+            elif backend == "onnx":
+                export_onnx(eager, path, metadata)
+            else:
+                raise ValueError(f"Unknown export format: {backend}")
+
+            entry = {"path": str(path)}
+            if sample_images is not None:
+                exported, _ = load_exported(checkpoint_path, backend, torch.device("cpu"))
+                entry["parity"] = parity_check(eager, exported, sample_images.cpu())
+            report[backend] = entry
+        except Exception as e:
+            logger.warning(f"{backend} export failed: {e}")
+            report[backend] = {"error": str(e)}
+
+    return report
+
+
+if __name__ == "__main__":
+    from ml.models.classifier import get_model
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Export a checkpoint to TorchScript / ONNX and check parity")
+    parser.add_argument("--model", default=str(ML_MODELS_DIR / "latest.pth"), help="Checkpoint path")
+    parser.add_argument("--formats", default=",".join(EXPORT_FORMATS), help="Comma-separated: torchscript,onnx")
+    parser.add_argument("--samples", type=int, default=8, help="Random inputs used for the parity check")
+    args = parser.parse_args()
+
+    checkpoint_path = Path(args.model)
+    checkpoint = torch.load(checkpoint_path, map_location="cpu", weights_only=False)
+    write_sidecar(checkpoint_path, checkpoint_metadata(checkpoint))
+    in_channels = checkpoint.get("in_channels", 3)
+    model = get_model(num_classes=checkpoint["num_classes"], pretrained=False, in_channels=in_channels)
+    model.load_state_dict(checkpoint["model_state_dict"])
+    model.eval()
+
+    samples = torch.randn(args.samples, in_channels, IMAGE_SIZE, IMAGE_SIZE)
+    report = export_artifacts(
+        model,
+        checkpoint_path,
+        checkpoint_metadata(checkpoint),
+        sample_images=samples,
+        formats=tuple(f.strip() for f in args.formats.split(",") if f.strip()),
+    )
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,210 @@
+"""
+Persistent cache of decoded, resized training images.
+
+Each image is decoded once (same open_image as serving, same fast/grayscale
+settings) and resized to TRAINING_CACHE_SIDE x TRAINING_CACHE_SIDE, then appended
+as one uint8 row of a raw memmap. Rows are keyed by S3 ETag, so later epochs,
+folds and training runs read small arrays instead of decoding full-resolution
+JPEGs; only new or changed objects are decoded. Augmentation runs on the
+cached uint8 tensors. ETags come from the data_prep sync manifest.
+
+Layout (one directory per decode variant, e.g. training_cache/256px_RGB_fast/):
+    images.u8     rows x side x side x channels, uint8, append-only
+    index.json    {etag: row}
+
+Usage (from backend/ directory):
+    python3 -m ml.image_cache stats
+    python3 -m ml.image_cache clear
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+import torch
+from PIL import Image as PILImage
+from torch.utils.data import Dataset
+
+from ml.config import DECODE_FAST, TRAINING_CACHE_DIR, TRAINING_CACHE_SIDE, TRAINING_DATA_DIR
+from ml.decode import load_image
+
+logger = logging.getLogger(__name__)
+
+DECODE_CHUNK = 256
+
+
+def _file_key(path: Path) -> str:
+    #fallback key for files without a recorded ETag
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return "sha256:" + digest.hexdigest()
+
+
+class TrainingImageCache:
+    def __init__(
+        self,
+        root: Path = TRAINING_CACHE_DIR,
+        side: int = TRAINING_CACHE_SIDE,
+        mode: str = "RGB",
+        fast: bool = DECODE_FAST,
+    ):
+        self.side = side
+        self.mode = mode
+        self.fast = fast
+        self.channels = 1 if mode == "L" else 3
+        self.row_bytes = side * side * self.channels
+        self.dir = root / f"{side}px_{mode}_{'fast' if fast else 'full'}"
+        self.images_path = self.dir / "images.u8"
+        self.index_path = self.dir / "index.json"
+        try:
+            self.index = json.loads(self.index_path.read_text())
+        except (OSError, ValueError):
+            self.index = {}
+
+    @property
+    def shape(self) -> tuple:
+        rows = self.images_path.stat().st_size // self.row_bytes if self.images_path.exists() else 0
+        return (rows, self.side, self.side, self.channels)
+
+    def _write_index(self):
+        tmp = self.index_path.with_name(self.index_path.name + ".tmp")
+        tmp.write_text(json.dumps(self.index))
+        tmp.replace(self.index_path)
+
+    def _decode(self, path: Path) -> Optional[np.ndarray]:
+        #same resize as transforms.Resize on a PIL image (bilinear, antialiased when downsampling)
+        try:
+            image = load_image(str(path), fast=self.fast, mode=self.mode)
+            image = image.resize((self.side, self.side), PILImage.BILINEAR)
+            return np.asarray(image, dtype=np.uint8).reshape(self.side, self.side, self.channels)
+        except Exception as e:
+            logger.warning(f"Could not decode {path}: {e}")
+            return None
+
+    def ensure(self, samples: list, workers: int = os.cpu_count() or 1) -> list:
+        """
+        samples: [(key, path)]. Decodes and appends every key not cached yet;
+        returns the row of each sample (None if it could not be decoded).
+        """
+        missing = {}
+        for key, path in samples:
+            if key not in self.index and key not in missing:
+                missing[key] = path
+
+        if missing:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            print(f"  Decoding {len(missing)} new images into the training cache ({len(samples) - len(missing)} cached)")
+            items = list(missing.items())
+            with ThreadPoolExecutor(max_workers=workers) as pool, open(self.images_path, "ab") as f:
+                #drop a partial row left by an interrupted append
+                next_row = f.tell() // self.row_bytes
+                f.truncate(next_row * self.row_bytes)
+                #chunked so at most DECODE_CHUNK decoded images are held in memory
+                for start in range(0, len(items), DECODE_CHUNK):
+                    chunk = items[start:start + DECODE_CHUNK]
+                    for (key, _), pixels in zip(chunk, pool.map(self._decode, [path for _, path in chunk])):
+                        if pixels is None:
+                            continue
+                        f.write(pixels.tobytes())
+                        self.index[key] = next_row
+                        next_row += 1
+                    f.flush()
+                    self._write_index()
+        else:
+            print(f"  All {len(samples)} images served from the training cache")
+
+        return [self.index.get(key) for key, _ in samples]
+
+    def stats(self) -> dict:
+        rows = self.shape[0]
+        return {
+            "path": str(self.dir),
+            "entries": len(self.index),
+            "rows": rows,
+            "size_mb": round(rows * self.row_bytes / (1024 * 1024), 1),
+        }
+
+
+class CachedImageDataset(Dataset):
+    """
+    ImageFolder-compatible dataset over cache rows: yields (transform(uint8 CHW tensor), target).
+    The memmap is opened lazily, so DataLoader workers each map the file instead of copying it.
+    """
+
+    def __init__(self, cache: TrainingImageCache, rows: list, targets: list, classes: list, class_to_idx: dict, transform: Callable):
+        self.images_path = cache.images_path
+        self.shape = cache.shape
+        self.rows = rows
+        self.targets = targets
+        self.classes = classes
+        self.class_to_idx = class_to_idx
+        self.transform = transform
+        self._images = None
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, index: int) -> tuple:
+        if self._images is None:
+            self._images = np.memmap(self.images_path, dtype=np.uint8, mode="r", shape=self.shape)
+        pixels = torch.from_numpy(np.array(self._images[self.rows[index]])).permute(2, 0, 1)
+        return self.transform(pixels), self.targets[index]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_images"] = None
+        return state
+
+
+def cached_image_folder(root: Path, etags: dict, transforms: tuple, mode: str = "RGB", fast: bool = DECODE_FAST) -> tuple:
+    """
+    One CachedImageDataset per transform over an ImageFolder-style `root`, all
+    sharing the same rows (so Subset indices line up across them, as with two
+    ImageFolder instances). Images that fail to decode are left out.
+    """
+    from torchvision import datasets
+
+    folder = datasets.ImageFolder(str(root))
+    cache = TrainingImageCache(mode=mode, fast=fast)
+    samples = []
+    for path, _ in folder.samples:
+        relative = str(Path(path).relative_to(TRAINING_DATA_DIR))
+        samples.append((etags.get(relative) or _file_key(Path(path)), path))
+
+    rows = cache.ensure(samples)
+    kept = [i for i, row in enumerate(rows) if row is not None]
+    if len(kept) < len(rows):
+        print(f"  WARNING: {len(rows) - len(kept)} images could not be decoded and are skipped")
+    rows = [rows[i] for i in kept]
+    targets = [folder.targets[i] for i in kept]
+    return tuple(
+        CachedImageDataset(cache, rows, targets, folder.classes, folder.class_to_idx, transform)
+        for transform in transforms
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Decoded training image cache")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="Entries and size of each cached decode variant")
+    sub.add_parser("clear", help="Delete the whole cache")
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        for variant in sorted(TRAINING_CACHE_DIR.glob("*px_*")):
+            side, mode, decode = variant.name.split("_")
+            cache = TrainingImageCache(side=int(side[:-2]), mode=mode, fast=decode == "fast")
+            print(json.dumps(cache.stats()))
+    elif args.command == "clear":
+        if TRAINING_CACHE_DIR.exists():
+            shutil.rmtree(TRAINING_CACHE_DIR)
+        print(f"Cleared {TRAINING_CACHE_DIR}")
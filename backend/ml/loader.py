@@ -0,0 +1,106 @@
+"""
+Training DataLoaders that live for the whole run.
+
+One loader per dataset (augmented train / plain val) is built up front; each
+CV fold, the cascade gate and the final full-data fit only swap the indices
+its FoldSampler draws from. With persistent workers the worker processes
+(and whatever they have opened, e.g. the training cache memmap) survive
+across epochs and folds instead of being respawned for every Subset.
+
+StepTimer splits each epoch into time spent waiting on the loader and time
+spent in the training step, so an input-bound run is visible in the log.
+"""
+import time
+from typing import Iterable, Iterator, Optional
+
+import torch
+from torch.utils.data import DataLoader, Dataset, Sampler
+
+from ml.config import LOADER_PERSISTENT, LOADER_PIN_MEMORY, LOADER_PREFETCH, LOADER_WORKERS
+
+
+class FoldSampler(Sampler):
+    #indices are swapped between folds; the loader re-iterates the sampler every epoch, so a swap takes effect on the next one
+    def __init__(self, indices: Iterable[int] = (), shuffle: bool = False):
+        self.indices = list(indices)
+        self.shuffle = shuffle
+
+    def set_indices(self, indices: Iterable[int]):
+        self.indices = [int(i) for i in indices]
+
+    def __iter__(self) -> Iterator[int]:
+        if not self.shuffle:
+            return iter(self.indices)
+        #drawn from torch's global RNG, like DataLoader(shuffle=True)
+        return iter([self.indices[i] for i in torch.randperm(len(self.indices)).tolist()])
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+
+def make_loader(
+    dataset: Dataset,
+    batch_size: int,
+    shuffle: bool,
+    device_type: str,
+    workers: int = LOADER_WORKERS,
+    prefetch: int = LOADER_PREFETCH,
+    persistent: bool = LOADER_PERSISTENT,
+    pin_memory: Optional[bool] = LOADER_PIN_MEMORY,
+) -> DataLoader:
+    kwargs = {}
+    if workers > 0:
+        #DataLoader rejects both options when loading in the main process
+        kwargs = {"prefetch_factor": prefetch, "persistent_workers": persistent}
+    return DataLoader(
+        dataset,
+        batch_size=batch_size,
+        sampler=FoldSampler(shuffle=shuffle),
+        num_workers=workers,
+        pin_memory=device_type == "cuda" if pin_memory is None else pin_memory,
+        **kwargs,
+    )
+
+
+class FoldLoaders:
+    def __init__(self, train_ds: Dataset, val_ds: Dataset, batch_size: int, device_type: str, **loader_kwargs):
+        self.train = make_loader(train_ds, batch_size, shuffle=True, device_type=device_type, **loader_kwargs)
+        self.val = make_loader(val_ds, batch_size, shuffle=False, device_type=device_type, **loader_kwargs)
+
+    def use(self, train_idx: Iterable[int], val_idx: Iterable[int] = ()):
+        self.train.sampler.set_indices(train_idx)
+        self.val.sampler.set_indices(val_idx)
+
+    def describe(self) -> str:
+        loader = self.train
+        if not loader.num_workers:
+            return f"main process | pin_memory={loader.pin_memory}"
+        return (
+            f"{loader.num_workers} workers | prefetch {loader.prefetch_factor} | "
+            f"persistent={loader.persistent_workers} | pin_memory={loader.pin_memory}"
+        )
+
+
+class StepTimer:
+    def __init__(self):
+        self.data = 0.0
+        self.compute = 0.0
+
+    def wrap(self, loader: DataLoader) -> Iterator:
+        #time blocked in next() is data wait; time until the loop asks for the next batch is compute
+        batches = iter(loader)
+        while True:
+            started = time.perf_counter()
+            try:
+                batch = next(batches)
+            except StopIteration:
+                return
+            fetched = time.perf_counter()
+            self.data += fetched - started
+            yield batch
+            self.compute += time.perf_counter() - fetched
+
+    def summary(self) -> str:
+        total = self.data + self.compute
+        waiting = 100 * self.data / total if total else 0.0
+        return f"Data wait: {self.data:.1f}s | Compute: {self.compute:.1f}s ({waiting:.0f}% waiting on input)"
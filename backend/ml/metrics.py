@@ -0,0 +1,142 @@
+"""
+Low-overhead latency histograms for the inference path, rendered in Prometheus text format at /metrics.
+
+    inference_stage_seconds{stage=...}   download, decode, preprocess, forward, postprocess,
+                                         queue_wait (micro-batcher), executor_wait, db_write
+    inference_batch_size                 rows per forward pass
+    ml_request_seconds{method,route,status}   /ml/* routes end to end
+
+An observation is one perf_counter pair, a bisect over fixed buckets and a short
+lock; there are no quantile sketches in-process, so p50/p99 come from
+histogram_quantile() over the exported buckets. Every API process keeps its own
+counts. Inference pool workers (ml/workers.py) expose no endpoint of their own:
+they capture the observations made while answering a request and send them back
+with the reply, and the API process that asked records them.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from ml.config import METRICS_ENABLED
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: tuple, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.labelnames = labelnames
+        #{label values: [per-bucket counts (+Inf last), sum]}
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        for labelvalues, (counts, total) in sorted(series.items()):
+            labels = dict(zip(self.labelnames, labelvalues))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': le})} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class Metrics:
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self.stage_seconds = Histogram(
+            "inference_stage_seconds", "Time spent per inference stage", LATENCY_BUCKETS, ("stage",)
+        )
+        self.batch_size = Histogram("inference_batch_size", "Rows per forward pass", BATCH_SIZE_BUCKETS)
+        self.request_seconds = Histogram(
+            "ml_request_seconds", "End-to-end latency of /ml routes", LATENCY_BUCKETS, ("method", "route", "status")
+        )
+        self._captured = threading.local()
+
+    @contextmanager
+    def capture(self):
+        #collects this thread's stage / batch-size observations made inside the block, for replay() elsewhere
+        observations = []
+        self._captured.observations = observations
+        try:
+            yield observations
+        finally:
+            self._captured.observations = None
+
+    def _keep(self, observation: tuple):
+        observations = getattr(self._captured, "observations", None)
+        if observations is not None:
+            observations.append(observation)
+
+    def replay(self, observations: list):
+        #record observations captured in another process (an inference pool worker)
+        for kind, *args in observations:
+            if kind == "stage":
+                self.observe_stage(*args)
+            elif kind == "batch_size":
+                self.observe_batch_size(*args)
+
+    def observe_stage(self, stage: str, seconds: float):
+        if self.enabled:
+            self.stage_seconds.observe(seconds, stage)
+            self._keep(("stage", stage, seconds))
+
+    @contextmanager
+    def stage(self, stage: str):
+        #times the block; exceptions are timed too (a failed decode still cost that long)
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, time.perf_counter() - started)
+
+    def observe_batch_size(self, size: int):
+        if self.enabled:
+            self.batch_size.observe(size)
+            self._keep(("batch_size", size))
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float):
+        if self.enabled:
+            self.request_seconds.observe(seconds, method, route, str(status))
+
+    def render(self) -> str:
+        lines = []
+        for histogram in (self.stage_seconds, self.batch_size, self.request_seconds):
+            lines.extend(histogram.render())
+        return "\n".join(lines) + "\n"
+
+
+# Global metrics instance
+metrics = Metrics()
@@ -1,12 +1,59 @@
-"""EfficientNet-B0 Setup"""
+"""EfficientNet-B0 Setup (plus the low-resolution cascade gate)"""
 import torch.nn as nn
+import torch.nn.functional as F
 from torchvision import models
 
-def get_model(num_classes: int = 2, pretrained: bool = True) -> nn.Module:
+def get_model(num_classes: int = 2, pretrained: bool = True, in_channels: int = 3) -> nn.Module:
     weights = models.EfficientNet_B0_Weights.DEFAULT if pretrained else None
     model = models.efficientnet_b0(weights=weights)
     model.classifier = nn.Sequential(
         nn.Dropout(0.5),
         nn.Linear(model.classifier[1].in_features, num_classes),
     )
+    if in_channels != 3:
+        model.features[0][0] = _collapse_stem(model.features[0][0], in_channels)
     return model
+
+
+#grayscale variant: rebuild the stem conv for `in_channels` inputs
+#for 1 channel the pretrained RGB filters are summed, so a gray image (R=G=B) gives the same response
+def _collapse_stem(conv: nn.Conv2d, in_channels: int) -> nn.Conv2d:
+    stem = nn.Conv2d(
+        in_channels,
+        conv.out_channels,
+        kernel_size=conv.kernel_size,
+        stride=conv.stride,
+        padding=conv.padding,
+        bias=conv.bias is not None,
+    )
+    if in_channels == 1:
+        stem.weight.data.copy_(conv.weight.data.sum(dim=1, keepdim=True))
+        if conv.bias is not None:
+            stem.bias.data.copy_(conv.bias.data)
+    return stem
+
+
+class LowResolutionGate(nn.Module):
+    """
+    Cascade gate: downsamples the full-size normalized batch itself, so it is
+    trained and served on exactly the tensors the main model sees.
+    """
+
+    def __init__(self, model: nn.Module, image_size: int):
+        super().__init__()
+        self.model = model
+        self.image_size = image_size
+
+    def forward(self, x):
+        #area = box filter, no aliasing on the ~2.3x downsample
+        x = F.interpolate(x, size=(self.image_size, self.image_size), mode="area")
+        return self.model(x)
+
+
+def get_gate_model(num_classes: int = 2, pretrained: bool = True, in_channels: int = 3, image_size: int = 96) -> nn.Module:
+    weights = models.MobileNet_V3_Small_Weights.DEFAULT if pretrained else None
+    model = models.mobilenet_v3_small(weights=weights)
+    model.classifier[-1] = nn.Linear(model.classifier[-1].in_features, num_classes)
+    if in_channels != 3:
+        model.features[0][0] = _collapse_stem(model.features[0][0], in_channels)
+    return LowResolutionGate(model, image_size)
@@ -0,0 +1,219 @@
+"""
+CPU inference optimizations for the EfficientNet-B0 classifier.
+
+Modes (combine with commas via ML_INFERENCE_OPTIMIZATIONS, e.g. "fuse,channels_last"):
+    fuse          fold every eval-mode BatchNorm into the preceding Conv2d
+    channels_last NHWC memory format for weights and inputs (faster oneDNN conv kernels)
+    dynamic_int8  post-training dynamic int8 quantization of Linear layers
+    static_int8   post-training static int8 quantization (FX), calibrated on real images
+
+Usage (from backend/ directory) — accuracy delta and latency of every mode on a held-out set:
+    python3 -m ml.optimize --data ml/training_data/test --calibration ml/training_data/val
+"""
+import argparse
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+from ml.config import ML_MODELS_DIR, QUANT_CALIBRATION_DIR, QUANT_CALIBRATION_SAMPLES, TRAINING_DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+OPTIMIZATIONS = ("fuse", "channels_last", "dynamic_int8", "static_int8")
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+
+#modes compared by the report; "eager" is the unoptimized baseline
+REPORT_MODES = {
+    "eager": (),
+    "fuse": ("fuse",),
+    "channels_last": ("channels_last",),
+    "fuse+channels_last": ("fuse", "channels_last"),
+    "dynamic_int8": ("dynamic_int8",),
+    "static_int8": ("static_int8",),
+}
+
+
+def parse_modes(value: str) -> tuple:
+    modes = tuple(m.strip() for m in value.split(",") if m.strip() and m.strip() != "none")
+    unknown = [m for m in modes if m not in OPTIMIZATIONS]
+    if unknown:
+        raise ValueError(f"Unknown inference optimizations: {unknown}. Choose from {OPTIMIZATIONS}")
+    return modes
+
+
+def fuse_conv_bn(model: nn.Module) -> nn.Module:
+    #torchvision's Conv2dNormActivation is Sequential(conv, bn, act): fold bn into conv, leave Identity
+    for module in model.modules():
+        if not isinstance(module, nn.Sequential):
+            continue
+        children = list(module.named_children())
+        for (conv_name, conv), (bn_name, bn) in zip(children, children[1:]):
+            if isinstance(conv, nn.Conv2d) and isinstance(bn, nn.BatchNorm2d):
+                setattr(module, conv_name, fuse_conv_bn_eval(conv, bn))
+                setattr(module, bn_name, nn.Identity())
+    return model
+
+
+def quantize_dynamic_int8(model: nn.Module) -> nn.Module:
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+def quantize_static_int8(model: nn.Module, calibration_batches: Iterable[torch.Tensor]) -> nn.Module:
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    batches = list(calibration_batches)
+    if not batches:
+        raise ValueError("static_int8 needs calibration images")
+
+    qconfig_mapping = get_default_qconfig_mapping("x86")
+    prepared = prepare_fx(model, qconfig_mapping, example_inputs=(batches[0],))
+    with torch.no_grad():
+        for batch in batches:
+            prepared(batch)
+    return convert_fx(prepared)
+
+
+def apply_optimizations(
+    model: nn.Module,
+    modes: tuple,
+    device: torch.device,
+    calibration_batches: Optional[Iterable[torch.Tensor]] = None,
+) -> tuple:
+    """
+    Apply the requested modes to an eval-mode eager model. Returns (model, applied modes);
+    modes that cannot apply here are logged and left out of `applied`.
+    """
+    applied = []
+    if "fuse" in modes or "static_int8" in modes:
+        #static quantization also wants BN folded first
+        model = fuse_conv_bn(model)
+        if "fuse" in modes:
+            applied.append("fuse")
+
+    if "channels_last" in modes:
+        model = model.to(memory_format=torch.channels_last)
+        applied.append("channels_last")
+
+    if device.type != "cpu" and ("dynamic_int8" in modes or "static_int8" in modes):
+        logger.warning(f"int8 quantization is CPU-only; skipping on {device}")
+        return model, applied
+
+    if "static_int8" in modes:
+        try:
+            return quantize_static_int8(model, calibration_batches or []), applied + ["static_int8"]
+        except Exception as e:
+            logger.warning(f"static_int8 quantization failed ({e}); skipping")
+
+    if "dynamic_int8" in modes:
+        model = quantize_dynamic_int8(model)
+        applied.append("dynamic_int8")
+
+    return model, applied
+
+
+def list_images(directory: Path) -> list:
+    #flat directory or ImageFolder layout; returns [(path, label or None)]
+    items = []
+    for path in sorted(directory.rglob("*")):
+        if path.suffix.lower() in IMAGE_EXTENSIONS:
+            label = path.parent.name if path.parent != directory else None
+            items.append((path, label))
+    return items
+
+
+def calibration_images(directory: Path = QUANT_CALIBRATION_DIR, limit: int = QUANT_CALIBRATION_SAMPLES) -> list:
+    if not directory.exists():
+        return []
+    items = list_images(directory)
+    #spread the sample across classes instead of taking the first folder only
+    rng = np.random.default_rng(0)
+    picks = rng.permutation(len(items))[:limit]
+    return [items[i][0].read_bytes() for i in sorted(picks)]
+
+
+def evaluate_mode(model_path: Path, modes: tuple, images: list, labels: list, calibration: Path, batch_size: int) -> dict:
+    from ml.predict import PredictionService
+
+    service = PredictionService(pool_address=None, batching=False, caching=False)
+    service.calibration_dir = calibration
+    if not service.load_model(str(model_path), backend="eager", optimizations=modes):
+        raise SystemExit(f"Could not load {model_path}")
+
+    #warm-up pass so allocator / kernel selection is not counted
+    service.predict_batch(images[:batch_size], chunk_size=batch_size)
+
+    predictions = []
+    timings = []
+    for start in range(0, len(images), batch_size):
+        chunk = images[start:start + batch_size]
+        t0 = time.perf_counter()
+        predictions.extend(service.predict_batch(chunk, chunk_size=batch_size))
+        timings.append((time.perf_counter() - t0) / len(chunk))
+
+    scored = [(p["label"], label) for p, label in zip(predictions, labels) if "label" in p]
+    correct = sum(1 for predicted, label in scored if predicted == label)
+    return {
+        "modes": list(modes),
+        "applied": service.optimizations,
+        "accuracy": correct / len(scored) if scored else 0.0,
+        "ms_per_image_p50": float(np.percentile(timings, 50) * 1000),
+        "ms_per_image_p90": float(np.percentile(timings, 90) * 1000),
+    }
+
+
+def optimization_report(model_path: Path, data_dir: Path, calibration: Path, batch_size: int = 16) -> dict:
+    items = [(path, label) for path, label in list_images(data_dir) if label is not None]
+    if not items:
+        raise SystemExit(f"No labeled images under {data_dir} (expected <label>/<image> folders)")
+
+    images = [path.read_bytes() for path, _ in items]
+    labels = [label for _, label in items]
+
+    results = {}
+    for name, modes in REPORT_MODES.items():
+        results[name] = evaluate_mode(model_path, modes, images, labels, calibration, batch_size)
+        print(f"  {name:<20} acc {results[name]['accuracy'] * 100:6.2f}% | "
+              f"{results[name]['ms_per_image_p50']:7.2f} ms/img (p50)")
+
+    baseline = results["eager"]
+    for entry in results.values():
+        entry["accuracy_delta"] = entry["accuracy"] - baseline["accuracy"]
+        entry["speedup"] = baseline["ms_per_image_p50"] / entry["ms_per_image_p50"] if entry["ms_per_image_p50"] else 0.0
+
+    return {"samples": len(images), "threads": torch.get_num_threads(), "modes": results}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Accuracy delta + latency of CPU inference optimizations")
+    parser.add_argument("--model", default=str(ML_MODELS_DIR / "latest.pth"), help="Checkpoint path")
+    parser.add_argument("--data", default=str(TRAINING_DATA_DIR / "test"), help="Held-out ImageFolder directory")
+    parser.add_argument("--calibration", default=str(QUANT_CALIBRATION_DIR), help="Images used to calibrate static_int8")
+    parser.add_argument("--batch-size", type=int, default=16, help="Batch size for latency measurement")
+    parser.add_argument("--accuracy-budget", type=float, default=0.5, help="Max accuracy drop in percentage points")
+    parser.add_argument("--output", default=None, help="Optional JSON report path")
+    args = parser.parse_args()
+
+    report = optimization_report(Path(args.model), Path(args.data), Path(args.calibration), args.batch_size)
+
+    #fastest mode that stays inside the accuracy budget
+    eligible = [
+        (name, entry) for name, entry in report["modes"].items()
+        if -entry["accuracy_delta"] * 100 <= args.accuracy_budget
+    ]
+    best_name, best = min(eligible, key=lambda item: item[1]["ms_per_image_p50"])
+    report["recommended"] = best_name
+    print(f"\nRecommended (within {args.accuracy_budget} pt budget): {best_name} "
+          f"— {best['speedup']:.2f}x, accuracy delta {best['accuracy_delta'] * 100:+.2f} pt")
+    print(f"  ML_INFERENCE_OPTIMIZATIONS={','.join(best['modes']) or 'none'}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
@@ -0,0 +1,148 @@
+"""
+Batched persistence of scored images: new Image rows and their Prediction rows
+(production + shadow) are buffered per request and written with one
+INSERT .. RETURNING per table and a single commit, instead of an add / commit /
+re-query round trip per image.
+"""
+import logging
+import time
+from typing import Optional
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from ml.metrics import metrics
+from models.user import Image, Prediction
+
+logger = logging.getLogger(__name__)
+
+
+def latest_predictions(db: Session, image_ids: list) -> dict:
+    #{image_id: newest non-shadow Prediction} for many images in one query
+    wanted = list({i for i in image_ids if i is not None})
+    if not wanted:
+        return {}
+    newest = (
+        select(func.max(Prediction.id))
+        .where(Prediction.image_id.in_(wanted), Prediction.is_shadow.is_(False))
+        .group_by(Prediction.image_id)
+    )
+    return {p.image_id: p for p in db.scalars(select(Prediction).where(Prediction.id.in_(newest)))}
+
+
+class PredictionWriter:
+    """
+    Buffers rows for one request. Predictions can point at an existing image id
+    or at a new image buffered in the same writer (by the slot add_image returned);
+    flush() resolves slots to the ids returned by the Image insert.
+    """
+
+    def __init__(self, db: Session, model_name: Optional[str]):
+        self.db = db
+        self.model_name = model_name
+        self._images = []
+        #(existing image id or None, new-image slot or None, predict result, image sha256)
+        self._predictions = []
+
+    def add_image(
+        self,
+        filename: str,
+        image_url: str,
+        result: Optional[dict] = None,
+        sha256: Optional[str] = None,
+        phash: Optional[int] = None,
+    ) -> int:
+        #buffer a new image (and its prediction, if scored); returns its slot in flush()'s image ids
+        slot = len(self._images)
+        self._images.append({"filename": filename, "image_url": image_url, "sha256": sha256, "phash": phash})
+        if result is not None:
+            self._predictions.append((None, slot, result, sha256))
+        return slot
+
+    def add_prediction(self, image_id: int, result: dict, sha256: Optional[str] = None):
+        self._predictions.append((image_id, None, result, sha256))
+
+    def _row(self, image_id: int, result: dict, sha256: Optional[str], is_shadow: bool) -> dict:
+        #every row has the same keys, so the whole list goes out as one executemany batch
+        return {
+            "image_id": image_id,
+            "model_name": self.model_name,
+            "predicted_label": result["label"],
+            "confidence": result["confidence"],
+            #the version that actually scored it, even if a hot reload swapped models mid-request
+            "model_version": result.get("model_version"),
+            "image_sha256": sha256,
+            "is_shadow": is_shadow,
+        }
+
+    def flush(self) -> tuple:
+        """
+        Insert everything buffered and commit once. Returns (image ids in add_image
+        order, prediction ids in add order; shadow rows are written but not returned).
+        """
+        images, predictions = self._images, self._predictions
+        self._images, self._predictions = [], []
+        if not images and not predictions:
+            return [], []
+
+        try:
+            started = time.perf_counter()
+            image_ids = []
+            if images:
+                image_ids = list(self.db.scalars(
+                    insert(Image).returning(Image.id, sort_by_parameter_order=True), images
+                ))
+
+            rows = []
+            primary = []
+            for image_id, slot, result, sha256 in predictions:
+                image_id = image_ids[slot] if image_id is None else image_id
+                primary.append(len(rows))
+                rows.append(self._row(image_id, result, sha256, is_shadow=False))
+                if result.get("shadow"):
+                    rows.append(self._row(image_id, result["shadow"], sha256, is_shadow=True))
+
+            prediction_ids = []
+            if rows:
+                ids = list(self.db.scalars(
+                    insert(Prediction).returning(Prediction.id, sort_by_parameter_order=True), rows
+                ))
+                prediction_ids = [ids[i] for i in primary]
+
+            self.db.commit()
+            metrics.observe_stage("db_write", time.perf_counter() - started)
+        except Exception:
+            self.db.rollback()
+            raise
+        return image_ids, prediction_ids
+
+    def flush_or_split(self) -> tuple:
+        """
+        flush(), but a rejected batch (e.g. a concurrent import took one of the
+        filenames) is retried one new image at a time, each with its predictions.
+        Returns (image ids in add_image order, None where that image could not be
+        saved; {slot: error message}). Prediction ids are not returned.
+        """
+        images, predictions = list(self._images), list(self._predictions)
+        try:
+            image_ids, _ = self.flush()
+            return image_ids, {}
+        except SQLAlchemyError as e:
+            logger.warning(f"Batched insert of {len(images)} images failed ({e.__class__.__name__}); retrying one by one")
+
+        image_ids = [None] * len(images)
+        errors = {}
+        for slot, image in enumerate(images):
+            self._images = [image]
+            self._predictions = [(None, 0, result, sha256) for _, s, result, sha256 in predictions if s == slot]
+            try:
+                (image_ids[slot],), _ = self.flush()
+            except SQLAlchemyError as e:
+                errors[slot] = str(getattr(e, "orig", None) or e).strip().splitlines()[0]
+
+        #predictions for images that already existed do not depend on any new row
+        self._predictions = [p for p in predictions if p[1] is None]
+        if self._predictions:
+            self.flush()
+        return image_ids, errors
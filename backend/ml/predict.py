@@ -1,39 +1,256 @@
 """EfficientNet-B0 Prediction Service"""
 import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
 from io import BytesIO
 from pathlib import Path
 from typing import Optional
 
+import numpy as np
 import torch
 import torch.nn.functional as F
 from PIL import Image as PILImage
-from torchvision import transforms
 
-from ml.config import IMAGE_SIZE, ML_MODELS_DIR
-from ml.models.classifier import get_model
+from ml.batching import MicroBatcher
+from ml.cache import image_digest, prediction_cache
+from ml.cascade import Cascade
+from ml.config import (
+    IMAGE_SIZE,
+    CASCADE_ENABLED,
+    DECODE_FAST,
+    INFERENCE_BACKEND,
+    INFERENCE_BATCHING,
+    INFERENCE_CHUNK_SIZE,
+    INFERENCE_MAX_BATCH_SIZE,
+    INFERENCE_MAX_WAIT_MS,
+    INFERENCE_OPTIMIZATIONS,
+    INFERENCE_POOL_SOCKET,
+    ML_MODELS_DIR,
+    MODEL_WATCH_INTERVAL,
+    QUANT_CALIBRATION_DIR,
+    SHADOW_FRACTION,
+    TTA_ENABLED,
+)
+from ml.decode import normalization_stats, open_image
+from ml.export import BACKENDS, checkpoint_metadata, load_exported, model_version_of
+from ml.metrics import metrics
+from ml.models.classifier import get_gate_model, get_model
+from ml.optimize import apply_optimizations, calibration_images, parse_modes
+from ml.registry import model_registry
+from ml.tta import TestTimeAugmentation
 
 logger = logging.getLogger(__name__)
 
+LATEST_CHECKPOINT = ML_MODELS_DIR / "latest.pth"
+
+
+def checkpoint_signature(path: Path) -> Optional[tuple]:
+    #cheap change detection for hot reload without opening the file;
+    #latest.pth is a registry symlink, so the resolved target changes on promote
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (os.path.realpath(path), stat.st_mtime_ns, stat.st_size)
+
+
+class LoadedModel:
+    """
+    One loaded model plus everything needed to preprocess for it. Swapped as a
+    unit on reload, so a request that grabbed it keeps a consistent model,
+    class mapping, channel count and normalization even if a swap happens mid-flight.
+    """
+
+    def __init__(self, model, metadata: dict, path: Optional[Path], backend: str, device: torch.device):
+        self.model = model
+        self.metadata = metadata
+        self.path = path
+        self.backend = backend
+        self.device = device
+        self.arch = metadata["arch"]
+        self.class_to_idx = metadata["class_to_idx"]
+        self.idx_to_class = {v: k for k, v in self.class_to_idx.items()}
+        self.version = metadata.get("model_version") or model_version_of(metadata, path)
+        self.signature = checkpoint_signature(path) if path is not None else None
+        self.in_channels = metadata.get("in_channels") or 3
+        #JSON-safe metadata for status endpoints (no weights, no metrics report)
+        self.summary = {**checkpoint_metadata(metadata), "model_version": self.version}
+        #normalization is applied once per batch on the device, shaped to broadcast over NCHW
+        mean, std = normalization_stats(self.in_channels)
+        self.mean = torch.tensor(mean, device=device).view(1, -1, 1, 1)
+        self.std = torch.tensor(std, device=device).view(1, -1, 1, 1)
+        self.optimizations = []
+        self.channels_last = False
+        self.tta: Optional[TestTimeAugmentation] = None
+        self.cascade: Optional[Cascade] = None
+        #set once synthetic batches have run through it; readiness waits for this
+        self.warmup_seconds: Optional[float] = None
+        #eager models (also fused / channels_last / dynamic int8) expose the pooled penultimate features;
+        #traced / exported / FX-quantized graphs do not, so they predict without embeddings
+        self.embeds = backend == "eager" and all(hasattr(model, name) for name in ("features", "avgpool", "classifier"))
+
+    def decode(self, image_bytes: bytes, fast: bool) -> torch.Tensor:
+        #decode + resize to a uint8 CHW tensor (same resize as transforms.Resize on a PIL image)
+        mode = "L" if self.in_channels == 1 else "RGB"
+        with metrics.stage("decode"):
+            image = open_image(BytesIO(image_bytes), fast=fast, mode=mode)
+            image = image.resize((IMAGE_SIZE, IMAGE_SIZE), PILImage.BILINEAR)
+            pixels = torch.from_numpy(np.array(image))
+        if pixels.dim() == 2:
+            return pixels.unsqueeze(0)
+        return pixels.permute(2, 0, 1)
+
+    def normalize(self, batch: torch.Tensor) -> torch.Tensor:
+        #uint8 NCHW -> normalized float NCHW; moves the small uint8 tensor to the device first
+        with metrics.stage("preprocess"):
+            batch = batch.to(self.device, non_blocking=True).float().div_(255.0)
+            batch = batch.sub_(self.mean).div_(self.std)
+            if self.channels_last:
+                batch = batch.contiguous(memory_format=torch.channels_last)
+        return batch
+
+    def probabilities(self, batch: torch.Tensor) -> torch.Tensor:
+        with torch.no_grad():
+            return F.softmax(self.model(batch), dim=1)
+
+    def forward(self, batch: torch.Tensor) -> list:
+        #one forward pass over a normalized batch, one result dict per image;
+        #with TTA, the in-band rows of the whole batch share one extra (augmented) pass;
+        #with a cascade, only the rows the gate is unsure about reach the full model
+        metrics.observe_batch_size(batch.shape[0])
+        started = time.perf_counter()
+        if self.cascade is None:
+            probabilities, embeddings, augmented = self._full_pass(batch)
+            rows = list(range(batch.shape[0]))
+        else:
+            probabilities, escalate = self.cascade.run(batch)
+            rows = escalate.tolist()
+            embeddings = augmented = None
+            if rows:
+                escalated = batch[escalate]
+                if self.channels_last:
+                    escalated = escalated.contiguous(memory_format=torch.channels_last)
+                full, embeddings, augmented = self._full_pass(escalated)
+                probabilities[escalate] = full
+        #softmax outputs are computed; what follows (argmax, result dicts, embeddings) is postprocess
+        after_forward = time.perf_counter()
+        metrics.observe_stage("forward", after_forward - started)
+        confidences, predicted_idx = torch.max(probabilities, 1)
+
+        results = [
+            {
+                "label": self.idx_to_class[idx],
+                "confidence": round(conf, 4),
+                "model_version": self.version,
+            }
+            for conf, idx in zip(confidences.tolist(), predicted_idx.tolist())
+        ]
+        if self.cascade is not None:
+            for result in results:
+                result["cascade"] = "gate"
+            for i in rows:
+                results[i]["cascade"] = "full"
+        if augmented is not None:
+            for i, was_augmented in zip(rows, augmented.tolist()):
+                if was_augmented:
+                    results[i]["tta"] = True
+        #gated rows never ran the full model, so they carry no embedding
+        if embeddings is not None:
+            for i, embedding in zip(rows, embeddings.cpu().numpy().astype(np.float16)):
+                results[i]["embedding"] = embedding
+        metrics.observe_stage("postprocess", time.perf_counter() - after_forward)
+        return results
+
+    def _full_pass(self, batch: torch.Tensor) -> tuple:
+        #full model (+ TTA) over a normalized batch: (probabilities, embeddings or None, TTA mask or None)
+        embeddings = None
+        if self.embeds:
+            #same computation as model(batch), split to keep the pooled features (result["embedding"])
+            with torch.no_grad():
+                embeddings = torch.flatten(self.model.avgpool(self.model.features(batch)), 1)
+                probabilities = F.softmax(self.model.classifier(embeddings), dim=1)
+        else:
+            probabilities = self.probabilities(batch)
+        augmented = None
+        if self.tta is not None:
+            probabilities, augmented = self.tta.refine(self._probabilities_augmented, batch, probabilities)
+        return probabilities, embeddings, augmented
+
+    def _probabilities_augmented(self, views: torch.Tensor) -> torch.Tensor:
+        #flips / crops of a channels_last batch come back in the default layout
+        if self.channels_last:
+            views = views.contiguous(memory_format=torch.channels_last)
+        return self.probabilities(views)
+
+
+def _keep_embedding(result: dict, embed: bool) -> dict:
+    #embeddings ride along on every eager forward; only callers that asked for them get them
+    if not embed:
+        result.pop("embedding", None)
+    return result
+
 
 class PredictionService:
     _instance = None
 
-    def __init__(self):
-        self.model = None
+    def __init__(
+        self,
+        pool_address: Optional[str] = INFERENCE_POOL_SOCKET,
+        batching: bool = INFERENCE_BATCHING,
+        caching: bool = True,
+    ):
         if torch.cuda.is_available():
             self.device = torch.device("cuda")
         elif torch.backends.mps.is_available():
             self.device = torch.device("mps")
         else:
             self.device = torch.device("cpu")
-        self.transform = transforms.Compose([
-            transforms.Resize((IMAGE_SIZE, IMAGE_SIZE)),
-            transforms.ToTensor(),
-            transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225]),
-        ])
-        self.class_to_idx = None
-        self.idx_to_class = None
-        self.arch = None
+        #the model in service; replaced by a single attribute assignment on reload
+        self.current: Optional[LoadedModel] = None
+        self.calibration_dir = QUANT_CALIBRATION_DIR
+        #parsed here, not at import: a typo in ML_INFERENCE_OPTIMIZATIONS must not stop the app from importing
+        try:
+            self.default_optimizations = parse_modes(INFERENCE_OPTIMIZATIONS)
+        except ValueError as e:
+            logger.error(f"Ignoring ML_INFERENCE_OPTIMIZATIONS: {e}")
+            self.default_optimizations = ()
+        logger.info(f"Inference optimizations: {'+'.join(self.default_optimizations) or 'none'}")
+        self.fast_decode = DECODE_FAST
+        self.cache = prediction_cache if caching else None
+        #shared by every model this service builds (production and shadow candidate)
+        self.tta = TestTimeAugmentation() if TTA_ENABLED else None
+
+        #single-flight loading + observable rollouts
+        self._load_lock = threading.Lock()
+        self._watcher = None
+        self.rollout = {"state": "idle"}
+        self.rollout_history = deque(maxlen=10)
+        self.startup = {"state": "pending"}
+
+        #shadow scoring: a registry candidate loaded next to production
+        self.candidate: Optional[LoadedModel] = None
+        self.shadow_fraction = SHADOW_FRACTION
+        self._candidate_lock = threading.Lock()
+        self._rng = random.Random()
+        self._shadow_stats = {"scored": 0, "agreed": 0}
+
+        #pool mode: weights live in the shared inference pool (ml/workers.py), not in this process
+        self.pool = None
+        if pool_address:
+            from ml.workers import InferencePoolClient
+            self.pool = InferencePoolClient(pool_address)
+        self.batcher = None
+        if batching and self.pool is None:
+            self.batcher = MicroBatcher(
+                self._run_batch,
+                max_batch_size=INFERENCE_MAX_BATCH_SIZE,
+                max_wait_ms=INFERENCE_MAX_WAIT_MS,
+                name="inference-batcher",
+            )
 
     @classmethod
     def get_instance(cls) -> "PredictionService":
@@ -41,48 +258,567 @@ class PredictionService:
             cls._instance = cls()
         return cls._instance
 
-    def load_model(self, model_path: Optional[str] = None) -> bool:
+    #read-only views of the model in service
+    @property
+    def is_loaded(self) -> bool:
+        return self.current is not None
+
+    @property
+    def model(self):
+        return self.current.model if self.current else None
+
+    @property
+    def arch(self) -> Optional[str]:
+        return self.current.arch if self.current else None
+
+    @property
+    def class_to_idx(self) -> Optional[dict]:
+        return self.current.class_to_idx if self.current else None
+
+    @property
+    def model_version(self) -> Optional[str]:
+        return self.current.version if self.current else None
+
+    @property
+    def backend(self) -> Optional[str]:
+        return self.current.backend if self.current else None
+
+    @property
+    def optimizations(self) -> list:
+        return self.current.optimizations if self.current else []
+
+    def load_model(
+        self,
+        model_path: Optional[str] = None,
+        backend: str = INFERENCE_BACKEND,
+        optimizations: Optional[tuple] = None,
+    ) -> bool:
         #load checkpoint from path (or latest.pth if no path given). Returns True on success
-        if model_path is None:
-            path = ML_MODELS_DIR / "latest.pth"
-        else:
-            path = Path(model_path)
+        #backend: "eager" rebuilds the torchvision model; "torchscript"/"onnx" load the exported artifact
+        #optimizations: CPU modes from ml/optimize.py, applied to the eager model only (default: ML_INFERENCE_OPTIMIZATIONS)
+        if optimizations is None:
+            optimizations = self.default_optimizations
+        with self._load_lock:
+            return self._load(model_path, backend, optimizations)
 
+    def ensure_loaded(self) -> bool:
+        #single-flight first load: concurrent first requests wait for one load instead of each loading
+        if self.current is not None:
+            return True
+        with self._load_lock:
+            if self.current is not None:
+                return True
+            return self._load(None, INFERENCE_BACKEND, self.default_optimizations)
+
+    def _load(self, model_path: Optional[str], backend: str, optimizations: tuple) -> bool:
+        #caller holds _load_lock
+        if self.pool is not None:
+            return self._connect_pool()
+
+        path = LATEST_CHECKPOINT if model_path is None else Path(model_path)
         if not path.exists():
             logger.warning(f"Model file not found: {path}")
             return False
 
+        self._swap(self._build(path, backend, optimizations))
+        return True
+
+    def _build(self, path: Path, backend: str, optimizations: tuple) -> LoadedModel:
+        #construct a LoadedModel without touching the one in service
+        if backend not in BACKENDS:
+            logger.warning(f"Unknown inference backend '{backend}', using eager")
+            backend = "eager"
+
+        if backend != "eager":
+            try:
+                model, metadata = load_exported(path, backend, self.device)
+                loaded = LoadedModel(model, metadata, path, backend, self.device)
+                loaded.tta = self.tta
+            except Exception as e:
+                logger.warning(f"{backend} backend unavailable ({e}); falling back to eager")
+            else:
+                if CASCADE_ENABLED and metadata.get("cascade"):
+                    #the gate is only stored in the checkpoint, never exported
+                    checkpoint = torch.load(path, map_location=self.device, weights_only=False)
+                    loaded.cascade = self._build_cascade(checkpoint, loaded.in_channels)
+                return loaded
+
         checkpoint = torch.load(path, map_location=self.device, weights_only=False)
-        self.arch = checkpoint["arch"]
-        self.class_to_idx = checkpoint["class_to_idx"]
-        self.idx_to_class = {v: k for k, v in self.class_to_idx.items()}
+        model = get_model(
+            num_classes=checkpoint["num_classes"],
+            pretrained=False,
+            in_channels=checkpoint.get("in_channels", 3),
+        )
+        model.load_state_dict(checkpoint["model_state_dict"])
+        model.to(self.device)
+        model.eval()
+
+        cascade = self._build_cascade(checkpoint, checkpoint.get("in_channels", 3)) if CASCADE_ENABLED else None
+        checkpoint.pop("model_state_dict")
+        checkpoint.pop("cascade_state_dict", None)
+        loaded = LoadedModel(model, checkpoint, path, "eager", self.device)
+        loaded.cascade = cascade
+
+        if optimizations:
+            calibration = self._calibration_batches(loaded) if "static_int8" in optimizations else None
+            loaded.model, loaded.optimizations = apply_optimizations(model, optimizations, self.device, calibration)
+            loaded.channels_last = "channels_last" in loaded.optimizations
+            loaded.embeds = loaded.embeds and "static_int8" not in loaded.optimizations
+
+        loaded.tta = self.tta
+        return loaded
 
-        self.model = get_model(
+    def _build_cascade(self, checkpoint: dict, in_channels: int) -> Optional[Cascade]:
+        #low-resolution gate stored next to the main weights by `ml.train --cascade`
+        metadata = checkpoint.get("cascade")
+        if not metadata or "cascade_state_dict" not in checkpoint:
+            logger.warning("ML_CASCADE is set but this checkpoint has no cascade gate; serving the full model only")
+            return None
+        gate = get_gate_model(
             num_classes=checkpoint["num_classes"],
             pretrained=False,
+            in_channels=in_channels,
+            image_size=metadata["image_size"],
         )
-        self.model.load_state_dict(checkpoint["model_state_dict"])
-        self.model.to(self.device)
-        self.model.eval()
+        gate.load_state_dict(checkpoint["cascade_state_dict"])
+        gate.to(self.device)
+        gate.eval()
+        return Cascade(gate, metadata)
+
+    def _calibration_batches(self, loaded: LoadedModel, batch_size: int = 8) -> list:
+        #normalized batches from real images, for static int8 activation ranges
+        tensors = []
+        for image_bytes in calibration_images(self.calibration_dir):
+            try:
+                tensors.append(loaded.decode(image_bytes, self.fast_decode))
+            except Exception:
+                continue
+        if not tensors:
+            logger.warning(f"No calibration images in {self.calibration_dir}")
+        return [
+            loaded.normalize(torch.stack(tensors[i:i + batch_size])).cpu()
+            for i in range(0, len(tensors), batch_size)
+        ]
+
+    def _swap(self, loaded: LoadedModel):
+        #checkpoints from before fast decode existed have no key: they were trained on full decodes
+        fast_decode = bool(loaded.metadata.get("fast_decode"))
+        if fast_decode != self.fast_decode:
+            logger.warning(
+                f"Model was trained with fast_decode={fast_decode} but serving uses "
+                f"fast_decode={self.fast_decode}; set ML_DECODE_FAST to match"
+            )
+        if self.cache is not None:
+            self.cache.invalidate(loaded.version)
+        #atomic: in-flight requests keep the LoadedModel they already grabbed
+        self.current = loaded
+        modes = "+".join(loaded.optimizations) or "no optimizations"
+        logger.info(f"Loaded model: {loaded.arch} ({loaded.version}, {loaded.backend}, {modes}) from {loaded.path}")
+
+    def _warm(self, loaded: LoadedModel) -> float:
+        #run synthetic batches so allocator / kernel selection happen before real traffic
+        started = time.perf_counter()
+        for size in sorted({1, INFERENCE_MAX_BATCH_SIZE}):
+            batch = torch.zeros((size, loaded.in_channels, IMAGE_SIZE, IMAGE_SIZE), dtype=torch.uint8)
+            loaded.forward(loaded.normalize(batch))
+        loaded.warmup_seconds = round(time.perf_counter() - started, 3)
+        if loaded.cascade is not None:
+            #per-image cost of each stage on this host, for cascade_stats()
+            loaded.cascade.measure(loaded.probabilities, loaded.normalize(batch))
+        return loaded.warmup_seconds
 
-        logger.info(f"Loaded model: {self.arch} from {path}")
+    def _connect_pool(self) -> bool:
+        try:
+            info = self.pool.info()
+        except (OSError, EOFError, RuntimeError) as e:
+            logger.warning(f"Inference pool unavailable at {self.pool.address}: {e}")
+            return False
+        #weights stay in the pool; this LoadedModel only carries the metadata
+        loaded = LoadedModel(None, info, None, info.get("backend", "pool"), self.device)
+        loaded.warmup_seconds = 0.0  # nothing to warm in this process
+        if self.cache is not None:
+            self.cache.invalidate(loaded.version)
+        self.current = loaded
+        logger.info(f"Using inference pool at {self.pool.address} ({loaded.arch}, {loaded.version})")
         return True
 
-    def predict(self, image_bytes: bytes) -> dict:
-        if self.model is None:
-            raise RuntimeError("Model not loaded. Call load_model() first.")
+    #startup
+    def start_background(self):
+        #load + warm off the request path, then keep the model current; readiness() reports progress
+        thread = threading.Thread(target=self._startup, name="model-startup", daemon=True)
+        thread.start()
 
-        image = PILImage.open(BytesIO(image_bytes)).convert("RGB")
-        img_tensor = self.transform(image).unsqueeze(0).to(self.device) # add batch dimension
+    def _startup(self):
+        startup = {"state": "loading", "started_at": datetime.now(timezone.utc).isoformat()}
+        self.startup = startup
+        try:
+            started = time.perf_counter()
+            if not self.ensure_loaded():
+                startup["state"] = "no_model"
+            else:
+                startup["load_seconds"] = round(time.perf_counter() - started, 3)
+                loaded = self.current
+                if loaded.warmup_seconds is None:
+                    startup["state"] = "warming"
+                    self._warm(loaded)
+                startup["warmup_seconds"] = loaded.warmup_seconds
+                startup["state"] = "ready"
+                logger.info(
+                    f"Model {loaded.version} ready (load {startup['load_seconds']}s, warm-up {loaded.warmup_seconds}s)"
+                )
+            self.sync_candidate()
+        except Exception as e:
+            logger.exception("Model startup failed")
+            startup["state"] = "failed"
+            startup["error"] = str(e)
+        finally:
+            startup["finished_at"] = datetime.now(timezone.utc).isoformat()
+            #a later checkpoint (first training run, promote) still gets picked up
+            self.start_watcher()
 
-        with torch.no_grad():
-            outputs = self.model(img_tensor)
-            probabilities = F.softmax(outputs, dim=1)
-            confidence, predicted_idx = torch.max(probabilities, 1)
+    def readiness(self) -> dict:
+        #ready = a model is in service and has been warmed (startup or hot reload)
+        current = self.current
+        ready = current is not None and current.warmup_seconds is not None
+        return {
+            "ready": ready,
+            "state": "ready" if ready else self.startup["state"],
+            "model_version": current.version if current else None,
+            "load_seconds": self.startup.get("load_seconds"),
+            "warmup_seconds": current.warmup_seconds if current else None,
+            "error": self.startup.get("error"),
+        }
 
-        predicted_label = self.idx_to_class[predicted_idx.item()]
+    #hot reload
+    def reload_if_changed(self, path: Path = LATEST_CHECKPOINT) -> bool:
+        #start a background reload when the checkpoint on disk differs from the one in service
+        if self.pool is not None:
+            return False
+        signature = checkpoint_signature(path)
+        if signature is None:
+            return False
+        current = self.current
+        if current is not None and current.path == path and current.signature == signature:
+            return False
+        return self.reload_async(path)
+
+    def reload_async(self, path: Path = LATEST_CHECKPOINT) -> bool:
+        #returns False if a load is already in flight (single-flight)
+        if not self._load_lock.acquire(blocking=False):
+            return False
+        thread = threading.Thread(target=self._reload, args=(path,), name="model-reload", daemon=True)
+        try:
+            thread.start()
+        except Exception:
+            self._load_lock.release()
+            raise
+        return True
+
+    def _reload(self, path: Path):
+        #runs with _load_lock held; load + warm the candidate, then swap it in
+        rollout = {
+            "state": "loading",
+            "path": str(path),
+            "from_version": self.model_version,
+            "to_version": None,
+            "started_at": datetime.now(timezone.utc).isoformat(),
+        }
+        self.rollout = rollout
+        try:
+            started = time.perf_counter()
+            loaded = self._build(path, INFERENCE_BACKEND, self.default_optimizations)
+            rollout["to_version"] = loaded.version
+            rollout["load_seconds"] = round(time.perf_counter() - started, 3)
+
+            rollout["state"] = "warming"
+            rollout["warmup_seconds"] = round(self._warm(loaded), 3)
+
+            self._swap(loaded)
+            rollout["state"] = "swapped"
+        except Exception as e:
+            logger.exception(f"Hot reload of {path} failed; keeping {rollout['from_version']}")
+            rollout["state"] = "failed"
+            rollout["error"] = str(e)
+        finally:
+            rollout["finished_at"] = datetime.now(timezone.utc).isoformat()
+            self.rollout_history.appendleft(dict(rollout))
+            self._load_lock.release()
+
+    def start_watcher(self, interval: float = MODEL_WATCH_INTERVAL):
+        #poll latest.pth and hot-reload when it changes (0 disables)
+        if interval <= 0 or self.pool is not None or self._watcher is not None:
+            return
+
+        def watch():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.reload_if_changed()
+                    self.sync_candidate()
+                except Exception:
+                    logger.exception("Model watcher check failed")
+
+        self._watcher = threading.Thread(target=watch, name="model-watcher", daemon=True)
+        self._watcher.start()
+
+    def rollout_status(self) -> dict:
+        current = self.current
+        return {
+            "model_version": current.version if current else None,
+            "path": str(current.path) if current and current.path else None,
+            "backend": current.backend if current else None,
+            "rollout": dict(self.rollout),
+            "history": list(self.rollout_history),
+            "shadow": self.shadow_stats(),
+        }
+
+    #shadow scoring
+    def sync_candidate(self) -> bool:
+        #load / drop the candidate so it matches the registry; returns True if it changed
+        if self.pool is not None:
+            return False
+        if not self._candidate_lock.acquire(blocking=False):
+            return False
+        try:
+            wanted = model_registry.candidate_version()
+            loaded = self.candidate
+            if wanted == (loaded.version if loaded else None):
+                return False
+            if wanted is None:
+                self.candidate = None
+                logger.info(f"Shadow scoring stopped ({loaded.version})")
+                return True
+
+            candidate = self._build(model_registry.path_of(wanted), INFERENCE_BACKEND, self.default_optimizations)
+            self._warm(candidate)
+            self.candidate = candidate
+            self._shadow_stats = {"scored": 0, "agreed": 0}
+            logger.info(f"Shadow scoring {candidate.version} on {self.shadow_fraction:.0%} of traffic")
+            return True
+        except Exception:
+            logger.exception("Could not load shadow candidate")
+            return False
+        finally:
+            self._candidate_lock.release()
 
+    def _shadow_candidate(self, loaded: LoadedModel) -> Optional[LoadedModel]:
+        #the candidate if this request is sampled for shadow scoring
+        candidate = self.candidate
+        if candidate is None or candidate.version == loaded.version or self.shadow_fraction <= 0:
+            return None
+        return candidate if self._rng.random() < self.shadow_fraction else None
+
+    def _shadow_input(self, candidate: LoadedModel, loaded: LoadedModel, tensor: torch.Tensor, image_bytes: bytes):
+        #reuse the production decode unless the candidate takes a different channel count
+        if candidate.in_channels == loaded.in_channels:
+            return tensor
+        return candidate.decode(image_bytes, self.fast_decode)
+
+    def _record_shadow(self, result: dict, shadow: dict):
+        shadow.pop("embedding", None)
+        result["shadow"] = shadow
+        self._shadow_stats["scored"] += 1
+        self._shadow_stats["agreed"] += int(shadow["label"] == result["label"])
+
+    def shadow_stats(self) -> dict:
+        candidate = self.candidate
+        scored = self._shadow_stats["scored"]
         return {
-            "label": predicted_label,
-            "confidence": round(confidence.item(), 4),
+            "candidate": candidate.version if candidate else None,
+            "fraction": self.shadow_fraction,
+            "scored": scored,
+            "agreement": round(self._shadow_stats["agreed"] / scored, 4) if scored else None,
         }
+
+    #inference
+    def _run_batch(self, items: list) -> list:
+        #batcher callback: items are (LoadedModel, uint8 tensor); group by model in case a swap landed mid-batch
+        results = [None] * len(items)
+        groups = {}
+        for i, (loaded, _) in enumerate(items):
+            groups.setdefault(id(loaded), (loaded, []))[1].append(i)
+
+        for loaded, indices in groups.values():
+            batch = torch.stack([items[i][1] for i in indices])
+            for i, result in zip(indices, loaded.forward(loaded.normalize(batch))):
+                results[i] = result
+        return results
+
+    def _check_pool_version(self, results: list):
+        #the pool hot-reloads on its own; refresh our metadata when its version moves
+        current = self.current
+        for result in results:
+            version = result.get("model_version")
+            if version and current is not None and version != current.version:
+                self._connect_pool()
+                return
+
+    def predict(
+        self,
+        image_bytes: bytes,
+        digest: Optional[str] = None,
+        shadow: bool = True,
+        embed: bool = False,
+    ) -> dict:
+        #shadow: let the candidate score this image too (result["shadow"]); off for results that are not stored
+        #embed: keep the float16 penultimate embedding (result["embedding"]); cache hits serve it when they
+        #stored one, otherwise the image is scored again
+        loaded = self.current
+        if loaded is None:
+            raise RuntimeError("Model not loaded. Call load_model() first.")
+        if self.cache is None:
+            return _keep_embedding(self._predict_one(loaded, image_bytes, shadow, embed), embed)
+
+        #same bytes + same model version -> skip decode and forward entirely
+        digest = digest or image_digest(image_bytes)
+        cached = self.cache.get(digest, loaded.version, need_embedding=embed)
+        if cached is not None:
+            return _keep_embedding(cached, embed)
+        result = self._predict_one(loaded, image_bytes, shadow, embed)
+        self.cache.put(digest, result.get("model_version", loaded.version), result)
+        return _keep_embedding(result, embed)
+
+    def _predict_one(self, loaded: LoadedModel, image_bytes: bytes, shadow: bool = True, embed: bool = False) -> dict:
+        if self.pool is not None:
+            result = self.pool.predict(image_bytes, embed)
+            self._check_pool_version([result])
+            return result
+
+        img_tensor = loaded.decode(image_bytes, self.fast_decode)
+        items = [(loaded, img_tensor)]
+        candidate = self._shadow_candidate(loaded) if shadow else None
+        if candidate is not None:
+            try:
+                items.append((candidate, self._shadow_input(candidate, loaded, img_tensor, image_bytes)))
+            except Exception as e:
+                logger.warning(f"Shadow decode failed: {e}")
+
+        #concurrent callers are grouped into one forward pass by the batcher thread;
+        #a shadow item rides in the same batch and _run_batch runs each model once
+        if self.batcher is not None:
+            futures = [self.batcher.submit(item) for item in items]
+            results = [future.result() for future in futures]
+        else:
+            results = self._run_batch(items)
+
+        result = results[0]
+        if len(results) > 1:
+            self._record_shadow(result, results[1])
+        return result
+
+    def predict_batch(
+        self,
+        images: list,
+        chunk_size: int = INFERENCE_CHUNK_SIZE,
+        digests: Optional[list] = None,
+        shadow: bool = True,
+        embed: bool = False,
+    ) -> list:
+        """
+        Predict many images at once. Returns one entry per input, in order:
+        {"label", "confidence", "model_version"} on success or {"error": "..."} if that image failed.
+        A bad image never fails the rest of the batch. Cached images are not re-scored,
+        unless `embed` asks for an embedding their cache entry does not have.
+        """
+        loaded = self.current
+        if loaded is None:
+            raise RuntimeError("Model not loaded. Call load_model() first.")
+        if self.cache is None:
+            results = self._predict_batch_uncached(loaded, images, chunk_size, shadow, embed)
+            return [_keep_embedding(result, embed) for result in results]
+
+        digests = digests or [image_digest(image_bytes) for image_bytes in images]
+        results = []
+        for digest in digests:
+            cached = self.cache.get(digest, loaded.version, need_embedding=embed)
+            results.append(None if cached is None else _keep_embedding(cached, embed))
+        misses = [i for i, result in enumerate(results) if result is None]
+
+        if misses:
+            computed = self._predict_batch_uncached(loaded, [images[i] for i in misses], chunk_size, shadow, embed)
+            for i, result in zip(misses, computed):
+                #cached with its embedding (if any) before it is stripped for callers that did not ask
+                self.cache.put(digests[i], result.get("model_version", loaded.version), result)
+                results[i] = _keep_embedding(result, embed)
+
+        return results
+
+    def _predict_batch_uncached(
+        self,
+        loaded: LoadedModel,
+        images: list,
+        chunk_size: int,
+        shadow: bool = True,
+        embed: bool = False,
+    ) -> list:
+        if self.pool is not None:
+            results = self.pool.predict_batch(images, embed)
+            self._check_pool_version(results)
+            return results
+
+        results = [None] * len(images)
+        #one uint8 buffer reused for every chunk; only decoded images are packed into it
+        buffer = torch.empty((chunk_size, loaded.in_channels, IMAGE_SIZE, IMAGE_SIZE), dtype=torch.uint8)
+
+        for start in range(0, len(images), chunk_size):
+            filled = []
+            for i in range(start, min(start + chunk_size, len(images))):
+                try:
+                    buffer[len(filled)] = loaded.decode(images[i], self.fast_decode)
+                    filled.append(i)
+                except Exception as e:
+                    results[i] = {"error": f"Could not decode image: {e}"}
+
+            if not filled:
+                continue
+
+            try:
+                chunk_results = loaded.forward(loaded.normalize(buffer[:len(filled)]))
+            except Exception as e:
+                logger.exception("Batched forward pass failed")
+                chunk_results = [{"error": f"Prediction failed: {e}"}] * len(filled)
+            else:
+                if shadow:
+                    self._shadow_chunk(loaded, images, filled, buffer, chunk_results)
+
+            for i, result in zip(filled, chunk_results):
+                results[i] = result
+
+        return results
+
+    def _shadow_chunk(self, loaded: LoadedModel, images: list, filled: list, buffer: torch.Tensor, chunk_results: list):
+        #sampled rows of a chunk also go through the candidate, as one more batched forward pass
+        rows = [j for j in range(len(filled)) if self._shadow_candidate(loaded) is not None]
+        candidate = self.candidate
+        if not rows or candidate is None:
+            return
+        try:
+            if candidate.in_channels == loaded.in_channels:
+                shadow_input = buffer[rows]
+            else:
+                shadow_input = torch.stack([candidate.decode(images[filled[j]], self.fast_decode) for j in rows])
+            for j, shadow in zip(rows, candidate.forward(candidate.normalize(shadow_input))):
+                self._record_shadow(chunk_results[j], shadow)
+        except Exception:
+            logger.exception("Shadow forward pass failed")
+
+    def cache_stats(self) -> dict:
+        if self.cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.cache.stats()}
+
+    def tta_stats(self) -> dict:
+        if self.tta is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.tta.stats()}
+
+    def cascade_stats(self) -> dict:
+        current = self.current
+        if current is None or current.cascade is None:
+            return {"enabled": False}
+        return {"enabled": True, "model_version": current.version, **current.cascade.stats()}
+
+    def batching_stats(self) -> dict:
+        if self.batcher is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.batcher.stats()}
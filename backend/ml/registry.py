@@ -0,0 +1,223 @@
+"""
+Versioned model registry: content-addressed checkpoints plus an index of versions and metrics.
+
+Layout (under ml_models/):
+    registry/objects/<sha256>.pth        checkpoint, named by the hash of its bytes
+    registry/objects/<sha256>.onnx, ...  exported artifacts and .meta.json sidecar of that checkpoint
+    registry/index.json                  {"versions": {...}, "current": ..., "candidate": ...}
+    latest.pth, latest.onnx, ...         symlinks to the current version's objects
+
+Promoting a version re-points the latest.* symlinks (os.replace) instead of
+copying the checkpoint, so every existing reader of latest.pth keeps working
+and hot-reloading servers see a single switch. The "candidate" version is
+loaded next to production for shadow scoring (see PredictionService).
+
+Usage (from backend/ directory):
+    python3 -m ml.registry list
+    python3 -m ml.registry promote efficientnet_b0_20260101_120000
+    python3 -m ml.registry candidate efficientnet_b0_20260101_120000
+    python3 -m ml.registry candidate --clear
+    python3 -m ml.registry import ml_models/efficientnet_b0_*.pth ml_models/latest.pth
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from ml.config import ML_MODELS_DIR
+from ml.export import SUFFIXES, exported_path, load_metadata, model_version_of, sidecar_path, write_sidecar
+
+logger = logging.getLogger(__name__)
+
+
+def file_digest(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _point(link: Path, target: Path):
+    #atomically make `link` refer to `target`: relative symlink, or a copy where symlinks are unavailable
+    tmp = link.with_name(link.name + ".tmp")
+    if tmp.is_symlink() or tmp.exists():
+        tmp.unlink()
+    try:
+        os.symlink(os.path.relpath(target, link.parent), tmp)
+    except OSError:
+        shutil.copyfile(target, tmp)
+    os.replace(tmp, link)
+
+
+def _move(src: Path, dest: Path):
+    #content-addressed: an existing object with this name already has these bytes
+    if dest.exists():
+        if src.resolve() != dest.resolve():
+            src.unlink()
+    else:
+        os.replace(src, dest)
+
+
+class ModelRegistry:
+    def __init__(self, root: Path = ML_MODELS_DIR):
+        self.root = root
+        self.objects = root / "registry" / "objects"
+        self.index_path = root / "registry" / "index.json"
+        self.latest = root / "latest.pth"
+        self._lock = threading.Lock()
+
+    def _read_index(self) -> dict:
+        try:
+            return json.loads(self.index_path.read_text())
+        except (OSError, ValueError):
+            return {"versions": {}, "current": None, "candidate": None}
+
+    def _write_index(self, index: dict):
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.index_path.with_name(self.index_path.name + ".tmp")
+        tmp.write_text(json.dumps(index, indent=2))
+        tmp.replace(self.index_path)
+
+    #queries
+    def index(self) -> dict:
+        return self._read_index()
+
+    def get(self, version: str) -> Optional[dict]:
+        return self._read_index()["versions"].get(version)
+
+    def path_of(self, version: str) -> Path:
+        entry = self.get(version)
+        if entry is None:
+            raise KeyError(f"Unknown model version: {version}")
+        return self.objects / f"{entry['sha256']}.pth"
+
+    def current_version(self) -> Optional[str]:
+        return self._read_index().get("current")
+
+    def candidate_version(self) -> Optional[str]:
+        return self._read_index().get("candidate")
+
+    #updates
+    def register(self, checkpoint_path: Path, metadata: dict, exports: Optional[dict] = None) -> dict:
+        """
+        Move a checkpoint (and its exported artifacts, {backend: path}) into the
+        object store and record it in the index. Returns the index entry.
+        """
+        self.objects.mkdir(parents=True, exist_ok=True)
+        digest = file_digest(checkpoint_path)
+        object_path = self.objects / f"{digest}.pth"
+        version = model_version_of(metadata, checkpoint_path)
+
+        #artifacts first, the checkpoint last: an object .pth implies its siblings are complete
+        for backend, path in (exports or {}).items():
+            _move(Path(path), exported_path(object_path, backend))
+        stale_sidecar = sidecar_path(checkpoint_path)
+        if stale_sidecar.exists() and stale_sidecar != sidecar_path(object_path):
+            stale_sidecar.unlink()
+        write_sidecar(object_path, metadata)
+        _move(checkpoint_path, object_path)
+
+        entry = {
+            "version": version,
+            "sha256": digest,
+            "size_bytes": object_path.stat().st_size,
+            "exports": sorted(b for b in SUFFIXES if exported_path(object_path, b).exists()),
+            "registered_at": datetime.now(timezone.utc).isoformat(),
+            **{k: v for k, v in metadata.items() if k != "class_to_idx"},
+        }
+        with self._lock:
+            index = self._read_index()
+            index["versions"][version] = entry
+            self._write_index(index)
+        logger.info(f"Registered model {version} ({digest[:12]})")
+        return entry
+
+    def promote(self, version: str) -> dict:
+        #re-point latest.* at this version; latest.pth last, since servers watch it
+        object_path = self.path_of(version)
+        for backend in SUFFIXES:
+            link = exported_path(self.latest, backend)
+            target = exported_path(object_path, backend)
+            if target.exists():
+                _point(link, target)
+            elif link.is_symlink() or link.exists():
+                #never leave the previous version's export behind latest.*
+                link.unlink()
+        _point(sidecar_path(self.latest), sidecar_path(object_path))
+        _point(self.latest, object_path)
+
+        with self._lock:
+            index = self._read_index()
+            index["current"] = version
+            if index.get("candidate") == version:
+                index["candidate"] = None
+            self._write_index(index)
+        logger.info(f"Promoted model {version}")
+        return index["versions"][version]
+
+    def set_candidate(self, version: Optional[str]):
+        if version is not None:
+            self.path_of(version)  # raises on unknown versions
+        with self._lock:
+            index = self._read_index()
+            index["candidate"] = version
+            self._write_index(index)
+
+    def import_checkpoint(self, path: Path) -> dict:
+        #adopt a pre-registry checkpoint (and the exports beside it); latest.pth becomes a symlink
+        is_latest = path.resolve() == self.latest.resolve() and not self.latest.is_symlink()
+        metadata = load_metadata(path)
+        if metadata is None:
+            raise FileNotFoundError(f"No checkpoint at {path}")
+        exports = {b: exported_path(path, b) for b in SUFFIXES if exported_path(path, b).exists()}
+        entry = self.register(path, metadata, exports)
+        if is_latest:
+            self.promote(entry["version"])
+        return entry
+
+
+# Global model registry instance
+model_registry = ModelRegistry()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Model registry: list, promote and shadow-test versions")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="Versions with metrics, current and candidate")
+    promote_parser = sub.add_parser("promote", help="Make a version current (re-points latest.*)")
+    promote_parser.add_argument("version")
+    candidate_parser = sub.add_parser("candidate", help="Shadow-score a version next to current")
+    candidate_parser.add_argument("version", nargs="?")
+    candidate_parser.add_argument("--clear", action="store_true", help="Stop shadow scoring")
+    import_parser = sub.add_parser("import", help="Move existing .pth checkpoints into the registry")
+    import_parser.add_argument("paths", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        index = model_registry.index()
+        for version, entry in sorted(index["versions"].items(), key=lambda item: item[1]["registered_at"]):
+            marker = "*" if version == index.get("current") else ("~" if version == index.get("candidate") else " ")
+            acc = entry.get("cv_mean_acc")
+            auc = entry.get("cv_mean_auc")
+            print(f"{marker} {version:<40} {entry['sha256'][:12]}  "
+                  f"acc {acc if acc is not None else '-':>8}  auc {auc if auc is not None else '-':>8}  "
+                  f"{','.join(entry['exports']) or 'eager only'}")
+        print("\n* current   ~ candidate (shadow)")
+    elif args.command == "promote":
+        model_registry.promote(args.version)
+    elif args.command == "candidate":
+        if not args.clear and not args.version:
+            parser.error("candidate needs a version or --clear")
+        model_registry.set_candidate(None if args.clear else args.version)
+    elif args.command == "import":
+        for path in args.paths:
+            entry = model_registry.import_checkpoint(Path(path))
+            print(f"Imported {path} as {entry['version']}")
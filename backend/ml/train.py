@@ -1,7 +1,13 @@
 #!/usr/bin/env python
 """EfficientNet-B0 Training Script: binary classification of dental X-rays."""
 import argparse
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from functools import partial
+from pathlib import Path
 
 #matplotlib: used to save ROC curve plot after cross-validation
 import matplotlib
@@ -13,11 +19,20 @@ import torch.nn as nn
 import torch.optim as optim
 from sklearn.metrics import classification_report, confusion_matrix, roc_auc_score, roc_curve
 from sklearn.model_selection import StratifiedKFold
-from torch.utils.data import DataLoader, Subset
 from torchvision import datasets, transforms
 
+from ml.cascade import calibrate_threshold, seconds_per_image, throughput_report
 from ml.config import (
     BATCH_SIZE,
+    CASCADE_ARCH,
+    CASCADE_EPOCHS,
+    CASCADE_IMAGE_SIZE,
+    CASCADE_LEARNING_RATE,
+    CASCADE_TRAIN,
+    CV_FOLD_PROCESSES,
+    DECODE_FAST,
+    GRAYSCALE,
+    LOADER_WORKERS,
     MODEL_ARCH,
     EARLY_STOP_PATIENCE,
     IMAGE_SIZE,
@@ -28,9 +43,15 @@ from ml.config import (
     NUM_EPOCHS,
     RANDOM_SEED,
     SCHEDULER_PATIENCE,
+    TRAINING_CACHE,
 )
-from ml.data_prep import cleanup_training_data, prepare_all_data
-from ml.models.classifier import get_model
+from ml.data_prep import load_etags, prepare_all_data
+from ml.decode import load_image, normalization_stats
+from ml.export import checkpoint_metadata, export_artifacts, exported_path
+from ml.image_cache import cached_image_folder
+from ml.loader import FoldLoaders, StepTimer
+from ml.models.classifier import get_gate_model, get_model
+from ml.registry import model_registry
 
 if torch.cuda.is_available():
     DEVICE = torch.device("cuda")
@@ -70,35 +91,42 @@ def save_roc_curve(fpr, tpr, auc_score, fold_results, output_path, arch):
     plt.close(fig)
 
 
-def get_transforms():
+def get_transforms(in_channels: int = 3, tensor_input: bool = False):
+    #tensor_input: inputs are uint8 CHW tensors from the training image cache instead of PIL images
+    mean, std = normalization_stats(in_channels)
+    #saturation jitter is meaningless on single-channel images
+    saturation = 0.1 if in_channels == 3 else 0.0
+    to_tensor = transforms.ConvertImageDtype(torch.float) if tensor_input else transforms.ToTensor()
+
     train_transform = transforms.Compose([
         transforms.Resize((IMAGE_SIZE, IMAGE_SIZE)),
         transforms.RandomHorizontalFlip(p=0.5),
         transforms.RandomVerticalFlip(p=0.3),
         transforms.RandomRotation(15),
-        transforms.ColorJitter(brightness=0.2, contrast=0.2, saturation=0.1),
+        transforms.ColorJitter(brightness=0.2, contrast=0.2, saturation=saturation),
         transforms.RandomAffine(degrees=0, translate=(0.1, 0.1)),
-        transforms.ToTensor(),
-        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+        to_tensor,
+        transforms.Normalize(mean=mean, std=std),
     ])
 
     val_transform = transforms.Compose([
         transforms.Resize((IMAGE_SIZE, IMAGE_SIZE)),
-        transforms.ToTensor(),
-        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+        to_tensor,
+        transforms.Normalize(mean=mean, std=std),
     ])
 
     return train_transform, val_transform
 
 
-def train_epoch(model, loader, criterion, optimizer):
+def train_epoch(model, loader, criterion, optimizer, timer=None):
     model.train()
     running_loss = 0.0
     correct = 0
     total = 0
 
-    for images, labels in loader:
-        images, labels = images.to(DEVICE), labels.to(DEVICE)
+    for images, labels in (timer.wrap(loader) if timer else loader):
+        images = images.to(DEVICE, non_blocking=loader.pin_memory)
+        labels = labels.to(DEVICE, non_blocking=loader.pin_memory)
 
         optimizer.zero_grad()
         outputs = model(images)
@@ -114,7 +142,7 @@ def train_epoch(model, loader, criterion, optimizer):
     return running_loss / len(loader), 100 * correct / total
 
 #run validation and return loss, accuracy, predictions, labels, and probabilities
-def validate(model, loader, criterion):
+def validate(model, loader, criterion, timer=None):
     model.eval()
     running_loss = 0.0
     correct = 0
@@ -124,8 +152,9 @@ def validate(model, loader, criterion):
     all_probs = []
 
     with torch.no_grad():
-        for images, labels in loader:
-            images, labels = images.to(DEVICE), labels.to(DEVICE)
+        for images, labels in (timer.wrap(loader) if timer else loader):
+            images = images.to(DEVICE, non_blocking=loader.pin_memory)
+            labels = labels.to(DEVICE, non_blocking=loader.pin_memory)
 
             outputs = model(images)
             loss = criterion(outputs, labels)
@@ -142,16 +171,206 @@ def validate(model, loader, criterion):
 
     return running_loss / len(loader), 100 * correct / total, all_preds, all_labels, all_probs
 
+#cascade gate: trained on one CV split, so its threshold can be calibrated on held-out images
+def train_gate(loaders, targets, train_idx, val_idx, in_channels, epochs=CASCADE_EPOCHS):
+    loaders.use(train_idx, val_idx)
+    train_loader, val_loader = loaders.train, loaders.val
+
+    split_targets = targets[train_idx]
+    class_counts = torch.tensor([np.sum(split_targets == i) for i in range(NUM_CLASSES)], dtype=torch.float)
+    class_weights = class_counts.sum() / (len(class_counts) * class_counts)
+
+    gate = get_gate_model(num_classes=NUM_CLASSES, in_channels=in_channels, image_size=CASCADE_IMAGE_SIZE).to(DEVICE)
+    criterion = nn.CrossEntropyLoss(weight=class_weights.to(DEVICE))
+    optimizer = optim.Adam(gate.parameters(), lr=CASCADE_LEARNING_RATE)
+    scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, mode="min", patience=SCHEDULER_PATIENCE, factor=0.5)
+
+    best_val_acc = 0.0
+    patience_counter = 0
+    gate_best_path = ML_MODELS_DIR / "_cascade_gate_best.pth"
+
+    for epoch in range(epochs):
+        timer = StepTimer()
+        train_loss, train_acc = train_epoch(gate, train_loader, criterion, optimizer, timer)
+        val_loss, val_acc, _, _, _ = validate(gate, val_loader, criterion, timer)
+        scheduler.step(val_loss)
+        print(
+            f"  Gate epoch {epoch + 1:02d}/{epochs} | "
+            f"Train Loss: {train_loss:.4f} | Train Acc: {train_acc:.2f}% | "
+            f"Val Loss: {val_loss:.4f} | Val Acc: {val_acc:.2f}% | {timer.summary()}"
+        )
+
+        if val_acc > best_val_acc:
+            best_val_acc = val_acc
+            patience_counter = 0
+            torch.save(gate.state_dict(), gate_best_path)
+        else:
+            patience_counter += 1
+
+        if patience_counter >= EARLY_STOP_PATIENCE:
+            print(f"  Early stopping at epoch {epoch + 1}")
+            break
+
+    if gate_best_path.exists():
+        gate.load_state_dict(torch.load(gate_best_path, map_location=DEVICE, weights_only=True))
+        gate_best_path.unlink()
+
+    _, _, _, val_labels, val_probs = validate(gate, val_loader, criterion)
+    return gate, np.array(val_probs), np.array(val_labels)
+
+#one CV fold: trains on train_idx with early stopping on val_idx, returns its fold_results entry
+def train_fold(fold, train_idx, val_idx, loaders, targets, num_classes, epochs, lr, in_channels, tag=""):
+    print(f"\n{tag}--- Fold {fold + 1}/{N_FOLDS} ---")
+    print(f"{tag}  Train: {len(train_idx)} samples | Val: {len(val_idx)} samples")
+
+    loaders.use(train_idx, val_idx)
+    train_loader, val_loader = loaders.train, loaders.val
+
+    #class weights from this fold's training split
+    fold_targets = targets[train_idx]
+    class_counts = torch.tensor(
+        [np.sum(fold_targets == i) for i in range(num_classes)],
+        dtype=torch.float,
+    )
+    class_weights = class_counts.sum() / (len(class_counts) * class_counts)
+
+    model = get_model(num_classes=NUM_CLASSES, in_channels=in_channels).to(DEVICE)
+    criterion = nn.CrossEntropyLoss(weight=class_weights.to(DEVICE))
+    optimizer = optim.Adam(model.parameters(), lr=lr)
+    scheduler = optim.lr_scheduler.ReduceLROnPlateau(
+        optimizer, mode="min", patience=SCHEDULER_PATIENCE, factor=0.5
+    )
+
+    best_val_acc = 0.0
+    patience_counter = 0
+    best_epoch = 0
+    fold_best_path = ML_MODELS_DIR / f"_fold{fold + 1}_best.pth"
+
+    for epoch in range(epochs):
+        timer = StepTimer()
+        train_loss, train_acc = train_epoch(model, train_loader, criterion, optimizer, timer)
+        val_loss, val_acc, _, _, _ = validate(model, val_loader, criterion, timer)
+        scheduler.step(val_loss)
+
+        print(
+            f"{tag}  Epoch {epoch + 1:02d}/{epochs} | "
+            f"Train Loss: {train_loss:.4f} | Train Acc: {train_acc:.2f}% | "
+            f"Val Loss: {val_loss:.4f} | Val Acc: {val_acc:.2f}%"
+        )
+        print(f"{tag}    {timer.summary()}")
+
+        if val_acc > best_val_acc:
+            best_val_acc = val_acc
+            patience_counter = 0
+            best_epoch = epoch + 1
+            torch.save(model.state_dict(), fold_best_path)
+            print(f"{tag}    -> New best (Val Acc: {val_acc:.2f}%)")
+        else:
+            patience_counter += 1
+
+        if patience_counter >= EARLY_STOP_PATIENCE:
+            print(f"{tag}  Early stopping at epoch {epoch + 1}")
+            break
+
+    if fold_best_path.exists():
+        model.load_state_dict(torch.load(fold_best_path, map_location=DEVICE, weights_only=True))
+        fold_best_path.unlink()
+
+    _, fold_acc, fold_preds, fold_labels, fold_probs = validate(model, val_loader, criterion)
+
+    cm = confusion_matrix(fold_labels, fold_preds)
+    tn, fp, fn, tp = cm.ravel()
+    sensitivity = tp / (tp + fn) if (tp + fn) > 0 else 0.0
+    specificity = tn / (tn + fp) if (tn + fp) > 0 else 0.0
+    pos_probs = [p[1] for p in fold_probs]
+    auc = roc_auc_score(fold_labels, pos_probs)
+
+    print(
+        f"\n{tag}  Fold {fold + 1} Results — "
+        f"Acc: {fold_acc:.2f}% | Sensitivity: {sensitivity:.4f} | "
+        f"Specificity: {specificity:.4f} | AUC: {auc:.4f}"
+    )
+
+    return {
+        "fold": fold + 1,
+        "acc": fold_acc,
+        "sensitivity": sensitivity,
+        "specificity": specificity,
+        "auc": auc,
+        "best_epoch": best_epoch,
+        "preds": fold_preds,
+        "labels": fold_labels,
+        "probs": fold_probs,
+    }
+
+#state of one fold process (see train_folds_parallel), set up once by _init_fold_worker
+_fold_worker = {}
+
+
+def _init_fold_worker(train_ds, val_ds, targets, num_classes, batch_size, in_channels, threads, loader_workers):
+    torch.set_num_threads(threads)
+    #interleaved fold logs stay readable when stdout is a pipe
+    sys.stdout.reconfigure(line_buffering=True)
+    _fold_worker.update(
+        loaders=FoldLoaders(train_ds, val_ds, batch_size, DEVICE.type, workers=loader_workers),
+        targets=targets,
+        num_classes=num_classes,
+        in_channels=in_channels,
+    )
+
+
+def _run_fold(fold, train_idx, val_idx, epochs, lr):
+    state = _fold_worker
+    return train_fold(
+        fold, train_idx, val_idx, state["loaders"], state["targets"], state["num_classes"],
+        epochs, lr, state["in_channels"], tag=f"[fold {fold + 1}] ",
+    )
+
+
+#CV folds in `processes` processes at once, each with its share of the cores; returns fold_results in fold order
+def train_folds_parallel(
+    splits, train_ds, val_ds, targets, num_classes, batch_size, epochs, lr, in_channels, processes, loader_workers
+) -> list:
+    cores = os.cpu_count() or processes
+    threads = max(1, cores // processes)
+    fold_loader_workers = loader_workers // processes
+    print(f"Fold processes: {processes} | {threads} torch threads + {fold_loader_workers} loader workers each")
+
+    #fetch the pretrained weights once, so the fold processes don't race on the download
+    get_model(num_classes=NUM_CLASSES, in_channels=in_channels)
+
+    #spawn, not fork: forking after torch has started its thread pools can deadlock the children
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_fold_worker,
+        initargs=(train_ds, val_ds, targets, num_classes, batch_size, in_channels, threads, fold_loader_workers),
+    ) as pool:
+        futures = [
+            pool.submit(_run_fold, fold, train_idx, val_idx, epochs, lr)
+            for fold, (train_idx, val_idx) in enumerate(splits)
+        ]
+        return [future.result() for future in futures]
+
 #full EfficientNet-B0 training pipeline with cross-validation
 def train_model(
     arch: str = MODEL_ARCH,
     epochs: int = NUM_EPOCHS,
     batch_size: int = BATCH_SIZE,
     lr: float = LEARNING_RATE,
+    fast_decode: bool = DECODE_FAST,
+    grayscale: bool = GRAYSCALE,
+    promote: bool = True,
+    cascade: bool = CASCADE_TRAIN,
+    cache_images: bool = TRAINING_CACHE,
+    loader_workers: int = LOADER_WORKERS,
+    fold_processes: int = CV_FOLD_PROCESSES,
 ) -> dict:
     
     print(f"\nUsing device: {DEVICE}")
     print(f"Architecture: {arch}, Epochs: {epochs}, Batch size: {batch_size}, LR: {lr}")
+    in_channels = 1 if grayscale else 3
+    print(f"Fast decode: {fast_decode} | Input channels: {in_channels} | Image cache: {cache_images}")
 
     print("\n" + "=" * 60)
     print("DOWNLOADING TRAINING DATA FROM S3")
@@ -159,12 +378,21 @@ def train_model(
 
     all_dir = prepare_all_data()
 
-    train_transform, val_transform = get_transforms()
+    train_transform, val_transform = get_transforms(in_channels, tensor_input=cache_images)
 
     #two dataset instances of the same directory (one per transform)
     #subsets index into these, so train indices get augmentation, val indices don't
-    full_train_ds = datasets.ImageFolder(str(all_dir), transform=train_transform)
-    full_val_ds = datasets.ImageFolder(str(all_dir), transform=val_transform)
+    #same decode as PredictionService: reduced-resolution when fast_decode, "L" for the grayscale variant
+    mode = "L" if grayscale else "RGB"
+    if cache_images:
+        #decoded + resized once per S3 object (ETag) and kept across runs; epochs read the memmap
+        full_train_ds, full_val_ds = cached_image_folder(
+            all_dir, load_etags(), (train_transform, val_transform), mode=mode, fast=fast_decode
+        )
+    else:
+        loader = partial(load_image, fast=fast_decode, mode=mode)
+        full_train_ds = datasets.ImageFolder(str(all_dir), transform=train_transform, loader=loader)
+        full_val_ds = datasets.ImageFolder(str(all_dir), transform=val_transform, loader=loader)
 
     class_names = full_train_ds.classes
     targets = np.array(full_train_ds.targets)
@@ -180,93 +408,29 @@ def train_model(
     ML_MODELS_DIR.mkdir(parents=True, exist_ok=True)
 
     fold_results = []
+    splits = list(skf.split(np.zeros(len(targets)), targets))
 
-    for fold, (train_idx, val_idx) in enumerate(skf.split(np.zeros(len(targets)), targets)):
-        print(f"\n--- Fold {fold + 1}/{N_FOLDS} ---")
-        print(f"  Train: {len(train_idx)} samples | Val: {len(val_idx)} samples")
-
-        train_loader = DataLoader(
-            Subset(full_train_ds, train_idx), batch_size=batch_size, shuffle=True, num_workers=0
-        )
-        val_loader = DataLoader(
-            Subset(full_val_ds, val_idx), batch_size=batch_size, shuffle=False, num_workers=0
-        )
-
-        #class weights from this fold's training split
-        fold_targets = targets[train_idx]
-        class_counts = torch.tensor(
-            [np.sum(fold_targets == i) for i in range(len(class_names))],
-            dtype=torch.float,
-        )
-        class_weights = class_counts.sum() / (len(class_counts) * class_counts)
+    fold_processes = min(fold_processes, N_FOLDS)
+    if fold_processes > 1 and DEVICE.type != "cpu":
+        print(f"Parallel folds are CPU-only; training folds sequentially on {DEVICE.type}")
+        fold_processes = 1
 
-        model = get_model(num_classes=NUM_CLASSES).to(DEVICE)
-        criterion = nn.CrossEntropyLoss(weight=class_weights.to(DEVICE))
-        optimizer = optim.Adam(model.parameters(), lr=lr)
-        scheduler = optim.lr_scheduler.ReduceLROnPlateau(
-            optimizer, mode="min", patience=SCHEDULER_PATIENCE, factor=0.5
+    if fold_processes > 1:
+        fold_results = train_folds_parallel(
+            splits, full_train_ds, full_val_ds, targets, len(class_names),
+            batch_size, epochs, lr, in_channels, fold_processes, loader_workers,
         )
 
-        best_val_acc = 0.0
-        patience_counter = 0
-        best_epoch = 0
-        fold_best_path = ML_MODELS_DIR / f"_fold{fold + 1}_best.pth"
+    #built once: every fold, the gate and the final fit reuse the same worker processes
+    loaders = FoldLoaders(full_train_ds, full_val_ds, batch_size, DEVICE.type, workers=loader_workers)
+    print(f"\nData loading: {loaders.describe()}")
 
-        for epoch in range(epochs):
-            train_loss, train_acc = train_epoch(model, train_loader, criterion, optimizer)
-            val_loss, val_acc, _, _, _ = validate(model, val_loader, criterion)
-            scheduler.step(val_loss)
-
-            print(
-                f"  Epoch {epoch + 1:02d}/{epochs} | "
-                f"Train Loss: {train_loss:.4f} | Train Acc: {train_acc:.2f}% | "
-                f"Val Loss: {val_loss:.4f} | Val Acc: {val_acc:.2f}%"
+    if fold_processes <= 1:
+        for fold, (train_idx, val_idx) in enumerate(splits):
+            fold_results.append(
+                train_fold(fold, train_idx, val_idx, loaders, targets, len(class_names), epochs, lr, in_channels)
             )
 
-            if val_acc > best_val_acc:
-                best_val_acc = val_acc
-                patience_counter = 0
-                best_epoch = epoch + 1
-                torch.save(model.state_dict(), fold_best_path)
-                print(f"    -> New best (Val Acc: {val_acc:.2f}%)")
-            else:
-                patience_counter += 1
-
-            if patience_counter >= EARLY_STOP_PATIENCE:
-                print(f"  Early stopping at epoch {epoch + 1}")
-                break
-
-        if fold_best_path.exists():
-            model.load_state_dict(torch.load(fold_best_path, map_location=DEVICE, weights_only=True))
-            fold_best_path.unlink()
-
-        _, fold_acc, fold_preds, fold_labels, fold_probs = validate(model, val_loader, criterion)
-
-        cm = confusion_matrix(fold_labels, fold_preds)
-        tn, fp, fn, tp = cm.ravel()
-        sensitivity = tp / (tp + fn) if (tp + fn) > 0 else 0.0
-        specificity = tn / (tn + fp) if (tn + fp) > 0 else 0.0
-        pos_probs = [p[1] for p in fold_probs]
-        auc = roc_auc_score(fold_labels, pos_probs)
-
-        print(
-            f"\n  Fold {fold + 1} Results — "
-            f"Acc: {fold_acc:.2f}% | Sensitivity: {sensitivity:.4f} | "
-            f"Specificity: {specificity:.4f} | AUC: {auc:.4f}"
-        )
-
-        fold_results.append({
-            "fold": fold + 1,
-            "acc": fold_acc,
-            "sensitivity": sensitivity,
-            "specificity": specificity,
-            "auc": auc,
-            "best_epoch": best_epoch,
-            "preds": fold_preds,
-            "labels": fold_labels,
-            "probs": fold_probs,
-        })
-
     print("\n" + "=" * 60)
     print(f"{N_FOLDS}-FOLD CROSS-VALIDATION SUMMARY")
     print("=" * 60)
@@ -313,12 +477,28 @@ def train_model(
     save_roc_curve(fpr, tpr, mean_auc, fold_results, roc_plot_path, arch)
     print(f"\n  ROC curve saved to: {roc_plot_path}")
 
+    cascade_gate = None
+    if cascade:
+        print("\n" + "=" * 60)
+        print(f"CASCADE GATE ({CASCADE_ARCH} @ {CASCADE_IMAGE_SIZE}px, fold 1 split)")
+        print("=" * 60)
+        #calibrated against the fold 1 model's out-of-fold predictions on the same held-out images
+        train_idx, val_idx = splits[0]
+        cascade_gate, gate_probs, gate_labels = train_gate(loaders, targets, train_idx, val_idx, in_channels)
+        calibration = calibrate_threshold(gate_probs, np.array(fold_results[0]["preds"]), gate_labels)
+        print(
+            f"\n  Threshold: {calibration['threshold']:.4f} | Escalation rate: {calibration['escalation_rate'] * 100:.1f}% | "
+            f"Cascade Acc: {calibration['cascade_acc']:.2f}% vs full model {calibration['baseline_acc']:.2f}% "
+            f"(gate alone {calibration['gate_acc']:.2f}%)"
+        )
+
     print("\n" + "=" * 60)
     print("FINAL MODEL TRAINING (full dataset)")
     print("=" * 60)
     print(f"Training for {avg_best_epoch} epochs (avg best epoch across folds)")
 
-    full_loader = DataLoader(full_train_ds, batch_size=batch_size, shuffle=True, num_workers=0)
+    loaders.use(range(len(full_train_ds)))
+    full_loader = loaders.train
 
     class_counts_full = torch.tensor(
         [full_train_ds.targets.count(i) for i in range(len(class_names))],
@@ -326,13 +506,43 @@ def train_model(
     )
     class_weights_full = class_counts_full.sum() / (len(class_counts_full) * class_counts_full)
 
-    final_model = get_model(num_classes=NUM_CLASSES).to(DEVICE)
+    final_model = get_model(num_classes=NUM_CLASSES, in_channels=in_channels).to(DEVICE)
     final_criterion = nn.CrossEntropyLoss(weight=class_weights_full.to(DEVICE))
     final_optimizer = optim.Adam(final_model.parameters(), lr=lr)
 
     for epoch in range(avg_best_epoch):
-        train_loss, train_acc = train_epoch(final_model, full_loader, final_criterion, final_optimizer)
-        print(f"  Epoch {epoch + 1:02d}/{avg_best_epoch} | Train Loss: {train_loss:.4f} | Train Acc: {train_acc:.2f}%")
+        timer = StepTimer()
+        train_loss, train_acc = train_epoch(final_model, full_loader, final_criterion, final_optimizer, timer)
+        print(
+            f"  Epoch {epoch + 1:02d}/{avg_best_epoch} | Train Loss: {train_loss:.4f} | Train Acc: {train_acc:.2f}% | "
+            f"{timer.summary()}"
+        )
+
+    #real (val-transformed) images for export parity checks and the cascade throughput comparison
+    sample_images = torch.stack([full_val_ds[i][0] for i in range(min(8, len(full_val_ds)))])
+
+    cascade_report = None
+    if cascade_gate is not None:
+        final_model.eval()
+        cascade_gate.eval()
+        sample = sample_images.to(DEVICE)
+        throughput = throughput_report(
+            seconds_per_image(cascade_gate, sample),
+            seconds_per_image(final_model, sample),
+            calibration["escalation_rate"],
+        )
+        cascade_report = {
+            "arch": CASCADE_ARCH,
+            "image_size": CASCADE_IMAGE_SIZE,
+            "threshold": calibration["threshold"],
+            "calibration": calibration,
+            "throughput": {"device": DEVICE.type, **throughput},
+        }
+        print(
+            f"\n  Cascade throughput ({DEVICE.type}): gate {throughput['gate_ms_per_image']} ms/img | "
+            f"full {throughput['full_ms_per_image']} ms/img | cascade {throughput['cascade_ms_per_image']} ms/img "
+            f"({throughput['speedup']}x vs single model)"
+        )
 
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     model_filename = f"{arch}_{timestamp}.pth"
@@ -348,20 +558,43 @@ def train_model(
         "cv_mean_sensitivity": mean_sensitivity,
         "cv_mean_specificity": mean_specificity,
         "trained_at": timestamp,
+        "fast_decode": fast_decode,
+        "in_channels": in_channels,
+        "cascade": cascade_report,
     }
+    if cascade_gate is not None:
+        checkpoint["cascade_state_dict"] = cascade_gate.state_dict()
+
+    #staged next to the registry, then moved into it under its content hash
+    staging_path = ML_MODELS_DIR / model_filename
+    torch.save(checkpoint, staging_path)
+    metadata = checkpoint_metadata(checkpoint)
+
+    #optimized inference artifacts next to the checkpoint, parity-checked on real (val-transformed) images
+    export_report = export_artifacts(final_model, staging_path, metadata, sample_images=sample_images)
+    exports = {backend: Path(entry["path"]) for backend, entry in export_report.items() if "error" not in entry}
+
+    entry = model_registry.register(staging_path, metadata, exports)
+    version = entry["version"]
+    model_path = model_registry.path_of(version)
+    for backend in exports:
+        export_report[backend]["path"] = str(exported_path(model_path, backend))
+
+    #promote re-points latest.* (latest.pth last, hot-reloading servers watch it); otherwise shadow-test it
+    if promote:
+        model_registry.promote(version)
+    else:
+        model_registry.set_candidate(version)
+    latest_path = model_registry.latest
 
-    model_path = ML_MODELS_DIR / model_filename
-    torch.save(checkpoint, model_path)
-    latest_path = ML_MODELS_DIR / "latest.pth"
-    torch.save(checkpoint, latest_path)
-
-    if model_path.exists() and latest_path.exists():
+    if model_path.exists():
         size_mb = model_path.stat().st_size / (1024 * 1024)
         print(f"\n{'=' * 60}")
         print(f"MODEL SAVED SUCCESSFULLY")
         print(f"{'=' * 60}")
+        print(f"  Version: {version}")
         print(f"  File: {model_path}")
-        print(f"  Latest: {latest_path}")
+        print(f"  {'Latest' if promote else 'Candidate (shadow)'}: {latest_path if promote else version}")
         print(f"  Size: {size_mb:.1f} MB")
         print(f"  Architecture: {arch}")
         print(f"  CV Mean Acc: {mean_acc:.2f}% | CV Mean AUC: {mean_auc:.4f}")
@@ -369,19 +602,43 @@ def train_model(
     else:
         print(f"\nWARNING: Model save FAILED!")
 
-    cleanup_training_data()
+    for backend, entry in export_report.items():
+        if "error" in entry:
+            print(f"  {backend} export FAILED: {entry['error']}")
+            continue
+        parity = entry["parity"]
+        print(
+            f"  {backend}: {entry['path']} | parity max |dp|: {parity['max_abs_diff']:.2e} | "
+            f"label agreement: {parity['label_agreement'] * 100:.1f}%"
+        )
 
+    #the synced S3 copy is kept: the next run only downloads new or changed objects
     return {
         "model_path": str(model_path),
+        "model_version": version,
+        "promoted": promote,
         "architecture": arch,
         "cv_mean_acc": mean_acc,
         "cv_mean_auc": mean_auc,
         "cv_mean_sensitivity": mean_sensitivity,
         "cv_mean_specificity": mean_specificity,
         "metrics": report,
+        "exports": export_report,
+        "cascade": cascade_report,
     }
 
 
+def train_and_reload(**kwargs) -> dict:
+    #background-task entry point for the API: train, then hot-swap the new latest.pth into the serving process
+    from ml.predict import PredictionService
+
+    results = train_model(**kwargs)
+    service = PredictionService.get_instance()
+    service.reload_if_changed()
+    service.sync_candidate()
+    return results
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Train dental image CNN classifier")
     parser.add_argument(
@@ -392,6 +649,34 @@ if __name__ == "__main__":
     parser.add_argument("--epochs", type=int, default=NUM_EPOCHS, help="Number of epochs")
     parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Batch size")
     parser.add_argument("--lr", type=float, default=LEARNING_RATE, help="Learning rate")
+    parser.add_argument(
+        "--fast-decode", action=argparse.BooleanOptionalAction, default=DECODE_FAST,
+        help="Reduced-resolution JPEG decode (must match ML_DECODE_FAST at serve time)",
+    )
+    parser.add_argument(
+        "--grayscale", action=argparse.BooleanOptionalAction, default=GRAYSCALE,
+        help="Single-channel model variant (1xHxW input, stem conv collapsed from RGB)",
+    )
+    parser.add_argument(
+        "--promote", action=argparse.BooleanOptionalAction, default=True,
+        help="Make the new model current; --no-promote registers it as the shadow candidate instead",
+    )
+    parser.add_argument(
+        "--cascade", action=argparse.BooleanOptionalAction, default=CASCADE_TRAIN,
+        help="Also train the low-resolution cascade gate (served with ML_CASCADE=1)",
+    )
+    parser.add_argument(
+        "--cache-images", action=argparse.BooleanOptionalAction, default=TRAINING_CACHE,
+        help="Decode + resize each S3 object once into the persistent training image cache",
+    )
+    parser.add_argument(
+        "--loader-workers", type=int, default=LOADER_WORKERS,
+        help="DataLoader worker processes for decode + augmentation (0 = load in the training process)",
+    )
+    parser.add_argument(
+        "--fold-processes", type=int, default=CV_FOLD_PROCESSES,
+        help="Train this many CV folds at once in separate processes, splitting the CPU threads between them",
+    )
     args = parser.parse_args()
 
     results = train_model(
@@ -399,6 +684,13 @@ if __name__ == "__main__":
         epochs=args.epochs,
         batch_size=args.batch_size,
         lr=args.lr,
+        fast_decode=args.fast_decode,
+        grayscale=args.grayscale,
+        promote=args.promote,
+        cascade=args.cascade,
+        cache_images=args.cache_images,
+        loader_workers=args.loader_workers,
+        fold_processes=args.fold_processes,
     )
 
     print(f"\nTraining complete. CV Mean Acc: {results['cv_mean_acc']:.2f}% | CV Mean AUC: {results['cv_mean_auc']:.4f}")
@@ -0,0 +1,130 @@
+"""
+Test-time augmentation (TTA) for borderline predictions.
+
+Only images whose first-pass confidence falls inside [min_confidence, max_confidence]
+are augmented. The augmented views of every such image in the batch are stacked
+into ONE extra forward pass, and their softmax outputs are averaged with the
+first pass. Confident images cost nothing extra, so the average stays close to
+one forward pass per image.
+
+Views (combine with commas via ML_TTA_VIEWS, e.g. "hflip,shift"):
+    hflip   horizontal flip
+    vflip   vertical flip
+    shift   four small translations (±ML_TTA_SHIFT_PX along x and y, edges replicated)
+"""
+import logging
+import threading
+from typing import Callable, Optional
+
+import torch
+import torch.nn.functional as F
+
+from ml.config import TTA_MAX_CONFIDENCE, TTA_MIN_CONFIDENCE, TTA_SHIFT_PX, TTA_VIEWS
+
+logger = logging.getLogger(__name__)
+
+VIEWS = ("hflip", "vflip", "shift")
+DEFAULT_VIEWS = ("hflip", "shift")
+
+
+def parse_views(value) -> tuple:
+    #"hflip,shift" (ML_TTA_VIEWS) or a sequence of view names
+    names = value.split(",") if isinstance(value, str) else value
+    views = tuple(v.strip() for v in names if v.strip())
+    unknown = [v for v in views if v not in VIEWS]
+    if unknown:
+        raise ValueError(f"Unknown TTA views: {unknown}. Choose from {VIEWS}")
+    return views
+
+
+def augment(batch: torch.Tensor, views: tuple, shift_px: int) -> torch.Tensor:
+    #normalized NCHW -> (num_views * N)CHW, grouped view by view
+    out = []
+    if "hflip" in views:
+        out.append(torch.flip(batch, dims=[3]))
+    if "vflip" in views:
+        out.append(torch.flip(batch, dims=[2]))
+    if "shift" in views and shift_px > 0:
+        s = shift_px
+        height, width = batch.shape[2], batch.shape[3]
+        padded = F.pad(batch, (s, s, s, s), mode="replicate")
+        for dx, dy in ((s, 0), (-s, 0), (0, s), (0, -s)):
+            out.append(padded[:, :, s + dy:s + dy + height, s + dx:s + dx + width])
+    return torch.cat(out)
+
+
+class TestTimeAugmentation:
+    def __init__(
+        self,
+        views: Optional[tuple] = None,
+        min_confidence: float = TTA_MIN_CONFIDENCE,
+        max_confidence: float = TTA_MAX_CONFIDENCE,
+        shift_px: int = TTA_SHIFT_PX,
+    ):
+        if views is None:
+            #parsed here, not at import: a typo in ML_TTA_VIEWS must not stop the app from importing
+            try:
+                views = parse_views(TTA_VIEWS)
+            except ValueError as e:
+                logger.error(f"Ignoring ML_TTA_VIEWS: {e}; using {','.join(DEFAULT_VIEWS)}")
+                views = DEFAULT_VIEWS
+            logger.info(f"TTA views: {','.join(views)}")
+        else:
+            views = parse_views(views)
+        self.views = views
+        self.min_confidence = min_confidence
+        self.max_confidence = max_confidence
+        self.shift_px = shift_px
+        #views per augmented image (shift contributes four)
+        self.num_views = ("hflip" in views) + ("vflip" in views) + (4 if "shift" in views and shift_px > 0 else 0)
+
+        self._lock = threading.Lock()
+        self._images = 0
+        self._augmented = 0
+
+    def refine(
+        self,
+        run: Callable[[torch.Tensor], torch.Tensor],
+        batch: torch.Tensor,
+        probabilities: torch.Tensor,
+    ) -> tuple:
+        """
+        `run` maps a normalized batch to softmax probabilities. Returns
+        (probabilities, augmented mask) with in-band rows replaced by the
+        average over the first pass and all augmented views.
+        """
+        confidences = probabilities.max(dim=1).values
+        mask = (confidences >= self.min_confidence) & (confidences <= self.max_confidence)
+        if self.num_views == 0:
+            mask.zero_()
+        selected = mask.nonzero(as_tuple=True)[0]
+        count = selected.numel()
+
+        with self._lock:
+            self._images += batch.shape[0]
+            self._augmented += count
+
+        if count == 0:
+            return probabilities, mask
+
+        view_probs = run(augment(batch[selected], self.views, self.shift_px))
+        view_probs = view_probs.view(self.num_views, count, -1)
+        averaged = (view_probs.sum(dim=0) + probabilities[selected]) / (self.num_views + 1)
+
+        probabilities = probabilities.clone()
+        probabilities[selected] = averaged
+        return probabilities, mask
+
+    def stats(self) -> dict:
+        with self._lock:
+            images, augmented = self._images, self._augmented
+        return {
+            "views": list(self.views),
+            "num_views": self.num_views,
+            "band": [self.min_confidence, self.max_confidence],
+            "images": images,
+            "augmented": augmented,
+            "augmented_fraction": round(augmented / images, 4) if images else 0.0,
+            #forward rows per image relative to a single pass (1.0 = no TTA overhead)
+            "relative_cost": round(1 + augmented * self.num_views / images, 4) if images else 1.0,
+        }
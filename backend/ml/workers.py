@@ -0,0 +1,297 @@
+"""
+Shared-weight inference worker pool.
+
+One host process loads the checkpoint, moves the weights into shared memory
+and forks a fixed number of inference processes that all serve from that
+single copy. API workers (uvicorn processes) talk to the pool over a Unix
+socket, so model memory stays flat as API workers are added while inference
+throughput scales across cores.
+
+Messages are pickled, so the pool refuses to start (and API workers refuse to
+connect) without ML_INFERENCE_POOL_AUTHKEY, and the socket is created owner-only:
+run the pool and the API as the same user.
+
+Usage (from backend/ directory):
+    export ML_INFERENCE_POOL_AUTHKEY=$(python3 -c "import secrets; print(secrets.token_hex(32))")
+    python3 -m ml.workers --workers 4
+    ML_INFERENCE_POOL_SOCKET=/tmp/captcha-inference.sock uvicorn main:app --workers 8
+"""
+import argparse
+import logging
+import os
+import select
+import signal
+import socket
+import struct
+import time
+from multiprocessing.connection import Client, Connection, answer_challenge, deliver_challenge
+from pathlib import Path
+from typing import Optional
+
+from ml.config import (
+    INFERENCE_POOL_AUTHKEY,
+    INFERENCE_POOL_IO_TIMEOUT,
+    INFERENCE_POOL_SOCKET,
+    INFERENCE_POOL_WORKERS,
+    MODEL_WATCH_INTERVAL,
+)
+from ml.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET = "/tmp/captcha-inference.sock"
+
+
+def _require_authkey(authkey: Optional[bytes]) -> bytes:
+    if not authkey:
+        raise RuntimeError("ML_INFERENCE_POOL_AUTHKEY must be set to use the inference pool")
+    return authkey
+
+
+class InferencePoolClient:
+    """API-side handle: one short-lived connection per request so the kernel spreads load across workers"""
+
+    def __init__(self, address: str, authkey: Optional[bytes] = INFERENCE_POOL_AUTHKEY):
+        self.address = address
+        self.authkey = _require_authkey(authkey)
+
+    def _call(self, op: str, payload=None):
+        with Client(self.address, family="AF_UNIX", authkey=self.authkey) as conn:
+            conn.send((op, payload))
+            status, result, observations = conn.recv()
+        #the worker's decode / preprocess / forward / postprocess timings land in this process's /metrics
+        metrics.replay(observations)
+        if status == "error":
+            raise RuntimeError(f"Inference pool error: {result}")
+        return result
+
+    def info(self) -> dict:
+        return self._call("info")
+
+    def predict(self, image_bytes: bytes, embed: bool = False) -> dict:
+        return self._call("predict", (image_bytes, embed))
+
+    def predict_batch(self, images: list, embed: bool = False) -> list:
+        return self._call("predict_batch", (images, embed))
+
+
+def _handle(service, op: str, payload):
+    if op == "predict":
+        image_bytes, embed = payload
+        return service.predict(image_bytes, embed=embed)
+    if op == "predict_batch":
+        images, embed = payload
+        return service.predict_batch(images, embed=embed)
+    if op == "info":
+        return {
+            **service.current.summary,
+            "backend": service.backend,
+            "pid": os.getpid(),
+        }
+    raise ValueError(f"Unknown op: {op}")
+
+
+def _bind(address: str) -> socket.socket:
+    #the pool owns its listening socket instead of reaching into multiprocessing.connection.Listener internals
+    if os.path.exists(address):
+        os.unlink(address)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    #owner-only from the moment it is bound (a chmod afterwards would leave a window)
+    previous_umask = os.umask(0o177)
+    try:
+        sock.bind(address)
+    finally:
+        os.umask(previous_umask)
+    os.chmod(address, 0o600)
+    sock.listen(128)
+    #shared by every forked worker, which wait on it with select(); accepted sockets are made blocking again
+    sock.setblocking(False)
+    return sock
+
+
+def _accept(sock: socket.socket, authkey: bytes, timeout: float) -> Connection:
+    """
+    Accept one client and run the same challenge / response handshake as
+    multiprocessing's Listener, so InferencePoolClient keeps using Client().
+    Raises BlockingIOError if another worker accepted the connection first.
+    """
+    client, _ = sock.accept()
+    client.setblocking(True)
+    #kernel read / write deadline: a client that stalls in the handshake or mid-message cannot hold the worker
+    seconds = int(timeout)
+    timeval = struct.pack("ll", seconds, int((timeout - seconds) * 1_000_000))
+    client.setsockopt(socket.SOL_SOCKET, socket.SO_RCVTIMEO, timeval)
+    client.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO, timeval)
+    conn = Connection(client.detach())
+    try:
+        deliver_challenge(conn, authkey)
+        answer_challenge(conn, authkey)
+    except BaseException:
+        conn.close()
+        raise
+    return conn
+
+
+def _serve(sock: socket.socket, authkey: bytes, service, num_threads: int, timeout: float = INFERENCE_POOL_IO_TIMEOUT):
+    #runs in each forked worker: accept, answer one request, repeat
+    import torch
+
+    torch.set_num_threads(num_threads)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    #SIGTERM (sent when a new model generation takes over) only sets a flag that is checked between requests,
+    #so there is no window in which a connection has been accepted but the worker can still be killed
+    state = {"stopping": False}
+
+    def on_term(*_):
+        state["stopping"] = True
+
+    signal.signal(signal.SIGTERM, on_term)
+
+    while not state["stopping"]:
+        #waiting happens in select, so the stop flag is rechecked every second
+        if not select.select([sock], [], [], 1.0)[0]:
+            continue
+        try:
+            conn = _accept(sock, authkey, timeout)
+        except BlockingIOError:
+            continue  # another worker accepted it first
+        except Exception as e:
+            logger.warning(f"Inference worker {os.getpid()}: accept failed: {e}")
+            continue
+
+        with conn, metrics.capture() as observations:
+            if not conn.poll(timeout):
+                logger.warning(f"Inference worker {os.getpid()}: no request within {timeout}s; dropping the client")
+                continue
+            #stage timings go back with the reply; this process has no /metrics of its own
+            try:
+                op, payload = conn.recv()
+                reply = ("ok", _handle(service, op, payload), observations)
+            except (EOFError, OSError):
+                reply = None  # client went away or stalled mid-request
+            except Exception as e:
+                reply = ("error", str(e), observations)
+            if reply is not None:
+                try:
+                    conn.send(reply)
+                except OSError:
+                    pass  # client went away
+
+
+def _load_shared(model_path: Optional[str]):
+    from ml.predict import PredictionService
+
+    #load once in the host, then move every parameter/buffer into shared memory
+    #(the API side owns the prediction cache, so workers run without one)
+    service = PredictionService(pool_address=None, batching=False, caching=False)
+    if not service.load_model(model_path):
+        return None
+    if hasattr(service.model, "share_memory"):
+        service.model.share_memory()  # onnxruntime sessions are inherited read-only by fork instead
+    return service
+
+
+def run_pool(
+    num_workers: int = INFERENCE_POOL_WORKERS,
+    address: str = DEFAULT_SOCKET,
+    model_path: Optional[str] = None,
+):
+    import torch.multiprocessing as mp
+
+    from ml.predict import LATEST_CHECKPOINT, checkpoint_signature
+
+    try:
+        authkey = _require_authkey(INFERENCE_POOL_AUTHKEY)
+    except RuntimeError as e:
+        raise SystemExit(str(e))
+
+    service = _load_shared(model_path)
+    if service is None:
+        raise SystemExit("No trained model found — cannot start inference pool")
+
+    threads_per_worker = max(1, (os.cpu_count() or 1) // num_workers)
+
+    sock = _bind(address)
+
+    #fork before any inference has run in the host so workers inherit a clean torch state
+    ctx = mp.get_context("fork")
+
+    def spawn(generation_service):
+        proc = ctx.Process(target=_serve, args=(sock, authkey, generation_service, threads_per_worker), daemon=True)
+        proc.start()
+        return proc
+
+    workers = [spawn(service) for _ in range(num_workers)]
+    #terminated generations finishing their last request; joined once they exit so they don't linger as zombies
+    retired = []
+    logger.info(
+        f"Inference pool: {num_workers} workers x {threads_per_worker} threads "
+        f"serving {service.model_version} on {address}"
+    )
+
+    stopping = False
+
+    def stop(*_):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    watched = Path(model_path) if model_path else LATEST_CHECKPOINT
+    signature = checkpoint_signature(watched)
+    last_check = time.monotonic()
+
+    try:
+        while not stopping:
+            #supervise: replace any worker that dies so capacity stays fixed
+            for i, proc in enumerate(workers):
+                if not proc.is_alive():
+                    proc.join()
+                    logger.warning(f"Inference worker {proc.pid} exited ({proc.exitcode}); restarting")
+                    workers[i] = spawn(service)
+            for proc in [p for p in retired if not p.is_alive()]:
+                proc.join()
+                retired.remove(proc)
+
+            #hot reload: load the new checkpoint, start a new generation, then drain the old one
+            if MODEL_WATCH_INTERVAL > 0 and time.monotonic() - last_check >= MODEL_WATCH_INTERVAL:
+                last_check = time.monotonic()
+                new_signature = checkpoint_signature(watched)
+                if new_signature is not None and new_signature != signature:
+                    signature = new_signature
+                    try:
+                        new_service = _load_shared(str(watched))
+                    except Exception:
+                        logger.exception(f"Inference pool: reload of {watched} failed; keeping {service.model_version}")
+                        new_service = None
+                    if new_service is not None:
+                        old_workers = workers
+                        service = new_service
+                        workers = [spawn(service) for _ in range(num_workers)]
+                        for proc in old_workers:
+                            proc.terminate()
+                        retired.extend(old_workers)
+                        logger.info(f"Inference pool: rolled out {service.model_version}")
+
+            time.sleep(1.0)
+    finally:
+        for proc in workers:
+            proc.terminate()
+        for proc in workers + retired:
+            proc.join(timeout=5)
+        sock.close()
+        if os.path.exists(address):
+            os.unlink(address)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Run the shared-weight inference worker pool")
+    parser.add_argument("--workers", type=int, default=INFERENCE_POOL_WORKERS, help="Number of inference processes")
+    parser.add_argument("--socket", default=INFERENCE_POOL_SOCKET or DEFAULT_SOCKET, help="Unix socket path")
+    parser.add_argument("--model", default=None, help="Checkpoint path (default: ml_models/latest.pth)")
+    args = parser.parse_args()
+
+    run_pool(num_workers=args.workers, address=args.socket, model_path=args.model)
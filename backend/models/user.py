@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, Float
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Boolean, ForeignKey, Text, Float
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from services.database import Base
@@ -48,6 +48,8 @@ class Image(Base):
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String, unique=True, nullable=False)
     image_url = Column(String, nullable=False)
+    sha256 = Column(String(64), nullable=True, index=True)   # content hash, exact-duplicate check on import
+    phash = Column(BigInteger, nullable=True, index=True)    # 64-bit perceptual hash, near-duplicate check
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 
@@ -170,6 +172,8 @@ class Prediction(Base):
     predicted_label = Column(String, nullable=False)     # "needs_review" or "no_review"
     confidence = Column(Float, nullable=False)           # softmax probability
     model_version = Column(String, nullable=True)        # .pth filename
+    image_sha256 = Column(String(64), nullable=True, index=True)  # content hash, keys the prediction cache
+    is_shadow = Column(Boolean, nullable=False, default=False, server_default="false")  # scored by the shadow candidate
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     image = relationship("Image")
@@ -92,6 +92,8 @@ class Settings(BaseSettings):
     AWS_SECRET_ACCESS_KEY: str = ""
     AWS_REGION: str = "us-east-2"
     AWS_S3_BUCKET: str = "captcha-dental-images"
+    AWS_S3_ENDPOINT_URL: str | None = None       # S3-compatible stand-in (MinIO, moto_server) for local testing
+    AWS_S3_MAX_POOL_CONNECTIONS: int = 32        # >= bulk download workers, or boto3 discards connections
 
     # tell pydantic-settings to read .env
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
@@ -21,6 +21,8 @@ def main():
                         help="Save images that get needs_expert_review in the db")
     args = parser.parse_args()
 
+    from ml.cache import image_digest, prediction_cache
+    from ml.config import INFERENCE_CHUNK_SIZE
     from ml.predict import PredictionService
     from services.s3_service import s3_service
 
@@ -51,21 +53,47 @@ def main():
     does_not_need_review = []
     errors = []
 
-    for url in urls:
-        filename = os.path.basename(url)
-
+    def download(url: str):
         with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as tmp:
             tmp_path = tmp.name
-
         try:
             if not s3_service.download_file(url, tmp_path):
+                return None
+            with open(tmp_path, "rb") as f:
+                return f.read()
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    #download a chunk, then score it with one batched forward pass
+    for start in range(0, len(urls), INFERENCE_CHUNK_SIZE):
+        chunk = []
+        for url in urls[start:start + INFERENCE_CHUNK_SIZE]:
+            filename = os.path.basename(url)
+            image_bytes = download(url)
+            if image_bytes is None:
                 errors.append(filename)
+                print(f"{filename:<50} ERROR: download failed")
                 continue
+            chunk.append((url, filename, image_bytes))
 
-            with open(tmp_path, "rb") as f:
-                image_bytes = f.read()
+        if not chunk:
+            continue
+
+        images = [image_bytes for _, _, image_bytes in chunk]
+        digests = [image_digest(image_bytes) for image_bytes in images]
+        if args.store_in_db:
+            #re-runs skip images this model version already scored
+            prediction_cache.warm_from_db(db, digests, service.model_version)
+
+        results = service.predict_batch(images, digests=digests)
+
+        for (url, filename, _), result in zip(chunk, results):
+            if "error" in result:
+                errors.append(filename)
+                print(f"{filename:<50} ERROR: {result['error']}")
+                continue
 
-            result = service.predict(image_bytes)
             label = result["label"]
             confidence = result["confidence"]
 
@@ -88,13 +116,6 @@ def main():
 
             print(f"{filename:<50} {label:<35} {confidence:>10.4f}")
 
-        except Exception as e:
-            errors.append(filename)
-            print(f"{filename:<50} ERROR: {str(e)}")
-        finally:
-            if os.path.exists(tmp_path):
-                os.unlink(tmp_path)
-
     # Summary
     total = len(needs_review) + len(does_not_need_review)
     print("\n" + "=" * 97)
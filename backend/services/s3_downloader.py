@@ -0,0 +1,170 @@
+"""
+Concurrent, retrying bulk downloads from S3.
+
+Objects are fetched by a fixed pool of worker threads sharing one boto3 client
+(clients are thread-safe). Each body is streamed to disk in CHUNK_SIZE pieces
+through a .part file, and only `workers * 2` jobs are in flight at a time, so
+memory stays bounded however many objects are queued. Throttling, 5xx and
+connection errors are retried with exponential backoff and jitter; missing
+or forbidden objects fail immediately.
+
+For tests, point AWS_S3_ENDPOINT_URL at any S3-compatible stand-in
+(MinIO, `moto_server`, LocalStack) and the same code runs unchanged.
+"""
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Optional
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+#S3 error codes worth another attempt; everything else (NoSuchKey, AccessDenied, ...) is final
+RETRYABLE_CODES = {
+    "InternalError",
+    "RequestTimeout",
+    "RequestTimeTooSkewed",
+    "ServiceUnavailable",
+    "SlowDown",
+    "Throttling",
+    "ThrottlingException",
+}
+
+
+def _retryable(error: Exception) -> bool:
+    if isinstance(error, ClientError):
+        code = error.response.get("Error", {}).get("Code", "")
+        status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+        return code in RETRYABLE_CODES or status >= 500
+    #connection resets, read timeouts, truncated bodies
+    return isinstance(error, (BotoCoreError, OSError))
+
+
+class DownloadReport:
+    def __init__(self):
+        self.objects = 0
+        self.bytes = 0
+        self.retries = 0
+        #[{"key", "error", "attempts"}]
+        self.failures = []
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def as_dict(self) -> dict:
+        seconds = self.seconds
+        return {
+            "objects": self.objects,
+            "bytes": self.bytes,
+            "failed": len(self.failures),
+            "retries": self.retries,
+            "seconds": round(seconds, 3),
+            "objects_per_s": round(self.objects / seconds, 1) if seconds else None,
+            "mb_per_s": round(self.bytes / (1024 * 1024) / seconds, 2) if seconds else None,
+            "failures": self.failures,
+        }
+
+
+class S3Downloader:
+    def __init__(
+        self,
+        client,
+        bucket: str,
+        workers: int = 16,
+        max_attempts: int = 5,
+        backoff_base: float = 0.5,
+        backoff_max: float = 20.0,
+    ):
+        self.client = client
+        self.bucket = bucket
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def _fetch(self, key: str, dest: Path) -> int:
+        #stream one object to `dest` via a temp name; returns bytes written
+        tmp = dest.with_name(dest.name + ".part")
+        written = 0
+        try:
+            body = self.client.get_object(Bucket=self.bucket, Key=key)["Body"]
+            with open(tmp, "wb") as f:
+                for chunk in iter(lambda: body.read(CHUNK_SIZE), b""):
+                    f.write(chunk)
+                    written += len(chunk)
+            os.replace(tmp, dest)
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+        return written
+
+    def _download_one(self, key: str, dest: Path, report: DownloadReport) -> bool:
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                size = self._fetch(key, dest)
+            except Exception as e:
+                if attempt < self.max_attempts and _retryable(e):
+                    #exponentially growing delay, ±50% jitter so throttled workers do not retry in lockstep
+                    delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+                    with report._lock:
+                        report.retries += 1
+                    logger.info(f"Retrying {key} in {delay:.1f}s (attempt {attempt}/{self.max_attempts}): {e}")
+                    time.sleep(delay)
+                    continue
+                logger.error(f"Failed to download {key}: {e}")
+                with report._lock:
+                    report.failures.append({"key": key, "error": str(e), "attempts": attempt})
+                return False
+            with report._lock:
+                report.objects += 1
+                report.bytes += size
+            return True
+        return False
+
+    def download(
+        self,
+        jobs: list,
+        on_done: Optional[Callable[[str, Path, bool], None]] = None,
+        progress_every: int = 500,
+    ) -> DownloadReport:
+        """
+        jobs: [(key, destination path)]. `on_done(key, dest, ok)` is called from the
+        calling thread as each object finishes. Never raises for a single object;
+        failures are listed in the report.
+        """
+        report = DownloadReport()
+        started = time.perf_counter()
+        pending = iter(jobs)
+        in_flight = {}
+        finished = 0
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="s3-download") as pool:
+            def fill():
+                #keep at most 2x workers queued, so a million-object sync does not hold a million futures
+                while len(in_flight) < self.workers * 2:
+                    job = next(pending, None)
+                    if job is None:
+                        return
+                    key, dest = job
+                    in_flight[pool.submit(self._download_one, key, Path(dest), report)] = (key, Path(dest))
+
+            fill()
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key, dest = in_flight.pop(future)
+                    if on_done is not None:
+                        on_done(key, dest, future.result())
+                    finished += 1
+                    if progress_every and finished % progress_every == 0:
+                        elapsed = time.perf_counter() - started
+                        print(f"    {finished}/{len(jobs)} objects ({report.bytes / (1024 * 1024) / elapsed:.1f} MB/s)")
+                fill()
+
+        report.seconds = time.perf_counter() - started
+        return report
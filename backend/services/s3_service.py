@@ -3,12 +3,14 @@ AWS S3 service for handling image uploads
 """
 
 import boto3
-from botocore.exceptions import ClientError
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
 import logging
 import uuid
 from pathlib import Path
 from typing import Optional
 from schemas.user import settings
+from services.s3_downloader import S3Downloader
 
 logger = logging.getLogger(__name__)
 
@@ -20,10 +22,21 @@ class S3Service:
             's3',
             aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
             aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            region_name=settings.AWS_REGION
+            region_name=settings.AWS_REGION,
+            endpoint_url=settings.AWS_S3_ENDPOINT_URL,
+            config=Config(max_pool_connections=settings.AWS_S3_MAX_POOL_CONNECTIONS),
         )
         self.bucket_name = settings.AWS_S3_BUCKET
 
+    def downloader(self, workers: int = 16, max_attempts: int = 5) -> S3Downloader:
+        """Concurrent, retrying bulk downloader sharing this client (see services/s3_downloader.py)"""
+        return S3Downloader(
+            self.s3_client,
+            self.bucket_name,
+            workers=min(workers, settings.AWS_S3_MAX_POOL_CONNECTIONS),
+            max_attempts=max_attempts,
+        )
+
     def upload_file(
         self,
         file_data: bytes,
@@ -100,21 +113,39 @@ class S3Service:
         List all object URLs in the bucket under the given prefix.
 
         Returns:
-            List of full S3 URLs
+            List of full S3 URLs (empty if the listing failed)
         """
-        urls = []
         try:
-            paginator = self.s3_client.get_paginator("list_objects_v2")
-            for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix):
-                for obj in page.get("Contents", []):
-                    key = obj["Key"]
-                    if key.endswith("/"):
-                        continue  # skip folder entries
-                    url = f"https://{self.bucket_name}.s3.{settings.AWS_REGION}.amazonaws.com/{key}"
-                    urls.append(url)
-        except ClientError as e:
+            return [entry["url"] for entry in self.list_object_entries(prefix)]
+        except (ClientError, BotoCoreError) as e:
             logger.error(f"Failed to list objects with prefix '{prefix}': {str(e)}")
-        return urls
+            return []
+
+    def list_object_entries(self, prefix: str) -> list:
+        """
+        List all objects in the bucket under the given prefix, with their listing metadata.
+
+        Returns:
+            List of {"url", "key", "size", "etag"} dicts (etag without quotes)
+
+        Raises:
+            ClientError / BotoCoreError if the listing fails, so callers can tell a
+            failed listing from an empty prefix
+        """
+        entries = []
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                key = obj["Key"]
+                if key.endswith("/"):
+                    continue  # skip folder entries
+                entries.append({
+                    "url": f"https://{self.bucket_name}.s3.{settings.AWS_REGION}.amazonaws.com/{key}",
+                    "key": key,
+                    "size": obj.get("Size"),
+                    "etag": obj.get("ETag", "").strip('"'),
+                })
+        return entries
 
     def download_file(self, file_url: str, local_path: str) -> bool:
         """
@@ -0,0 +1,63 @@
+import io
+import os
+
+#services.database refuses to import without a URL; tests that need a database bring their own
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import pytest
+import torch
+from PIL import Image as PILImage
+from torch import nn
+
+
+class TinyNet(nn.Module):
+    #EfficientNet's features / avgpool / classifier layout (so embeddings work), small enough for tests
+    def __init__(self, seed: int = 0, in_channels: int = 3):
+        super().__init__()
+        torch.manual_seed(seed)
+        self.features = nn.Sequential(nn.Conv2d(in_channels, 8, 5, stride=4), nn.ReLU())
+        self.avgpool = nn.AdaptiveAvgPool2d(1)
+        self.classifier = nn.Linear(8, 2)
+
+    def forward(self, x):
+        return self.classifier(torch.flatten(self.avgpool(self.features(x)), 1))
+
+
+@pytest.fixture
+def make_loaded():
+    #LoadedModel around a TinyNet, as PredictionService._build would return it
+    from ml.predict import LoadedModel
+
+    def make(version: str = "v1", seed: int = 0, in_channels: int = 3):
+        metadata = {
+            "arch": "tiny",
+            "class_to_idx": {"needs_review": 0, "no_review": 1},
+            "model_version": version,
+            "in_channels": in_channels,
+        }
+        return LoadedModel(TinyNet(seed, in_channels).eval(), metadata, None, "eager", torch.device("cpu"))
+
+    return make
+
+
+@pytest.fixture
+def make_service(make_loaded):
+    #in-process PredictionService (no pool, no batcher, no cache) serving a TinyNet
+    from ml.predict import PredictionService
+
+    def make(version: str = "v1"):
+        service = PredictionService(pool_address=None, batching=False, caching=False)
+        service.device = torch.device("cpu")
+        service.current = make_loaded(version)
+        service.current.warmup_seconds = 0.0
+        return service
+
+    return make
+
+
+def jpeg_bytes(color: tuple, size: tuple = (64, 48)) -> bytes:
+    buffer = io.BytesIO()
+    image = PILImage.new("RGB", size, color)
+    image.paste((255 - color[0], color[1], 255 - color[2]), (0, 0, size[0] // 2, size[1] // 3))
+    image.save(buffer, format="JPEG")
+    return buffer.getvalue()
@@ -0,0 +1,101 @@
+import threading
+import time
+
+import pytest
+
+from ml.batching import MicroBatcher
+
+
+class Recorder:
+    #run_batch that records every batch; the first one blocks until `release` is set
+    def __init__(self, gate_first: bool = False):
+        self.batches = []
+        self.release = threading.Event()
+        self.started = threading.Event()
+        if not gate_first:
+            self.release.set()
+
+    def __call__(self, items: list) -> list:
+        self.batches.append(list(items))
+        self.started.set()
+        self.release.wait(5)
+        if "bad" in items:
+            raise ValueError("bad input")
+        return [f"result-{item}" for item in items]
+
+
+def test_batch_closes_at_max_size_without_waiting_for_the_deadline():
+    recorder = Recorder()
+    batcher = MicroBatcher(recorder, max_batch_size=3, max_wait_ms=10_000)
+
+    started = time.perf_counter()
+    futures = [batcher.submit(i) for i in range(6)]
+    results = [future.result(timeout=5) for future in futures]
+
+    assert time.perf_counter() - started < 5
+    assert results == [f"result-{i}" for i in range(6)]
+    assert recorder.batches == [[0, 1, 2], [3, 4, 5]]
+
+
+def test_lone_item_is_flushed_at_the_deadline():
+    recorder = Recorder()
+    batcher = MicroBatcher(recorder, max_batch_size=8, max_wait_ms=100)
+
+    started = time.perf_counter()
+    assert batcher.submit("a").result(timeout=5) == "result-a"
+
+    assert 0.09 <= time.perf_counter() - started < 2
+    assert recorder.batches == [["a"]]
+
+
+def test_deadline_counts_from_the_first_items_submit_time():
+    recorder = Recorder(gate_first=True)
+    batcher = MicroBatcher(recorder, max_batch_size=8, max_wait_ms=100)
+    batcher.submit("blocker")
+    recorder.started.wait(5)
+    queued = [batcher.submit(name) for name in ("a", "b", "c")]
+    #the queued items' window runs out while the first batch is still busy
+    time.sleep(0.3)
+
+    released = time.perf_counter()
+    recorder.release.set()
+    for future in queued:
+        future.result(timeout=5)
+
+    #flushed straight away, and as one batch rather than one item at a time
+    assert time.perf_counter() - released < 0.09
+    assert recorder.batches[1:] == [["a", "b", "c"]]
+
+
+def test_a_failed_batch_fails_only_its_own_callers():
+    recorder = Recorder()
+    batcher = MicroBatcher(recorder, max_batch_size=2, max_wait_ms=10_000)
+    failing = [batcher.submit("x"), batcher.submit("bad")]
+    passing = [batcher.submit("y"), batcher.submit("z")]
+
+    for future in failing:
+        with pytest.raises(ValueError, match="bad input"):
+            future.result(timeout=5)
+    assert [future.result(timeout=5) for future in passing] == ["result-y", "result-z"]
+
+
+def test_stats_report_batch_sizes_and_queue_wait():
+    recorder = Recorder(gate_first=True)
+    batcher = MicroBatcher(recorder, max_batch_size=2, max_wait_ms=50)
+    batcher.submit("blocker")
+    recorder.started.wait(5)
+    futures = [batcher.submit(i) for i in range(3)]
+    time.sleep(0.2)
+    recorder.release.set()
+    for future in futures:
+        future.result(timeout=5)
+
+    stats = batcher.stats()
+    assert recorder.batches == [["blocker"], [0, 1], [2]]
+    assert stats["batches"] == 3
+    assert stats["items"] == 4
+    assert stats["batch_size_distribution"] == {1: 2, 2: 1}
+    assert stats["mean_batch_size"] == round(4 / 3, 2)
+    assert stats["queue_wait_max_ms"] >= 200
+    assert 0 < stats["queue_wait_mean_ms"] <= stats["queue_wait_max_ms"]
+    assert stats["queue_depth"] == 0
@@ -0,0 +1,37 @@
+from ml.cache import PredictionCache
+
+
+def test_entries_without_an_embedding_miss_when_one_is_needed():
+    cache = PredictionCache(max_entries=4)
+    cache.put("d1", "v1", {"label": "no_review", "confidence": 0.8})
+
+    assert cache.get("d1", "v1")["label"] == "no_review"
+    assert cache.get("d1", "v1", need_embedding=True) is None
+
+    cache.put("d1", "v1", {"label": "no_review", "confidence": 0.8, "embedding": [0.1, 0.2]})
+    assert cache.get("d1", "v1", need_embedding=True)["embedding"] == [0.1, 0.2]
+
+
+def test_a_db_promoted_entry_keeps_the_cached_embedding():
+    cache = PredictionCache(max_entries=4)
+    cache.put("d1", "v1", {"label": "needs_review", "confidence": 0.7, "embedding": [1.0]})
+    cache.put("d1", "v1", {"label": "needs_review", "confidence": 0.7})
+
+    assert cache.get("d1", "v1", need_embedding=True)["embedding"] == [1.0]
+
+
+def test_lru_eviction_errors_and_version_switch():
+    cache = PredictionCache(max_entries=2)
+    cache.put("d1", "v1", {"label": "a", "confidence": 0.5})
+    cache.put("d2", "v1", {"label": "b", "confidence": 0.5})
+    cache.get("d1", "v1")
+    cache.put("d3", "v1", {"label": "c", "confidence": 0.5})
+    cache.put("d4", "v1", {"error": "decode failed"})
+
+    assert cache.get("d2", "v1") is None
+    assert cache.get("d1", "v1") is not None
+    assert cache.get("d4", "v1") is None
+
+    cache.invalidate("v1")
+    cache.invalidate("v2")
+    assert cache.get("d1", "v1") is None
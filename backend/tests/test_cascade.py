@@ -0,0 +1,50 @@
+import numpy as np
+
+from ml.cascade import calibrate_threshold
+
+
+def _probs(confidences, labels):
+    #two-class softmax rows whose argmax is `labels` with the given confidence
+    probs = np.empty((len(labels), 2))
+    for i, (confidence, label) in enumerate(zip(confidences, labels)):
+        probs[i, label] = confidence
+        probs[i, 1 - label] = 1 - confidence
+    return probs
+
+
+def test_gates_confident_correct_images_and_escalates_the_rest():
+    labels = np.array([0, 1, 0, 1])
+    #the gate is right on its two confident rows and wrong on the two unsure ones
+    gate = _probs([0.99, 0.95, 0.6, 0.55], [0, 1, 1, 0])
+    full = labels.copy()
+
+    report = calibrate_threshold(gate, full, labels, max_drop=0.0)
+
+    assert report["threshold"] == 0.95
+    assert report["escalation_rate"] == 0.5
+    assert report["cascade_acc"] == report["baseline_acc"] == 100.0
+    assert report["gate_acc"] == 50.0
+
+
+def test_escalates_everything_when_the_gate_is_never_good_enough():
+    labels = np.array([0, 1, 0, 1])
+    gate = _probs([0.99, 0.98, 0.97, 0.96], [1, 0, 1, 0])
+
+    report = calibrate_threshold(gate, labels, labels, max_drop=0.0)
+
+    assert report["threshold"] > 1.0
+    assert report["escalation_rate"] == 1.0
+    assert report["cascade_acc"] == 100.0
+
+
+def test_tied_confidences_are_gated_together():
+    labels = np.array([0, 0, 1])
+    #same confidence, one right and one wrong: gating only the right one is not a reachable threshold
+    gate = _probs([0.9, 0.9, 0.6], [0, 1, 1])
+
+    report = calibrate_threshold(gate, labels, labels, max_drop=0.0)
+
+    assert report["escalation_rate"] == 1.0
+    loose = calibrate_threshold(gate, labels, labels, max_drop=0.34)
+    assert loose["threshold"] == 0.6
+    assert loose["escalation_rate"] == 0.0
@@ -0,0 +1,51 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image as PILImage
+
+from ml.decode import ImageTooLarge, open_image
+
+
+def _png(mode: str, size=(600, 480)) -> io.BytesIO:
+    gradient = np.tile(np.linspace(0, 1, size[0]), (size[1], 1))
+    if mode == "1":
+        image = PILImage.fromarray(gradient > 0.5)
+    elif mode == "I;16":
+        image = PILImage.fromarray((gradient * 65535).astype(np.uint16))
+        assert image.mode == "I;16"
+    elif mode == "P":
+        image = PILImage.fromarray((gradient * 255).astype(np.uint8)).convert("RGB").convert("P")
+    else:
+        image = PILImage.fromarray((gradient * 255).astype(np.uint8)).convert(mode)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    buffer.seek(0)
+    return buffer
+
+
+@pytest.mark.parametrize("source_mode", ["P", "I;16", "1", "L", "RGB"])
+@pytest.mark.parametrize("mode", ["RGB", "L"])
+def test_fast_decode_reduces_pngs_of_any_mode(source_mode, mode):
+    fast = open_image(_png(source_mode), fast=True, mode=mode, draft_size=100)
+    full = open_image(_png(source_mode), fast=False, mode=mode, draft_size=100)
+
+    assert fast.mode == full.mode == mode
+    assert full.size == (600, 480)
+    assert fast.size == (150, 120)
+
+
+def test_fast_jpeg_decode_stays_at_least_draft_size():
+    buffer = io.BytesIO()
+    PILImage.new("RGB", (1600, 1200), (90, 120, 150)).save(buffer, format="JPEG")
+    buffer.seek(0)
+
+    image = open_image(buffer, fast=True, mode="L", draft_size=300)
+
+    assert image.mode == "L"
+    assert min(image.size) >= 300 and image.size[0] < 1600
+
+
+def test_pixel_cap_is_checked_before_decoding():
+    with pytest.raises(ImageTooLarge):
+        open_image(_png("L"), max_pixels=1000)
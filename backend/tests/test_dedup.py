@@ -0,0 +1,61 @@
+import io
+
+import numpy as np
+from PIL import Image as PILImage, ImageDraw
+
+from ml.dedup import hamming, image_hashes, perceptual_hash
+
+
+def _image(size=(256, 192), shapes=((40, 30, 140, 120),), fmt="JPEG", quality=90) -> bytes:
+    image = PILImage.new("L", size, 30)
+    draw = ImageDraw.Draw(image)
+    for box in shapes:
+        draw.ellipse(box, fill=220)
+    draw.rectangle((size[0] // 2, size[1] // 2, size[0] - 10, size[1] - 10), fill=120)
+    buffer = io.BytesIO()
+    image.convert("RGB").save(buffer, format=fmt, **({"quality": quality} if fmt == "JPEG" else {}))
+    return buffer.getvalue()
+
+
+def test_hash_is_a_signed_64_bit_int_and_deterministic():
+    data = _image()
+    value = perceptual_hash(data)
+    assert -(1 << 63) <= value < (1 << 63)
+    assert perceptual_hash(data) == value
+
+
+def test_reencoded_and_resized_copies_stay_close():
+    original = perceptual_hash(_image())
+    reencoded = perceptual_hash(_image(quality=40))
+    resized = perceptual_hash(_image(size=(512, 384), shapes=((80, 60, 280, 240),)))
+    different = perceptual_hash(_image(shapes=((150, 100, 250, 180), (10, 10, 60, 60))))
+
+    distances = hamming(np.array([reencoded, resized, different], dtype=np.int64), original)
+    assert distances[0] <= 6
+    assert distances[1] <= 6
+    assert distances[2] > distances[0]
+
+
+def test_hamming_counts_bits_including_the_sign_bit():
+    hashes = np.array([0, 1, 0b1011, -1, -(1 << 63)], dtype=np.int64)
+    assert hamming(hashes, 0).tolist() == [0, 1, 3, 64, 1]
+    assert hamming(hashes, -1).tolist() == [64, 63, 61, 0, 63]
+
+
+
+def test_palette_16_bit_and_1_bit_pngs_are_hashed():
+    gray = PILImage.open(io.BytesIO(_image(size=(512, 384), fmt="PNG"))).convert("L")
+    variants = {
+        "P": gray.convert("RGB").convert("P"),
+        "I;16": PILImage.fromarray(np.asarray(gray, dtype=np.uint16) * 257),
+        "1": gray.convert("1"),
+    }
+    hashes = {}
+    for mode, image in variants.items():
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        hashes[mode] = image_hashes(buffer.getvalue())[1]
+        assert hashes[mode] is not None, mode
+
+    reference = perceptual_hash(_image(size=(512, 384), fmt="PNG"))
+    assert hamming(np.array([hashes["P"]], dtype=np.int64), reference)[0] <= 6
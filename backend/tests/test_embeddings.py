@@ -0,0 +1,165 @@
+import threading
+
+import numpy as np
+
+from ml.embeddings import EmbeddingIndex, EmbeddingStore, SimilarityIndex, normalize
+
+
+def _vectors(count, dim=16, seed=0):
+    return normalize(np.random.default_rng(seed).normal(size=(count, dim))).astype(np.float16)
+
+
+def test_flat_search_ranks_by_cosine_and_honours_exclude():
+    ids = np.arange(10, 20, dtype=np.int64)
+    vectors = _vectors(10)
+    index = SimilarityIndex(ivf_min_size=1000)
+    index.build(ids, vectors)
+
+    [hits] = index.search(vectors[3:4].astype(np.float32), k=3)
+    assert hits[0][0] == 13
+    assert hits[0][1] > 0.99
+    assert [score for _, score in hits] == sorted((score for _, score in hits), reverse=True)
+
+    [hits] = index.search(vectors[3:4].astype(np.float32), k=3, exclude=[13])
+    assert 13 not in [image_id for image_id, _ in hits]
+    assert len(hits) == 3
+
+
+def test_later_rows_win_for_repeated_ids():
+    vectors = _vectors(3)
+    index = SimilarityIndex(ivf_min_size=1000)
+    index.build(np.array([1, 2, 1], dtype=np.int64), vectors)
+
+    assert len(index) == 2
+    np.testing.assert_allclose(index.vector(1), vectors[2].astype(np.float32))
+
+
+def test_ivf_finds_every_row_with_all_lists_probed():
+    vectors = _vectors(400, seed=1)
+    ids = np.arange(400, dtype=np.int64)
+    index = SimilarityIndex(ivf_min_size=100, probes=1000)
+    index.build(ids, vectors)
+    assert index.centroids is not None
+
+    results = index.search(vectors[:50].astype(np.float32), k=1)
+    assert [hits[0][0] for hits in results] == list(range(50))
+
+
+def test_ivf_with_few_probes_still_finds_the_query_row():
+    #a row always lands in the list of its closest centroid, which is the first one probed
+    vectors = _vectors(400, seed=2)
+    index = SimilarityIndex(ivf_min_size=100, probes=1)
+    index.build(np.arange(400, dtype=np.int64), vectors)
+
+    results = index.search(vectors[:50].astype(np.float32), k=1)
+    assert [hits[0][0] for hits in results] == list(range(50))
+
+
+def test_added_rows_are_searchable_and_switch_on_ivf():
+    vectors = _vectors(120, seed=3)
+    index = SimilarityIndex(ivf_min_size=100, probes=4)
+    index.add(np.arange(50, dtype=np.int64), vectors[:50])
+    assert index.centroids is None
+
+    index.add(np.arange(50, 60, dtype=np.int64), vectors[50:60])
+    [hits] = index.search(vectors[55:56].astype(np.float32), k=1)
+    assert hits[0][0] == 55
+
+    index.add(np.arange(60, 120, dtype=np.int64), vectors[60:])
+    assert index.centroids is not None
+    assert len(index) == 120
+    #re-adding a known id is ignored
+    index.add(np.array([0], dtype=np.int64), vectors[1:2])
+    np.testing.assert_allclose(index.vector(0), vectors[0].astype(np.float32))
+
+
+def test_empty_index_returns_no_hits():
+    index = SimilarityIndex()
+    assert index.search(_vectors(2), k=5) == [[], []]
+
+
+def test_store_appends_from_two_writers_and_loads_incrementally(tmp_path):
+    first = EmbeddingStore(tmp_path, "v1")
+    second = EmbeddingStore(tmp_path, "v1")
+    vectors = _vectors(6)
+
+    first.append(np.array([1, 2], dtype=np.int64), vectors[:2])
+    second.append(np.array([3, 4, 5], dtype=np.int64), vectors[2:5])
+    assert first.rows_on_disk() == 5
+
+    ids, loaded = first.load()
+    assert ids.tolist() == [1, 2, 3, 4, 5]
+    np.testing.assert_array_equal(loaded, vectors[:5])
+
+    first.append(np.array([6], dtype=np.int64), vectors[5:])
+    ids, loaded = second.load(start=5)
+    assert ids.tolist() == [6]
+    np.testing.assert_array_equal(loaded, vectors[5:])
+    assert second.load(start=6)[1] is None
+
+
+def test_store_leaves_out_a_torn_final_row(tmp_path):
+    store = EmbeddingStore(tmp_path, "v1")
+    vectors = _vectors(2)
+    store.append(np.array([1, 2], dtype=np.int64), vectors)
+    #an append in progress: the next vector row is half written, its id not yet
+    with open(store.vectors_path, "ab") as f:
+        f.write(b"\0" * 10)
+
+    ids, loaded = store.load()
+    assert ids.tolist() == [1, 2]
+    assert loaded.shape == (2, 16)
+
+
+def test_concurrent_adds_for_two_versions_stay_in_their_own_store(tmp_path):
+    index = EmbeddingIndex(tmp_path)
+    dim = 16
+    #every v1 vector points along axis 0, every v2 vector along axis 1
+    axis = {"v1": 0, "v2": 1}
+    errors = []
+
+    def writer(version, first_id):
+        try:
+            for image_id in range(first_id, first_id + 100):
+                vector = np.zeros(dim, dtype=np.float32)
+                vector[axis[version]] = 1
+                index.add(version, [image_id], [vector])
+                index.has("v2" if version == "v1" else "v1", image_id)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [
+        threading.Thread(target=writer, args=(version, first_id))
+        for version, first_id in (("v1", 0), ("v2", 1000), ("v1", 2000), ("v2", 3000))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+    for version, first_ids in (("v1", (0, 2000)), ("v2", (1000, 3000))):
+        ids, vectors = EmbeddingStore(tmp_path, version).load()
+        expected = [i for first in first_ids for i in range(first, first + 100)]
+        assert sorted(ids.tolist()) == expected
+        assert np.all(np.argmax(vectors, axis=1) == axis[version])
+        _, loaded = index.use(version)
+        assert len(loaded) == 200
+
+
+def test_alternating_versions_reuse_their_loaded_index(tmp_path):
+    index = EmbeddingIndex(tmp_path, max_versions=2)
+    vectors = _vectors(3)
+    index.add("v1", [1], [vectors[0]])
+    index.add("v2", [2], [vectors[1]])
+
+    _, v1 = index.use("v1")
+    _, v2 = index.use("v2")
+    assert index.use("v1")[1] is v1 and index.use("v2")[1] is v2
+    assert index.stats()["model_version"] == "v2"
+
+    #a third version evicts the least recently used one, which is reloaded from disk on next use
+    index.add("v3", [3], [vectors[2]])
+    _, reloaded = index.use("v1")
+    assert reloaded is not v1
+    assert index.has("v1", 1) and not index.has("v1", 2)
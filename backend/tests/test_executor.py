@@ -0,0 +1,83 @@
+import asyncio
+import io
+import threading
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from PIL import Image as PILImage
+
+from api.routes import ml as ml_routes
+from api.routes.auth import get_current_user
+from ml.executor import InferenceExecutor, InferenceQueueFull
+
+
+@pytest.fixture
+def release():
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+def _fill(executor: InferenceExecutor, release: threading.Event) -> list:
+    return [executor.submit(release.wait, 5) for _ in range(executor.max_pending)]
+
+
+def test_submit_sheds_load_once_every_slot_is_taken(release):
+    executor = InferenceExecutor(max_workers=1, max_pending=3)
+    futures = _fill(executor, release)
+
+    with pytest.raises(InferenceQueueFull):
+        executor.submit(lambda: "late")
+    stats = executor.stats()
+    assert (stats["pending"], stats["running"], stats["queued"], stats["rejected"]) == (3, 1, 2, 1)
+
+    release.set()
+    for future in futures:
+        future.result(timeout=5)
+    assert executor.submit(lambda: "fresh").result(timeout=5) == "fresh"
+    assert executor.stats()["completed"] == 4
+
+
+def test_failed_jobs_free_their_slot():
+    executor = InferenceExecutor(max_workers=1, max_pending=1)
+
+    def fail():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(executor.run(fail))
+    assert asyncio.run(executor.run(lambda x: x * 2, 21)) == 42
+
+
+def test_upload_route_returns_503_with_retry_after_when_the_queue_is_full(monkeypatch, release):
+    from ml.predict import PredictionService
+
+    class FakeService:
+        def ensure_loaded(self) -> bool:
+            return True
+
+        def predict(self, image_bytes: bytes, shadow: bool = True) -> dict:
+            return {"label": "no_review", "confidence": 0.9}
+
+    executor = InferenceExecutor(max_workers=1, max_pending=1)
+    monkeypatch.setattr(ml_routes, "inference_executor", executor)
+    monkeypatch.setattr(PredictionService, "get_instance", classmethod(lambda cls: FakeService()))
+    app = FastAPI()
+    app.include_router(ml_routes.router)
+    app.dependency_overrides[get_current_user] = lambda: object()
+    client = TestClient(app)
+    buffer = io.BytesIO()
+    PILImage.new("RGB", (16, 16)).save(buffer, format="JPEG")
+    files = {"file": ("scan.jpg", buffer.getvalue(), "image/jpeg")}
+
+    futures = _fill(executor, release)
+    response = client.post("/ml/predict/upload", files=files)
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+    release.set()
+    futures[0].result(timeout=5)
+    response = client.post("/ml/predict/upload", files=files)
+    assert response.status_code == 200
+    assert response.json()["label"] == "no_review"
@@ -0,0 +1,32 @@
+import torch
+from torch.utils.data import TensorDataset
+
+from ml.loader import FoldSampler, make_loader
+
+
+def test_fold_sampler_yields_its_indices_in_order():
+    sampler = FoldSampler([4, 1, 3])
+    assert list(sampler) == [4, 1, 3]
+    assert len(sampler) == 3
+
+
+def test_shuffled_fold_sampler_is_a_permutation_driven_by_the_torch_seed():
+    sampler = FoldSampler(range(20), shuffle=True)
+    torch.manual_seed(0)
+    first = list(sampler)
+    torch.manual_seed(0)
+    assert list(sampler) == first
+    assert sorted(first) == list(range(20))
+    assert first != list(range(20))
+
+
+def test_swapped_indices_take_effect_on_the_next_epoch():
+    dataset = TensorDataset(torch.arange(10))
+    loader = make_loader(dataset, batch_size=4, shuffle=False, device_type="cpu", workers=0)
+
+    loader.sampler.set_indices([0, 1, 2])
+    assert [batch[0].tolist() for batch in loader] == [[0, 1, 2]]
+
+    loader.sampler.set_indices([7, 8, 9, 5, 6])
+    assert [batch[0].tolist() for batch in loader] == [[7, 8, 9, 5], [6]]
+    assert len(loader) == 2
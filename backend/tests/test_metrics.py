@@ -0,0 +1,58 @@
+from ml.metrics import Histogram, Metrics
+
+
+def test_histogram_renders_cumulative_buckets_per_label_set():
+    histogram = Histogram("stage_seconds", "Time per stage", (0.5, 0.1, 1), ("stage",))
+    histogram.observe(0.05, "decode")
+    histogram.observe(0.1, "decode")
+    histogram.observe(0.7, "decode")
+    histogram.observe(3, "forward")
+
+    assert histogram.render() == [
+        "# HELP stage_seconds Time per stage",
+        "# TYPE stage_seconds histogram",
+        'stage_seconds_bucket{stage="decode",le="0.1"} 2',
+        'stage_seconds_bucket{stage="decode",le="0.5"} 2',
+        'stage_seconds_bucket{stage="decode",le="1"} 3',
+        'stage_seconds_bucket{stage="decode",le="+Inf"} 3',
+        'stage_seconds_sum{stage="decode"} 0.85',
+        'stage_seconds_count{stage="decode"} 3',
+        'stage_seconds_bucket{stage="forward",le="0.1"} 0',
+        'stage_seconds_bucket{stage="forward",le="0.5"} 0',
+        'stage_seconds_bucket{stage="forward",le="1"} 0',
+        'stage_seconds_bucket{stage="forward",le="+Inf"} 1',
+        'stage_seconds_sum{stage="forward"} 3',
+        'stage_seconds_count{stage="forward"} 1',
+    ]
+
+
+def test_histogram_escapes_label_values():
+    histogram = Histogram("requests", "Requests", (1,), ("route",))
+    histogram.observe(0.5, 'a"b\\c')
+    assert 'requests_bucket{route="a\\"b\\\\c",le="1"} 1' in histogram.render()
+
+
+def test_unlabelled_histogram_with_no_observations_renders_only_headers():
+    assert Histogram("batch", "Rows", (1, 2)).render() == ["# HELP batch Rows", "# TYPE batch histogram"]
+
+
+def test_captured_observations_replay_into_another_instance():
+    worker, api = Metrics(enabled=True), Metrics(enabled=True)
+    with worker.capture() as observations:
+        worker.observe_stage("forward", 0.02)
+        worker.observe_batch_size(8)
+    worker.observe_stage("forward", 0.03)
+
+    assert observations == [("stage", "forward", 0.02), ("batch_size", 8)]
+    api.replay(observations)
+    rendered = api.render()
+    assert 'inference_stage_seconds_count{stage="forward"} 1' in rendered
+    assert "inference_batch_size_count 1" in rendered
+
+
+def test_disabled_metrics_record_nothing():
+    metrics = Metrics(enabled=False)
+    with metrics.capture() as observations, metrics.stage("decode"):
+        metrics.observe_batch_size(4)
+    assert observations == []
+    assert "_count" not in metrics.render()
@@ -0,0 +1,82 @@
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from ml.persistence import PredictionWriter, latest_predictions
+from models.user import Image, Prediction
+from services.database import Base
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+def _result(label="needs_review", confidence=0.9, **extra):
+    return {"label": label, "confidence": confidence, "model_version": "v1.pth", **extra}
+
+
+def test_flush_writes_images_and_predictions_in_order(db):
+    existing = Image(filename="old.jpg", image_url="s3://old.jpg")
+    db.add(existing)
+    db.commit()
+
+    writer = PredictionWriter(db, "efficientnet")
+    first = writer.add_image("a.jpg", "s3://a.jpg", _result(confidence=0.8), sha256="aa")
+    writer.add_prediction(existing.id, _result("no_review", 0.6))
+    second = writer.add_image("b.jpg", "s3://b.jpg", _result(shadow=_result("no_review", 0.7)))
+    writer.add_image("c.jpg", "s3://c.jpg")
+
+    image_ids, prediction_ids = writer.flush()
+
+    assert len(image_ids) == 3 and len(prediction_ids) == 3
+    names = {image.id: image.filename for image in db.scalars(select(Image))}
+    assert [names[image_ids[first]], names[image_ids[second]]] == ["a.jpg", "b.jpg"]
+    predictions = [db.get(Prediction, i) for i in prediction_ids]
+    assert [p.image_id for p in predictions] == [image_ids[first], existing.id, image_ids[second]]
+    assert predictions[0].image_sha256 == "aa"
+    assert not any(p.is_shadow for p in predictions)
+    shadows = db.scalars(select(Prediction).where(Prediction.is_shadow.is_(True))).all()
+    assert [(s.image_id, s.confidence) for s in shadows] == [(image_ids[second], 0.7)]
+    assert latest_predictions(db, [image_ids[second]])[image_ids[second]].confidence == 0.9
+    assert writer.flush() == ([], [])
+
+
+def test_flush_or_split_saves_the_images_a_conflict_did_not_touch(db):
+    db.add(Image(filename="taken.jpg", image_url="s3://taken.jpg"))
+    db.commit()
+    existing_id = db.scalar(select(Image.id))
+
+    writer = PredictionWriter(db, "efficientnet")
+    writer.add_image("a.jpg", "s3://a.jpg", _result())
+    writer.add_image("taken.jpg", "s3://taken-again.jpg", _result())
+    writer.add_image("b.jpg", "s3://b.jpg", _result())
+    writer.add_prediction(existing_id, _result("no_review"))
+
+    image_ids, errors = writer.flush_or_split()
+
+    assert image_ids[1] is None and None not in (image_ids[0], image_ids[2])
+    assert list(errors) == [1]
+    assert "UNIQUE" in errors[1]
+    saved = {p.image_id for p in db.scalars(select(Prediction))}
+    assert saved == {image_ids[0], image_ids[2], existing_id}
+    assert db.scalar(select(Image.image_url).where(Image.filename == "taken.jpg")) == "s3://taken.jpg"
+
+
+def test_flush_rolls_back_the_whole_batch_on_error(db):
+    db.add(Image(filename="taken.jpg", image_url="s3://taken.jpg"))
+    db.commit()
+
+    writer = PredictionWriter(db, "efficientnet")
+    writer.add_image("a.jpg", "s3://a.jpg", _result())
+    writer.add_image("taken.jpg", "s3://x.jpg", _result())
+    with pytest.raises(Exception):
+        writer.flush()
+
+    assert db.scalars(select(Image.filename)).all() == ["taken.jpg"]
+    assert db.scalars(select(Prediction)).all() == []
@@ -0,0 +1,92 @@
+import pytest
+
+from conftest import jpeg_bytes
+from ml.config import INFERENCE_CHUNK_SIZE
+
+
+def _images(count: int) -> list:
+    return [jpeg_bytes((i * 37 % 256, i * 91 % 256, i * 53 % 256)) for i in range(count)]
+
+
+def _count_forwards(loaded) -> list:
+    sizes = []
+    forward = loaded.forward
+
+    def counted(batch):
+        sizes.append(batch.shape[0])
+        return forward(batch)
+
+    loaded.forward = counted
+    return sizes
+
+
+def test_an_undecodable_image_fails_alone(make_service):
+    service = make_service()
+    images = _images(3)
+    images.insert(1, b"not an image")
+
+    results = service.predict_batch(images, chunk_size=8)
+
+    assert len(results) == 4
+    assert results[1]["error"].startswith("Could not decode image")
+    for result in results[:1] + results[2:]:
+        assert result["label"] in ("needs_review", "no_review")
+        assert result["model_version"] == "v1"
+
+
+def test_a_chunk_of_only_bad_images_is_skipped(make_service):
+    service = make_service()
+    sizes = _count_forwards(service.current)
+
+    results = service.predict_batch([b"bad", b"worse"] + _images(1), chunk_size=2)
+
+    assert ["error" in result for result in results] == [True, True, False]
+    assert sizes == [1]
+
+
+def test_inputs_beyond_the_chunk_size_are_split_into_several_passes(make_service):
+    service = make_service()
+    sizes = _count_forwards(service.current)
+
+    results = service.predict_batch(_images(INFERENCE_CHUNK_SIZE + 3))
+
+    assert sizes == [INFERENCE_CHUNK_SIZE, 3]
+    assert all("label" in result for result in results)
+
+
+def test_batch_results_match_single_predictions(make_service):
+    service = make_service()
+    images = _images(5)
+
+    batched = service.predict_batch(images, chunk_size=2)
+    single = [service.predict(image) for image in images]
+
+    for b, s in zip(batched, single):
+        assert b["label"] == s["label"]
+        assert b["confidence"] == pytest.approx(s["confidence"], abs=1e-3)
+        assert b["model_version"] == s["model_version"]
+        assert "embedding" not in b and "embedding" not in s
+
+
+def test_embeddings_only_for_callers_that_ask(make_service):
+    service = make_service()
+    [with_embedding] = service.predict_batch(_images(1), embed=True)
+    [without] = service.predict_batch(_images(1))
+
+    assert with_embedding["embedding"].shape == (8,)
+    assert "embedding" not in without
+
+
+def test_cached_images_are_not_scored_again(make_service):
+    from ml.cache import PredictionCache
+
+    service = make_service()
+    service.cache = PredictionCache(max_entries=16)
+    sizes = _count_forwards(service.current)
+    images = _images(3)
+
+    first = service.predict_batch(images[:2])
+    second = service.predict_batch(images)
+
+    assert sizes == [2, 1]
+    assert second[:2] == first
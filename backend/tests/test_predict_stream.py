@@ -0,0 +1,117 @@
+import io
+import json
+import zipfile
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from PIL import Image as PILImage
+
+from api.routes import ml as ml_routes
+from api.routes.auth import get_current_user
+
+
+class FakeService:
+    def __init__(self):
+        self.batches = []
+
+    def ensure_loaded(self) -> bool:
+        return True
+
+    def predict_batch(self, images: list, chunk_size: int, shadow: bool = True) -> list:
+        self.batches.append(len(images))
+        return [{"label": "healthy", "confidence": 0.9, "size": len(image)} for image in images]
+
+
+def _jpeg(color: tuple) -> bytes:
+    buffer = io.BytesIO()
+    PILImage.new("RGB", (16, 16), color).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def _zip(entries: dict) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        for name, data in entries.items():
+            zf.writestr(name, data)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def service(monkeypatch):
+    from ml.predict import PredictionService
+
+    fake = FakeService()
+    monkeypatch.setattr(PredictionService, "get_instance", classmethod(lambda cls: fake))
+    return fake
+
+
+@pytest.fixture
+def client(service):
+    app = FastAPI()
+    app.include_router(ml_routes.router)
+    app.dependency_overrides[get_current_user] = lambda: object()
+    return TestClient(app)
+
+
+def _lines(response) -> list:
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+
+def test_stream_scores_images_and_zip_entries(client, service):
+    first, second = _jpeg((255, 0, 0)), _jpeg((0, 255, 0))
+    archive = _zip({
+        "scans/a.jpg": _jpeg((0, 0, 255)),
+        "scans/b.png": _jpeg((9, 9, 9)),
+        "scans/notes.txt": b"ignored",
+        "__MACOSX/.hidden.jpg": b"ignored",
+    })
+
+    response = client.post(
+        "/ml/predict/stream",
+        files=[
+            ("files", ("one.jpg", first, "image/jpeg")),
+            ("files", ("two.jpg", second, "image/jpeg")),
+            ("files", ("batch.zip", archive, "application/zip")),
+        ],
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = _lines(response)
+    *results, summary = lines
+    assert summary == {"done": True, "total": 4, "failed": 0}
+    assert [r["filename"] for r in sorted(results, key=lambda r: r["index"])] == ["one.jpg", "two.jpg", "a.jpg", "b.png"]
+    by_name = {r["filename"]: r for r in results}
+    assert by_name["one.jpg"]["size"] == len(first)
+    assert by_name["two.jpg"]["size"] == len(second)
+    assert all(r["label"] == "healthy" and "error" not in r for r in results)
+    assert sum(service.batches) == 4
+
+
+def test_stream_reports_bad_uploads_per_file(client):
+    response = client.post(
+        "/ml/predict/stream",
+        files=[
+            ("files", ("ok.jpg", _jpeg((1, 2, 3)), "image/jpeg")),
+            ("files", ("broken.zip", b"not a zip", "application/zip")),
+            ("files", ("notes.txt", b"hello", "text/plain")),
+        ],
+    )
+
+    assert response.status_code == 200
+    *results, summary = _lines(response)
+    assert summary == {"done": True, "total": 3, "failed": 2}
+    errors = {r["filename"]: r.get("error") for r in results}
+    assert errors["ok.jpg"] is None
+    assert errors["broken.zip"] == "Invalid or corrupted ZIP file"
+    assert errors["notes.txt"].startswith("Invalid file type")
+
+
+def test_stream_rejects_oversized_image(client, monkeypatch):
+    monkeypatch.setattr(ml_routes, "MAX_IMAGE_BYTES", 10)
+    response = client.post("/ml/predict/stream", files=[("files", ("big.jpg", _jpeg((5, 5, 5)), "image/jpeg"))])
+
+    *results, summary = _lines(response)
+    assert results == [{"index": 0, "filename": "big.jpg", "error": "File too large"}]
+    assert summary["failed"] == 1
@@ -0,0 +1,152 @@
+import os
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from conftest import jpeg_bytes
+from ml.export import exported_path, read_sidecar, sidecar_path
+from ml.persistence import PredictionWriter
+from ml.registry import ModelRegistry, file_digest
+from models.user import Prediction
+from services.database import Base
+
+
+def _checkpoint(root, name: str, trained_at: str, exports: tuple = ()) -> tuple:
+    #a fake checkpoint file + metadata, and exported artifacts beside it
+    path = root / f"{name}.pth"
+    path.write_bytes(f"weights {trained_at}".encode())
+    metadata = {"arch": "tiny", "trained_at": trained_at, "class_to_idx": {"needs_review": 0, "no_review": 1}}
+    artifacts = {}
+    for backend in exports:
+        artifacts[backend] = exported_path(path, backend)
+        artifacts[backend].write_bytes(f"{backend} {trained_at}".encode())
+    return path, metadata, artifacts
+
+
+def test_register_stores_checkpoints_by_content(tmp_path):
+    registry = ModelRegistry(tmp_path)
+    path, metadata, exports = _checkpoint(tmp_path, "tiny_1", "1", exports=("torchscript",))
+    digest = file_digest(path)
+
+    entry = registry.register(path, metadata, exports)
+
+    assert entry["version"] == "tiny_1"
+    assert entry["sha256"] == digest
+    assert entry["exports"] == ["torchscript"]
+    object_path = registry.path_of("tiny_1")
+    assert object_path == tmp_path / "registry" / "objects" / f"{digest}.pth"
+    assert object_path.read_bytes() == b"weights 1"
+    assert exported_path(object_path, "torchscript").read_bytes() == b"torchscript 1"
+    assert read_sidecar(object_path)["trained_at"] == "1"
+    assert not path.exists() and not exports["torchscript"].exists()
+
+    #the same bytes registered again reuse the existing object
+    again, metadata, _ = _checkpoint(tmp_path, "copy", "1")
+    assert registry.register(again, metadata)["sha256"] == digest
+    assert not again.exists()
+    assert len(list(registry.objects.glob("*.pth"))) == 1
+
+
+def test_promote_repoints_latest_links(tmp_path):
+    registry = ModelRegistry(tmp_path)
+    for name, trained_at, exports in (("a", "1", ("torchscript",)), ("b", "2", ())):
+        path, metadata, artifacts = _checkpoint(tmp_path, name, trained_at, exports)
+        registry.register(path, metadata, artifacts)
+    latest_export = exported_path(registry.latest, "torchscript")
+
+    registry.promote("tiny_1")
+    assert registry.latest.is_symlink()
+    assert registry.latest.resolve() == registry.path_of("tiny_1").resolve()
+    assert latest_export.read_bytes() == b"torchscript 1"
+    assert read_sidecar(registry.latest)["trained_at"] == "1"
+    assert not os.path.isabs(os.readlink(registry.latest))
+
+    registry.promote("tiny_2")
+    assert registry.latest.read_bytes() == b"weights 2"
+    assert read_sidecar(registry.latest)["trained_at"] == "2"
+    #tiny_2 has no TorchScript export, so tiny_1's must not stay behind latest.*
+    assert not latest_export.exists() and not latest_export.is_symlink()
+    assert sidecar_path(registry.latest).is_symlink()
+    assert registry.current_version() == "tiny_2"
+
+
+def test_candidate_is_validated_and_cleared_on_promote(tmp_path):
+    registry = ModelRegistry(tmp_path)
+    path, metadata, _ = _checkpoint(tmp_path, "a", "1")
+    registry.register(path, metadata)
+
+    with pytest.raises(KeyError):
+        registry.set_candidate("tiny_unknown")
+    registry.set_candidate("tiny_1")
+    assert registry.candidate_version() == "tiny_1"
+
+    registry.promote("tiny_1")
+    assert registry.candidate_version() is None
+    assert registry.current_version() == "tiny_1"
+
+
+def test_sync_candidate_follows_the_registry(make_service, make_loaded, tmp_path, monkeypatch):
+    import ml.predict
+
+    registry = ModelRegistry(tmp_path)
+    path, metadata, _ = _checkpoint(tmp_path, "a", "2")
+    registry.register(path, metadata)
+    monkeypatch.setattr(ml.predict, "model_registry", registry)
+    service = make_service("v1")
+    built = []
+    monkeypatch.setattr(service, "_build", lambda p, backend, modes: built.append(p) or make_loaded("tiny_2", seed=1))
+
+    assert service.sync_candidate() is False
+    registry.set_candidate("tiny_2")
+    assert service.sync_candidate() is True
+    assert service.candidate.version == "tiny_2"
+    assert built == [registry.path_of("tiny_2")]
+    assert service.sync_candidate() is False
+
+    registry.set_candidate(None)
+    assert service.sync_candidate() is True
+    assert service.candidate is None
+
+
+def test_shadow_results_are_stored_as_shadow_rows_only(make_service, make_loaded):
+    service = make_service("v1")
+    images = [jpeg_bytes((i * 60, 100, 200 - i * 40)) for i in range(4)]
+    expected = service.predict_batch(images, chunk_size=2, shadow=False)
+    service.candidate = make_loaded("v2", seed=1)
+    service.shadow_fraction = 1.0
+
+    results = service.predict_batch(images, chunk_size=2)
+
+    for result, plain in zip(results, expected):
+        assert result["shadow"]["model_version"] == "v2"
+        assert {k: v for k, v in result.items() if k != "shadow"} == plain
+    assert service.shadow_stats()["scored"] == 4
+
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        writer = PredictionWriter(db, "tiny")
+        for i, result in enumerate(results):
+            writer.add_image(f"{i}.jpg", f"s3://{i}.jpg", result)
+        _, prediction_ids = writer.flush()
+
+        primary = [db.get(Prediction, i) for i in prediction_ids]
+        assert [(p.is_shadow, p.model_version, p.confidence) for p in primary] == [
+            (False, "v1", r["confidence"]) for r in expected
+        ]
+        shadows = db.scalars(select(Prediction).where(Prediction.is_shadow.is_(True))).all()
+        assert sorted(p.image_id for p in shadows) == sorted(p.image_id for p in primary)
+        assert {p.model_version for p in shadows} == {"v2"}
+    engine.dispose()
+
+
+def test_the_candidate_is_never_shadow_scored_against_itself(make_service, make_loaded):
+    service = make_service("v1")
+    service.candidate = make_loaded("v1")
+    service.shadow_fraction = 1.0
+
+    [result] = service.predict_batch([jpeg_bytes((1, 2, 3))])
+
+    assert "shadow" not in result
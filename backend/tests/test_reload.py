@@ -0,0 +1,86 @@
+import threading
+
+from conftest import jpeg_bytes
+from ml.cache import PredictionCache
+
+
+def _wait_for_reload(service):
+    #_reload holds _load_lock until it has swapped (or given up)
+    assert service._load_lock.acquire(timeout=10)
+    service._load_lock.release()
+
+
+def test_a_second_reload_is_refused_while_one_is_loading(make_service, make_loaded, tmp_path, monkeypatch):
+    service = make_service("v1")
+    release = threading.Event()
+    builds = []
+
+    def build(path, backend, optimizations):
+        builds.append(path)
+        release.wait(10)
+        return make_loaded("v2", seed=1)
+
+    monkeypatch.setattr(service, "_build", build)
+    path = tmp_path / "latest.pth"
+
+    assert service.reload_async(path) is True
+    assert service.reload_async(path) is False
+    assert service.current.version == "v1"
+
+    release.set()
+    _wait_for_reload(service)
+    assert len(builds) == 1
+    assert service.current.version == "v2"
+    assert service.current.warmup_seconds is not None
+    assert service.rollout["state"] == "swapped"
+    assert service.rollout_history[0]["to_version"] == "v2"
+
+
+def test_a_failed_reload_keeps_the_old_model_serving(make_service, tmp_path, monkeypatch):
+    service = make_service("v1")
+    old = service.current
+
+    def build(path, backend, optimizations):
+        raise RuntimeError("checkpoint is truncated")
+
+    monkeypatch.setattr(service, "_build", build)
+    assert service.reload_async(tmp_path / "latest.pth") is True
+    _wait_for_reload(service)
+
+    assert service.current is old
+    assert service.rollout["state"] == "failed"
+    assert "truncated" in service.rollout["error"]
+    assert service.predict(jpeg_bytes((10, 20, 30)))["model_version"] == "v1"
+    #the lock was released, so the next checkpoint can still be picked up
+    assert service.reload_async(tmp_path / "latest.pth") is True
+    _wait_for_reload(service)
+
+
+def test_reload_if_changed_only_reloads_a_different_checkpoint(make_service, tmp_path, monkeypatch):
+    from ml.predict import checkpoint_signature
+
+    service = make_service("v1")
+    path = tmp_path / "latest.pth"
+    path.write_bytes(b"v1")
+    service.current.path, service.current.signature = path, checkpoint_signature(path)
+    started = []
+    monkeypatch.setattr(service, "reload_async", lambda p: started.append(p) or True)
+
+    assert service.reload_if_changed(path) is False
+    assert service.reload_if_changed(tmp_path / "missing.pth") is False
+    path.write_bytes(b"version 2")
+    assert service.reload_if_changed(path) is True
+    assert started == [path]
+
+
+def test_swap_invalidates_the_prediction_cache(make_service, make_loaded):
+    service = make_service("v1")
+    service.cache = PredictionCache(max_entries=16)
+    image = jpeg_bytes((200, 40, 90))
+    assert service.predict(image)["model_version"] == "v1"
+    assert service.cache.stats()["entries"] == 1
+
+    service._swap(make_loaded("v2", seed=1))
+
+    assert service.cache.stats()["entries"] == 0
+    assert service.predict(image)["model_version"] == "v2"
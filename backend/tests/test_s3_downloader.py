@@ -0,0 +1,86 @@
+import io
+import threading
+
+from botocore.exceptions import ClientError
+
+from services.s3_downloader import S3Downloader
+
+
+def _error(code: str, status: int) -> ClientError:
+    return ClientError({"Error": {"Code": code}, "ResponseMetadata": {"HTTPStatusCode": status}}, "GetObject")
+
+
+class FakeS3:
+    #get_object raises the queued errors for a key before returning its body
+    def __init__(self, objects: dict, errors: dict = None):
+        self.objects = objects
+        self.errors = {key: list(queue) for key, queue in (errors or {}).items()}
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def get_object(self, Bucket, Key):
+        with self._lock:
+            self.calls[Key] = self.calls.get(Key, 0) + 1
+            queue = self.errors.get(Key)
+            if queue:
+                raise queue.pop(0)
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+
+def _downloader(client, **kwargs) -> S3Downloader:
+    return S3Downloader(client, "bucket", workers=2, backoff_base=0, **kwargs)
+
+
+def test_downloads_every_object(tmp_path):
+    objects = {f"img/{i}.jpg": bytes([i]) * (i + 1) for i in range(5)}
+    done = []
+    jobs = [(key, tmp_path / key.split("/")[1]) for key in objects]
+
+    report = _downloader(FakeS3(objects)).download(jobs, on_done=lambda key, dest, ok: done.append((key, ok)))
+
+    assert report.objects == 5
+    assert report.bytes == sum(len(body) for body in objects.values())
+    assert report.failures == []
+    assert sorted(done) == sorted((key, True) for key in objects)
+    for key, dest in jobs:
+        assert dest.read_bytes() == objects[key]
+    assert not list(tmp_path.glob("*.part"))
+
+
+def test_throttling_and_server_errors_are_retried(tmp_path):
+    client = FakeS3({"a.jpg": b"data"}, {"a.jpg": [_error("SlowDown", 503), _error("InternalError", 500)]})
+
+    report = _downloader(client).download([("a.jpg", tmp_path / "a.jpg")])
+
+    assert client.calls["a.jpg"] == 3
+    assert report.retries == 2
+    assert report.objects == 1
+    assert (tmp_path / "a.jpg").read_bytes() == b"data"
+
+
+def test_missing_objects_fail_without_retrying(tmp_path):
+    client = FakeS3({"b.jpg": b"ok"}, {"a.jpg": [_error("NoSuchKey", 404)]})
+    done = {}
+
+    report = _downloader(client).download(
+        [("a.jpg", tmp_path / "a.jpg"), ("b.jpg", tmp_path / "b.jpg")],
+        on_done=lambda key, dest, ok: done.update({key: ok}),
+    )
+
+    assert client.calls["a.jpg"] == 1
+    assert done == {"a.jpg": False, "b.jpg": True}
+    assert report.objects == 1
+    assert [(f["key"], f["attempts"]) for f in report.failures] == [("a.jpg", 1)]
+    assert not (tmp_path / "a.jpg").exists()
+
+
+def test_gives_up_after_max_attempts(tmp_path):
+    client = FakeS3({"a.jpg": b"data"}, {"a.jpg": [_error("SlowDown", 503)] * 5})
+
+    report = _downloader(client, max_attempts=3).download([("a.jpg", tmp_path / "a.jpg")])
+
+    assert client.calls["a.jpg"] == 3
+    assert report.retries == 2
+    assert report.objects == 0
+    assert report.failures[0]["attempts"] == 3
+    assert report.as_dict()["failed"] == 1
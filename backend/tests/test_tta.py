@@ -0,0 +1,74 @@
+import pytest
+import torch
+
+import ml.tta
+#aliased so pytest does not try to collect it as a test class
+from ml.tta import TestTimeAugmentation as TTA, augment, parse_views
+
+
+class Views:
+    #`run` for refine(): records each call and answers every view with fixed probabilities
+    def __init__(self, probabilities: list):
+        self.probabilities = torch.tensor(probabilities)
+        self.calls = []
+
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        self.calls.append(batch)
+        return self.probabilities.repeat(batch.shape[0], 1)
+
+
+def test_only_in_band_rows_are_rescored_and_averaged_over_every_view():
+    tta = TTA(views=("hflip", "vflip"), min_confidence=0.5, max_confidence=0.8)
+    batch = torch.arange(4 * 3 * 4 * 4, dtype=torch.float32).view(4, 3, 4, 4)
+    first = torch.tensor([[0.95, 0.05], [0.6, 0.4], [0.3, 0.7], [0.1, 0.9]])
+    run = Views([0.0, 1.0])
+
+    refined, mask = tta.refine(run, batch, first)
+
+    assert mask.tolist() == [False, True, True, False]
+    [views] = run.calls
+    #one extra pass: both views of the two in-band rows, grouped view by view
+    assert views.shape == (4, 3, 4, 4)
+    assert torch.equal(views[0], torch.flip(batch[1], dims=[2]))
+    assert torch.equal(views[3], torch.flip(batch[2], dims=[1]))
+    assert torch.allclose(refined[1], torch.tensor([0.6, 2.4]) / 3)
+    assert torch.allclose(refined[2], torch.tensor([0.3, 2.7]) / 3)
+    assert torch.equal(refined[[0, 3]], first[[0, 3]])
+    assert torch.equal(first[1], torch.tensor([0.6, 0.4]))
+
+    stats = tta.stats()
+    assert (stats["images"], stats["augmented"], stats["relative_cost"]) == (4, 2, 2.0)
+
+
+def test_confident_batches_cost_no_extra_pass():
+    tta = TTA(views=("hflip", "shift"), min_confidence=0.5, max_confidence=0.8, shift_px=2)
+    run = Views([0.5, 0.5])
+    first = torch.tensor([[0.99, 0.01], [0.05, 0.95]])
+
+    refined, mask = tta.refine(run, torch.zeros(2, 1, 8, 8), first)
+
+    assert run.calls == []
+    assert not mask.any()
+    assert refined is first
+
+
+def test_shift_adds_four_translated_views():
+    batch = torch.arange(16, dtype=torch.float32).view(1, 1, 4, 4)
+    views = augment(batch, ("shift",), shift_px=1)
+
+    assert views.shape == (4, 1, 4, 4)
+    assert TTA(views=("shift",), shift_px=1).num_views == 4
+    assert TTA(views=("hflip", "shift"), shift_px=0).num_views == 1
+
+
+def test_unknown_views_are_rejected_at_construction():
+    with pytest.raises(ValueError, match="Unknown TTA views"):
+        TTA(views=("hflip", "rotate"))
+    with pytest.raises(ValueError, match="Unknown TTA views"):
+        parse_views("hflip,,zoom")
+    assert parse_views(" hflip , vflip ") == ("hflip", "vflip")
+
+
+def test_a_bad_environment_value_falls_back_to_the_default_views(monkeypatch):
+    monkeypatch.setattr(ml.tta, "TTA_VIEWS", "hflip,rotate")
+    assert TTA().views == ml.tta.DEFAULT_VIEWS
@@ -0,0 +1,85 @@
+import multiprocessing
+import os
+import socket
+import stat
+import threading
+from multiprocessing.connection import AuthenticationError
+
+import pytest
+
+from ml.workers import InferencePoolClient, _bind, _serve
+
+AUTHKEY = b"test-key"
+
+
+class FakeService:
+    backend = "fake"
+
+    class current:
+        summary = {"model_version": "v1"}
+
+    def predict(self, image_bytes: bytes, embed: bool = False) -> dict:
+        return {"label": "no_review", "confidence": 0.9, "size": len(image_bytes)}
+
+
+@pytest.fixture
+def pool(tmp_path):
+    #one forked worker serving FakeService, with a short I/O timeout
+    address = str(tmp_path / "pool.sock")
+    sock = _bind(address)
+    proc = multiprocessing.get_context("fork").Process(target=_serve, args=(sock, AUTHKEY, FakeService(), 1, 0.5))
+    proc.start()
+    yield address
+    proc.terminate()
+    proc.join(10)
+    sock.close()
+
+
+def _call_within(seconds: float, fn):
+    #run a client call in a thread so a wedged worker fails the test instead of hanging it
+    outcome = {}
+    thread = threading.Thread(target=lambda: outcome.update(result=fn()), daemon=True)
+    thread.start()
+    thread.join(seconds)
+    assert "result" in outcome, f"pool did not answer within {seconds}s"
+    return outcome["result"]
+
+
+def test_socket_is_owner_only(pool):
+    assert stat.S_IMODE(os.stat(pool).st_mode) == 0o600
+
+
+def test_answers_clients_with_the_authkey(pool):
+    client = InferencePoolClient(pool, authkey=AUTHKEY)
+    assert _call_within(10, client.info)["pid"] != os.getpid()
+    assert _call_within(10, lambda: client.predict(b"1234"))["size"] == 4
+
+
+def test_rejects_a_wrong_authkey_and_keeps_serving(pool):
+    with pytest.raises(AuthenticationError):
+        InferencePoolClient(pool, authkey=b"wrong").info()
+    assert _call_within(10, InferencePoolClient(pool, authkey=AUTHKEY).info)["model_version"] == "v1"
+
+
+@pytest.mark.parametrize("sends", [b"", b"\x00\x00\x00\x40partial"])
+def test_a_silent_client_does_not_wedge_the_worker(pool, sends):
+    #connects and never finishes the handshake; the only worker must drop it and move on
+    silent = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    silent.connect(pool)
+    silent.sendall(sends)
+    try:
+        assert _call_within(10, InferencePoolClient(pool, authkey=AUTHKEY).info)["model_version"] == "v1"
+    finally:
+        silent.close()
+
+
+def test_a_client_that_authenticates_but_sends_nothing_is_dropped(pool):
+    from multiprocessing.connection import Client
+
+    idle = Client(pool, family="AF_UNIX", authkey=AUTHKEY)
+    try:
+        assert _call_within(10, InferencePoolClient(pool, authkey=AUTHKEY).info)["model_version"] == "v1"
+        with pytest.raises(EOFError):
+            idle.recv()
+    finally:
+        idle.close()